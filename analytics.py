@@ -0,0 +1,340 @@
+"""Агрегаты для панелей дашборда, инсайтов и рекомендаций.
+
+Все метрики текущей выборки считаются за один векторизованный проход в
+неизменяемый снимок AggregateSnapshot. Снимки кэшируются в LRU по
+состоянию фильтров и поиска, поэтому возврат к уже выбранным значениям
+фильтров ничего не пересчитывает. Функции *_lines/recommendations/insights
+превращают снимок в текст и не зависят от Tk.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from growable import GrowableArray
+
+# Возрастные интервалы панели демографии: (18, 30], (30, 45], ...
+AGE_BINS = (18, 30, 45, 60, 75)
+AGE_GROUP_LABELS = ('18-30', '31-45', '46-60', '60+')
+
+# Более мелкие возрастные группы для графиков
+CHART_AGE_BINS = (18, 25, 35, 45, 55, 65, 75)
+CHART_AGE_LABELS = ('18-25', '26-35', '36-45', '46-55', '56-65', '66-75')
+HISTOGRAM_BINS = 20
+
+PREMIUM_BALANCE = 1000000
+HIGH_INCOME = 150000
+LOW_ACTIVITY_TRANSACTIONS = 5
+HIGH_RISK = 'Высокий'
+
+
+@dataclass(frozen=True)
+class AggregateSnapshot:
+    """Неизменяемый набор метрик одной выборки клиентов"""
+    count: int
+    total_balance: float
+    avg_balance: float
+    avg_income: float
+    total_assets: float
+    total_transactions: int
+    avg_transactions: float
+    premium_clients: int
+    high_income_clients: int
+    low_activity_clients: int
+    high_risk_clients: int
+    age_mean: float
+    age_median: float
+    age_min: int
+    age_max: int
+    age_groups: tuple  # ((метка, число клиентов), ...) по AGE_BINS
+    avg_loyalty: float
+    max_loyalty: int
+    region_counts: tuple  # ((значение, число клиентов), ...) по убыванию
+    product_counts: tuple
+    risk_counts: tuple
+    chart_age_groups: tuple  # ((метка, число клиентов), ...) по CHART_AGE_BINS
+    income_histogram: tuple  # (counts, edges) из np.histogram на HISTOGRAM_BINS интервалов
+    balance_histogram: tuple
+
+
+def _mode(counts):
+    """Самое частое значение; при равенстве - наименьшее, как Series.mode()[0]"""
+    if not counts:
+        return None
+    top = counts[0][1]
+    return min(value for value, count in counts if count == top)
+
+
+def age_group_mode(snapshot):
+    """Преобладающая возрастная группа в подписях AGE_GROUP_LABELS"""
+    counts = [(label, count) for label, (_, count) in zip(AGE_GROUP_LABELS, snapshot.age_groups)]
+    if not any(count for _, count in counts):
+        return None
+    top = max(count for _, count in counts)
+    return next(label for label, count in counts if count == top)
+
+
+def popular_product(snapshot):
+    return _mode(snapshot.product_counts)
+
+
+def top_region(snapshot):
+    return _mode(snapshot.region_counts)
+
+
+def main_risk(snapshot):
+    return _mode(snapshot.risk_counts)
+
+
+class _Codes:
+    """Колонка как коды + подписи для подсчётов через bincount"""
+
+    def __init__(self, series):
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes, labels = series.cat.codes.to_numpy(), series.cat.categories
+        else:
+            codes, labels = pd.factorize(series)
+        # Значения словаря как есть (не строки): по ним appended кодирует новые строки
+        self._values = list(labels)
+        self._codes = GrowableArray(codes)
+        self.codes = self._codes.values
+        self.labels = [str(c) for c in labels]
+
+    def appended(self, series, n_rows):
+        """Колонка series, первые n_rows строк которой уже закодированы здесь"""
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Коды категорий - view на колонку таблицы
+            return _Codes(series)
+        codes, uniques = pd.factorize(series.iloc[n_rows:])
+        index = {value: code for code, value in enumerate(self._values)}
+        values = self._values + [value for value in uniques if value not in index]
+        index.update((value, code) for code, value in enumerate(values))
+        # Код -1 (пропуск) остаётся -1
+        lookup = np.array([index[value] for value in uniques] + [-1], dtype=np.int64)
+        result = _Codes.__new__(_Codes)
+        result._values = values
+        result._codes = self._codes.appended(lookup[codes])
+        result.codes = result._codes.values
+        result.labels = [str(c) for c in values]
+        return result
+
+    def counts(self, rows):
+        codes = self.codes if rows is None else self.codes[rows]
+        codes = codes[codes >= 0]
+        bins = np.bincount(codes, minlength=len(self.labels))
+        # При равенстве - по подписи, а не по коду: дописанные строки добавляют значения в конец словаря
+        order = sorted(np.flatnonzero(bins).tolist(), key=lambda i: (-bins[i], self.labels[i]))
+        return tuple((self.labels[i], int(bins[i])) for i in order)
+
+
+class Aggregator:
+    """Считает AggregateSnapshot по номерам строк и кэширует снимки в LRU"""
+
+    def __init__(self, df, cache_size=64):
+        self.n_rows = len(df)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._numeric = {col: df[col].to_numpy() for col in
+                         ('age', 'income', 'balance', 'assets', 'transactions', 'loyalty_years')}
+        self._codes = {col: _Codes(df[col]) for col in ('region', 'product', 'risk_level')}
+
+    def appended(self, df):
+        """Aggregator таблицы df, первые строки которой - строки этого; кэш не переносится
+
+        Числовые колонки - view на колонки df, коды категорий продлеваются
+        только на новые строки.
+        """
+        result = Aggregator.__new__(Aggregator)
+        result.n_rows = len(df)
+        result.cache_size = self.cache_size
+        result._cache = OrderedDict()
+        result._lock = threading.Lock()
+        result._numeric = {col: df[col].to_numpy() for col in self._numeric}
+        result._codes = {col: codes.appended(df[col], self.n_rows) for col, codes in self._codes.items()}
+        return result
+
+    def snapshot(self, rows=None, key=None):
+        """Снимок для строк rows (None - все строки); key - ключ состояния фильтров для кэша"""
+        if key is not None:
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    return cached
+
+        result = self.compute(rows)
+
+        if key is not None:
+            with self._lock:
+                self._cache[key] = result
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def compute(self, rows=None):
+        cols = {name: (values if rows is None else values[rows]) for name, values in self._numeric.items()}
+        age, income, balance = cols['age'], cols['income'], cols['balance']
+        transactions, loyalty = cols['transactions'], cols['loyalty_years']
+        count = len(age)
+
+        risk_counts = self._codes['risk_level'].counts(rows)
+        if count == 0:
+            return empty_snapshot()
+
+        # Колонки компактной схемы - int32 и уже; сумма в их типе на Windows (numpy 1.x) переполняется
+        total_balance = float(balance.sum(dtype=np.int64))
+        total_transactions = int(transactions.sum(dtype=np.int64))
+        # Интервалы закрыты справа, как у pd.cut: возраст 18 не попадает ни в одну группу
+        age_bins = right_closed_counts(age, AGE_BINS)
+        chart_age_bins = right_closed_counts(age, CHART_AGE_BINS)
+
+        return AggregateSnapshot(
+            count=count,
+            total_balance=total_balance,
+            avg_balance=total_balance / count,
+            avg_income=float(income.mean()),
+            total_assets=float(cols['assets'].sum()),
+            total_transactions=total_transactions,
+            avg_transactions=total_transactions / count,
+            premium_clients=int(np.count_nonzero(balance > PREMIUM_BALANCE)),
+            high_income_clients=int(np.count_nonzero(income > HIGH_INCOME)),
+            low_activity_clients=int(np.count_nonzero(transactions < LOW_ACTIVITY_TRANSACTIONS)),
+            high_risk_clients=dict(risk_counts).get(HIGH_RISK, 0),
+            age_mean=float(age.mean()),
+            age_median=float(np.median(age)),
+            age_min=int(age.min()),
+            age_max=int(age.max()),
+            age_groups=tuple(zip(age_bin_labels(), (int(c) for c in age_bins))),
+            avg_loyalty=float(loyalty.mean()),
+            max_loyalty=int(loyalty.max()),
+            region_counts=self._codes['region'].counts(rows),
+            product_counts=self._codes['product'].counts(rows),
+            risk_counts=risk_counts,
+            chart_age_groups=tuple(zip(CHART_AGE_LABELS, (int(c) for c in chart_age_bins))),
+            income_histogram=histogram(income),
+            balance_histogram=histogram(balance),
+        )
+
+
+def empty_snapshot():
+    """Снимок пустой выборки"""
+    nan = float('nan')
+    return AggregateSnapshot(
+        count=0, total_balance=0.0, avg_balance=nan, avg_income=nan, total_assets=0.0,
+        total_transactions=0, avg_transactions=nan, premium_clients=0, high_income_clients=0,
+        low_activity_clients=0, high_risk_clients=0, age_mean=nan, age_median=nan, age_min=0,
+        age_max=0, age_groups=tuple((label, 0) for label in age_bin_labels()), avg_loyalty=nan,
+        max_loyalty=0, region_counts=(), product_counts=(), risk_counts=(),
+        chart_age_groups=tuple((label, 0) for label in CHART_AGE_LABELS),
+        income_histogram=((), ()), balance_histogram=((), ()))
+
+
+def right_closed_counts(values, bins, weights=None):
+    """Число значений в интервалах (bins[i], bins[i + 1]]"""
+    index = np.searchsorted(bins, values, side='left')
+    counts = np.bincount(index, weights=weights, minlength=len(bins) + 1)[1:len(bins)]
+    return counts.astype(np.int64)
+
+
+def histogram(values, weights=None, value_range=None):
+    """np.histogram на HISTOGRAM_BINS интервалов в виде кортежей (counts, edges)"""
+    counts, edges = np.histogram(values, bins=HISTOGRAM_BINS, weights=weights, range=value_range)
+    return tuple(int(c) for c in counts), tuple(float(e) for e in edges)
+
+
+def age_bin_labels():
+    return [f"({low}, {high}]" for low, high in zip(AGE_BINS[:-1], AGE_BINS[1:])]
+
+
+def financial_overview_lines(s):
+    return [
+        f"Общий баланс: {s.total_balance:,.0f} ₽",
+        f"Средний доход: {s.avg_income:,.0f} ₽",
+        f"Средний баланс: {s.avg_balance:,.0f} ₽",
+        f"Премиум-клиенты: {s.premium_clients}",
+        f"Активы под управлением: {s.total_assets:,.0f} ₽",
+        f"Всего транзакций: {s.total_transactions}",
+        f"Всего клиентов: {s.count}"
+    ]
+
+
+def demographic_lines(s):
+    lines = [
+        f"Средний возраст: {s.age_mean:.1f} лет",
+        f"Медианный возраст: {s.age_median:.1f} лет",
+        f"Самый молодой: {s.age_min} лет",
+        f"Самый старший: {s.age_max} лет",
+        "\nРаспределение по возрастам:"
+    ]
+    for grp, count in s.age_groups:
+        lines.append(f"   {grp}: {count} клиентов")
+
+    lines.append("\nТоп регионы:")
+    for region, count in s.region_counts[:3]:
+        lines.append(f"   {region}: {count} клиентов")
+    return lines
+
+
+def product_lines(s):
+    lines = ["Распределение по продуктам:"]
+    for p, count in s.product_counts:
+        lines.append(f"   {p}: {count} ({count / s.count * 100:.1f}%)")
+
+    lines.append("\nУровни риска:")
+    for r, count in s.risk_counts:
+        lines.append(f"   {r}: {count} ({count / s.count * 100:.1f}%)")
+
+    lines.append(f"\nСредняя лояльность: {s.avg_loyalty:.1f} лет")
+    lines.append(f"Максимальная лояльность: {s.max_loyalty} лет")
+    return lines
+
+
+def recommendations(s):
+    recs = []
+    if s.count == 0:
+        recs.append("Нет данных для анализа")
+        return recs
+
+    if s.premium_clients > 0:
+        recs.append(f"Рассмотреть персонализированные предложения для {s.premium_clients} премиум клиентов")
+
+    if s.low_activity_clients > 0:
+        recs.append(f"Активировать маркетинговую кампанию для {s.low_activity_clients} малоактивных клиентов")
+
+    recs.append(f"Продвигать продукт '{popular_product(s)}' в регионах с высокой концентрацией клиентов")
+
+    if s.high_risk_clients > 0:
+        recs.append(f"Мониторинг рисков для {s.high_risk_clients} клиентов с высоким риском")
+
+    return recs
+
+
+def insights(s):
+    result = []
+    # Age
+    age_group = age_group_mode(s)
+    if age_group is not None:
+        result.append(f"Преобладающая возрастная группа: {age_group}")
+    # Income
+    if s.high_income_clients > 0:
+        result.append(f"Клиентов с доходом >150k ₽: {s.high_income_clients}")
+    # Products
+    result.append(f"Самый популярный продукт: {popular_product(s)}")
+    # Regions
+    result.append(f"Наиболее активный регион: {top_region(s)}")
+    # Loyalty
+    result.append(f"Средняя лояльность: {s.avg_loyalty:.1f} лет")
+    # Risk
+    result.append(f"Преобладающий уровень риска: {main_risk(s)}")
+    # Transactions
+    result.append(f"Среднее количество транзакций: {s.avg_transactions:.1f}")
+    # Balance
+    result.append(f"Общий баланс клиентов: {s.total_balance:,.0f} ₽")
+    return result
@@ -0,0 +1,351 @@
+"""Локальный HTTP/JSON сервер агрегатов дашборда только для чтения.
+
+Набор данных и индексы загружаются один раз на процесс, а клиенты
+получают по HTTP то же, что показывает окно приложения: снимок метрик,
+тексты панелей, инсайты, рекомендации и страницы таблицы для любого
+состояния фильтров и поиска. Память и CPU не умножаются на число
+пользователей.
+
+Запросы обрабатываются параллельно (поток на соединение). Готовые ответы
+лежат в LRU по (путь, нормализованные параметры); ETag ответа зависит
+только от этого ключа и подписи CSV, поэтому If-None-Match отвечает 304
+без расчёта. Данные загружаются при старте и дальше не меняются: после
+изменения CSV сервер нужно перезапустить.
+
+    python api_server.py --data data/clients_data.csv --port 8050
+    curl 'http://127.0.0.1:8050/api/dashboard?region=Москва&q=иван'
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import analytics
+import schema
+from analytics import Aggregator
+from data_cache import cached_source, csv_signature, read_csv_cached
+from filter_index import AGE_RANGES, ALL, FilterIndex
+from olap_cube import OlapCube
+from report import snapshot_metrics
+from search_index import SearchIndex
+from sqlite_store import SqliteStore
+from table_view import SortIndex, TableView
+
+DEFAULT_PORT = 8050
+DEFAULT_CACHE_SIZE = 256
+# Размер страницы таблицы по умолчанию и наибольший
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+# Выборки таблицы с сортировкой, которые держатся между запросами страниц
+TABLE_VIEW_CACHE_SIZE = 8
+
+# Тексты панелей дашборда в порядке окна приложения
+PANELS = (
+    ('financial', analytics.financial_overview_lines),
+    ('demographic', analytics.demographic_lines),
+    ('products', analytics.product_lines),
+    ('recommendations', analytics.recommendations),
+)
+
+
+class HubData:
+    """Набор данных сервера: таблица pandas с индексами или база SqliteStore"""
+
+    def __init__(self, csv_path, backend='pandas', sqlite_path=None):
+        self.csv_path = csv_path
+        self.store = None
+        if backend == 'sqlite':
+            self.store = SqliteStore.from_csv(csv_path, sqlite_path)
+            self.cube = self.store.cube
+            self.n_rows = len(self.store)
+            source = self.store.source
+        else:
+            self.df = read_csv_cached(csv_path)
+            self.search_index = SearchIndex(self.df)
+            self.filter_index = FilterIndex(self.df)
+            self.aggregator = Aggregator(self.df)
+            self.sort_index = SortIndex(self.df)
+            self.cube = OlapCube.from_frame(self.df)
+            self.n_rows = len(self.df)
+            source = cached_source(csv_path) or csv_signature(csv_path)
+        # Версия данных входит в ETag: после перезапуска на другом CSV старые ETag не совпадут
+        self.version = hashlib.sha1(json.dumps(source, sort_keys=True).encode()).hexdigest()[:12]
+        self._views = OrderedDict()
+        self._views_lock = threading.Lock()
+
+    def __len__(self):
+        return self.n_rows
+
+    def values(self, column):
+        return self.store.values(column) if self.store is not None else self.filter_index.values(column)
+
+    @property
+    def columns(self):
+        return self.store.columns if self.store is not None else schema.columns(self.df)
+
+    def rows(self, key):
+        """Номера строк выборки key = (возраст, регион, продукт, запрос) в таблице pandas"""
+        mask = self.search_index.search(key[3])
+        search = self.filter_index.pack(mask) if mask is not None else None
+        return self.filter_index.select(*key[:3], search)
+
+    def snapshot(self, key, histograms=False):
+        """Агрегаты выборки, как VTBIntelligenceHub.snapshot: без поиска и гистограмм - по кубу"""
+        if not histograms and not key[3]:
+            return self.cube.snapshot(*key[:3])
+        if self.store is not None:
+            return self.store.snapshot(key)
+        return self.aggregator.snapshot(self.rows(key), key=key)
+
+    def page(self, key, sort, descending, offset, limit):
+        """(число строк выборки, страница строк) в порядке сортировки"""
+        view, lock = self._view(key, sort, descending)
+        # SqlTableView запоминает опорные ключи страниц - одну выборку читает один поток за раз
+        with lock:
+            return len(view), view.page(offset, limit)
+
+    def _view(self, key, sort, descending):
+        view_key = (key, sort, descending)
+        with self._views_lock:
+            entry = self._views.get(view_key)
+            if entry is not None:
+                self._views.move_to_end(view_key)
+                return entry
+        if self.store is not None:
+            view = self.store.table_view(key)
+        else:
+            view = TableView(self.df, self.rows(key), self.sort_index)
+        if sort is not None:
+            view.sort(sort, descending)
+        with self._views_lock:
+            entry = self._views.setdefault(view_key, (view, threading.Lock()))
+            self._views.move_to_end(view_key)
+            while len(self._views) > TABLE_VIEW_CACHE_SIZE:
+                self._views.popitem(last=False)
+        return entry
+
+
+class BadRequest(ValueError):
+    """Неверные параметры запроса (ответ 400)"""
+
+
+class DashboardService:
+    """Ответы API по путям и параметрам запроса с LRU кэшем готовых JSON"""
+
+    def __init__(self, data, cache_size=DEFAULT_CACHE_SIZE):
+        self.data = data
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._endpoints = {
+            '/api/filters': (self._filters, ()),
+            '/api/snapshot': (self._snapshot, ('histograms',)),
+            '/api/dashboard': (self._dashboard, ()),
+            '/api/insights': (self._insights, ()),
+            '/api/recommendations': (self._recommendations, ()),
+            '/api/table': (self._table, ('sort', 'desc', 'offset', 'limit')),
+        }
+
+    def request_key(self, path, params):
+        """Нормализованный ключ ответа; KeyError - нет такого пути, BadRequest - неверные параметры"""
+        _, options = self._endpoints[path]
+        if path == '/api/filters':
+            return path, (), ()
+        return path, self._filter_key(params), tuple(self._option(name, params) for name in options)
+
+    def etag(self, request_key):
+        digest = hashlib.sha1(repr(request_key).encode('utf-8')).hexdigest()[:16]
+        return f'"{self.data.version}-{digest}"'
+
+    def response(self, request_key):
+        """Тело ответа в JSON (bytes) из кэша или расчётом"""
+        with self._lock:
+            body = self._cache.get(request_key)
+            if body is not None:
+                self._cache.move_to_end(request_key)
+                return body
+
+        path, key, options = request_key
+        handler, _ = self._endpoints[path]
+        body = json.dumps(handler(key, *options), ensure_ascii=False).encode('utf-8')
+
+        with self._lock:
+            self._cache[request_key] = body
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return body
+
+    def _filter_key(self, params):
+        age, region, product = (params.get(name, ALL) for name in ('age', 'region', 'product'))
+        if age != ALL and age not in AGE_RANGES:
+            raise BadRequest(f"Неизвестная возрастная группа: {age}")
+        for name, value in (('region', region), ('product', product)):
+            if value != ALL and value not in self.data.values(name):
+                raise BadRequest(f"Неизвестное значение {name}: {value}")
+        # Поиск в приложении нечувствителен к регистру - запрос в ключе в нижнем регистре
+        return age, region, product, params.get('q', '').strip().lower()
+
+    def _option(self, name, params):
+        value = params.get(name)
+        if name in ('histograms', 'desc'):
+            return value in ('1', 'true', 'yes')
+        if name == 'sort':
+            if value is not None and value not in self.data.columns:
+                raise BadRequest(f"Неизвестная колонка: {value}")
+            return value
+        default = DEFAULT_PAGE_SIZE if name == 'limit' else 0
+        try:
+            number = default if value is None else int(value)
+        except ValueError:
+            raise BadRequest(f"{name} должен быть целым числом") from None
+        if name == 'limit':
+            return max(0, min(number, MAX_PAGE_SIZE))
+        return max(0, number)
+
+    @staticmethod
+    def _filters_dict(key):
+        return dict(zip(('age', 'region', 'product', 'q'), key))
+
+    def _filters(self, key):
+        return {
+            'clients': len(self.data),
+            'age': [ALL] + list(AGE_RANGES),
+            'region': [ALL] + self.data.values('region'),
+            'product': [ALL] + self.data.values('product'),
+        }
+
+    def _snapshot(self, key, histograms):
+        snapshot = self.data.snapshot(key, histograms)
+        metrics = snapshot_metrics(snapshot)
+        if not histograms:
+            del metrics['income_histogram'], metrics['balance_histogram']
+        return {'filters': self._filters_dict(key), 'count': snapshot.count, 'metrics': metrics}
+
+    def _dashboard(self, key):
+        snapshot = self.data.snapshot(key)
+        panels = {name: lines(snapshot) for name, lines in PANELS} if snapshot.count else {}
+        return {'filters': self._filters_dict(key), 'count': snapshot.count, 'panels': panels}
+
+    def _insights(self, key):
+        snapshot = self.data.snapshot(key)
+        return {'filters': self._filters_dict(key), 'count': snapshot.count,
+                'insights': analytics.insights(snapshot) if snapshot.count else []}
+
+    def _recommendations(self, key):
+        snapshot = self.data.snapshot(key)
+        return {'filters': self._filters_dict(key), 'count': snapshot.count,
+                'recommendations': analytics.recommendations(snapshot)}
+
+    def _table(self, key, sort, descending, offset, limit):
+        total, frame = self.data.page(key, sort, descending, offset, limit)
+        return {
+            'filters': self._filters_dict(key),
+            'total': total,
+            'offset': offset,
+            'sort': sort,
+            'desc': descending,
+            'columns': list(frame.columns),
+            # to_json переводит NaN в null, а типы numpy - в числа JSON
+            'rows': json.loads(frame.to_json(orient='values', force_ascii=False)),
+        }
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """GET/HEAD запросы к DashboardService сервера; прочие методы отклоняются (501)"""
+
+    server_version = "VTBHubAPI/1.0"
+    # У всех ответов есть Content-Length - клиенты могут держать соединение открытым
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def _respond(self, send_body):
+        service = self.server.service
+        url = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            request_key = service.request_key(url.path.rstrip('/') or '/', params)
+        except KeyError:
+            return self._send_json(HTTPStatus.NOT_FOUND, {'error': f"Неизвестный путь: {url.path}"}, send_body)
+        except BadRequest as e:
+            return self._send_json(HTTPStatus.BAD_REQUEST, {'error': str(e)}, send_body)
+
+        etag = service.etag(request_key)
+        if etag in (tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        try:
+            body = service.response(request_key)
+        except Exception as e:
+            self.log_error("Ошибка расчёта %s: %r", self.path, e)
+            return self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}, send_body)
+        self._send(HTTPStatus.OK, body, send_body, etag)
+
+    def _send_json(self, status, payload, send_body):
+        self._send(status, json.dumps(payload, ensure_ascii=False).encode('utf-8'), send_body)
+
+    def _send(self, status, body, send_body, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag is not None:
+            self.send_header('ETag', etag)
+            # Клиент может хранить ответ, но перед использованием сверяет ETag
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+
+class ApiServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer с общим DashboardService для всех соединений"""
+
+    daemon_threads = True
+
+    def __init__(self, address, service, handler=ApiRequestHandler):
+        super().__init__(address, handler)
+        self.service = service
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP/JSON сервер агрегатов ВТБ Data Intelligence Hub")
+    parser.add_argument("--data", default=os.environ.get("DATA_CSV_PATH", "data/clients_data.csv"))
+    parser.add_argument("--host", default=os.environ.get("SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("SERVER_PORT", DEFAULT_PORT)))
+    parser.add_argument("--backend", choices=["pandas", "sqlite"],
+                        default=os.environ.get("STORAGE_BACKEND", "pandas").lower())
+    parser.add_argument("--sqlite-path", default=os.environ.get("SQLITE_PATH") or None)
+    parser.add_argument("--cache-size", type=int, default=int(os.environ.get("SERVER_CACHE_SIZE", DEFAULT_CACHE_SIZE)),
+                        help="число готовых ответов в LRU кэше")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.data):
+        parser.error(f"Файл данных не найден: {args.data}")
+
+    started = time.perf_counter()
+    data = HubData(args.data, args.backend, args.sqlite_path)
+    server = ApiServer((args.host, args.port), DashboardService(data, args.cache_size))
+    print(f"Загружено клиентов: {len(data):,} за {time.perf_counter() - started:.1f} с; "
+          f"сервер слушает http://{args.host}:{server.server_address[1]}/api/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""Замеры скорости и памяти основных путей данных хаба.
+
+Для каждого размера набора данных генератор проекта пишет CSV во
+временную папку, после чего замеряются: загрузка (первая - разбор CSV и
+запись кэша, повторная - из кэша), построение индексов и куба, поиск,
+фильтры, панели дашборда (по строкам и по кубу), страница таблицы,
+графики и прогноз. Пути, которым в приложении нужен экран, замеряются
+через ту же логику без окна (графики рисуются в Agg); таблица в Treeview
+замеряется, только если доступен дисплей (например, Xvfb).
+
+Каждый размер считается в отдельном процессе, поэтому пиковая память
+процесса (ru_maxrss, на Windows - null) относится к одному размеру. Пик выделений на шаге
+замеряется tracemalloc отдельным прогоном, чтобы не искажать время.
+Результат - JSON, который можно сравнить с прошлым прогоном:
+
+    python benchmark.py --sizes 1000 100000 1000000 --out benchmarks
+    python benchmark.py --sizes 1000 100000 --compare benchmarks/bench_<дата>.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource  # только Unix
+except ImportError:
+    resource = None
+
+import numpy as np
+import pandas as pd
+
+import analytics
+from analytics import Aggregator
+from data_cache import read_csv_cached
+from data_generator import write_clients_csv
+from filter_index import ALL, FilterIndex
+from forecasting import Forecaster
+from olap_cube import OlapCube
+from search_index import SearchIndex
+from table_view import SortIndex, TableView
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+SEARCH_QUERIES = ('мос', 'клиент_123', '77', 'ипот')
+FILTER_STATES = (
+    ('31-45', ALL, ALL),
+    (ALL, 'Москва', ALL),
+    ('46-60', 'Казань', 'Вклад'),
+)
+TABLE_PAGE = 250
+
+
+def _measure(fn, repeat):
+    """Время лучшего и среднего из repeat прогонов и пик выделений памяти отдельного прогона"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': min(times), 'mean_seconds': sum(times) / len(times), 'repeat': repeat, 'peak_bytes': peak}
+
+
+def _chart_benchmark():
+    try:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        from charts import CHART_TABS, build_figure
+    except ImportError:
+        return None
+
+    def draw_all(snapshot):
+        for tab, _ in CHART_TABS:
+            fig = build_figure(tab, snapshot)
+            FigureCanvasAgg(fig).draw()
+            fig.clear()
+    return draw_all
+
+
+def _tk_table_benchmark(df, sort_index):
+    """Заполнение виртуальной таблицы в Tk; None, если дисплея нет"""
+    if not os.environ.get('DISPLAY') and sys.platform.startswith('linux'):
+        return None, None
+    try:
+        import ttkbootstrap as tb
+
+        from main import VirtualTable
+
+        root = tb.Window(themename="flatly")
+        root.withdraw()
+    except Exception:
+        return None, None
+
+    def populate():
+        frame = tb.Frame(tb.Toplevel(root))
+        frame.pack()
+        VirtualTable(frame, TableView(df, None, sort_index))
+        root.update_idletasks()
+        frame.master.destroy()
+    return populate, root
+
+
+def run_size(rows, repeat=3, seed=42, workdir=None):
+    """Все замеры для одного размера; вызывается в отдельном процессе"""
+    directory = tempfile.mkdtemp(prefix=f"bench_{rows}_", dir=workdir)
+    csv_path = os.path.join(directory, 'clients.csv')
+    results = {}
+    try:
+        started = time.perf_counter()
+        write_clients_csv(csv_path, rows, seed=seed)
+        results['generate'] = {'seconds': time.perf_counter() - started, 'repeat': 1}
+
+        def cold_load():
+            shutil.rmtree(f"{csv_path}.cache", ignore_errors=True)
+            read_csv_cached(csv_path)
+
+        results['load_cold'] = _measure(cold_load, 1)
+        results['load_cached'] = _measure(lambda: read_csv_cached(csv_path), repeat)
+        df = read_csv_cached(csv_path)
+
+        results['build_search_index'] = _measure(lambda: SearchIndex(df), 1)
+        results['build_filter_index'] = _measure(lambda: FilterIndex(df), 1)
+        results['build_aggregator'] = _measure(lambda: Aggregator(df), 1)
+        results['build_cube'] = _measure(lambda: OlapCube.from_frame(df), 1)
+        search_index, filter_index, aggregator = SearchIndex(df), FilterIndex(df), Aggregator(df)
+        cube = OlapCube.from_frame(df)
+
+        def search():
+            # Свежий индекс на каждый прогон: кэш запросов не должен подменять поиск
+            index = SearchIndex(df)
+            for query in SEARCH_QUERIES:
+                index.search(query)
+
+        def search_typing():
+            # Пользователь набирает запрос по символу: работает сужение по прошлым результатам
+            index = SearchIndex(df)
+            for end in range(1, len('клиент_123') + 1):
+                index.search('клиент_123'[:end])
+
+        results['search'] = _measure(search, repeat)
+        results['search_typing'] = _measure(search_typing, repeat)
+
+        search_bitmap = filter_index.pack(search_index.search('мос'))
+
+        def filters():
+            for state in FILTER_STATES:
+                filter_index.select(*state)
+            filter_index.select(ALL, ALL, ALL, search_bitmap)
+
+        def dashboard():
+            for state in FILTER_STATES:
+                snapshot = aggregator.compute(filter_index.select(*state))
+                for lines in (analytics.financial_overview_lines, analytics.demographic_lines,
+                              analytics.product_lines, analytics.recommendations, analytics.insights):
+                    lines(snapshot)
+
+        def dashboard_cube():
+            for state in FILTER_STATES:
+                snapshot = cube.snapshot(*state)
+                for lines in (analytics.financial_overview_lines, analytics.demographic_lines,
+                              analytics.product_lines, analytics.recommendations):
+                    lines(snapshot)
+
+        results['filters'] = _measure(filters, repeat)
+        results['dashboard'] = _measure(dashboard, repeat)
+        results['dashboard_cube'] = _measure(dashboard_cube, repeat)
+        results['dashboard_all_rows'] = _measure(lambda: aggregator.compute(None), repeat)
+
+        def table():
+            sort_index = SortIndex(df)
+            view = TableView(df, filter_index.select(*FILTER_STATES[1]), sort_index)
+            view.page(0, TABLE_PAGE)
+            view.sort('balance', descending=True)
+            view.page(0, TABLE_PAGE)
+            view.sort('name')
+            view.page(len(view) // 2, TABLE_PAGE)
+
+        results['table'] = _measure(table, repeat)
+
+        draw_all = _chart_benchmark()
+        if draw_all is not None:
+            snapshot = aggregator.compute(None)
+            results['charts'] = _measure(lambda: draw_all(snapshot), repeat)
+
+        forecaster = Forecaster(df)
+        results['forecast'] = _measure(lambda: forecaster.compute(None), repeat)
+
+        populate, root = _tk_table_benchmark(df, SortIndex(df))
+        if populate is not None:
+            try:
+                results['tk_table'] = _measure(populate, repeat)
+            finally:
+                root.destroy()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        'rows': rows,
+        'max_rss_bytes': _max_rss_bytes(),
+        'benchmarks': results,
+    }
+
+
+def _max_rss_bytes():
+    """Пиковая память процесса; None, где модуля resource нет (Windows)"""
+    if resource is None:
+        return None
+    # ru_maxrss - КБ на Linux, байты на macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeat=3, seed=42, workdir=None):
+    runs = []
+    for rows in sizes:
+        # Новый процесс на каждый размер: пиковая память не наследуется от прошлых размеров
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            run = pool.submit(run_size, rows, repeat, seed, workdir).result()
+        runs.append(run)
+        print(f"{rows:>12,} строк: " + ", ".join(
+            f"{name} {result['seconds'] * 1000:.1f} мс" for name, result in run['benchmarks'].items()))
+    return {
+        'commit': _git_commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'repeat': repeat,
+        'seed': seed,
+        'runs': runs,
+    }
+
+
+def compare(current, baseline):
+    """Строки отчёта: отношение времени к базовому прогону по совпадающим размерам и замерам"""
+    base_runs = {run['rows']: run['benchmarks'] for run in baseline['runs']}
+    lines = []
+    for run in current['runs']:
+        base = base_runs.get(run['rows'])
+        if base is None:
+            continue
+        for name, result in run['benchmarks'].items():
+            if name in base and base[name]['seconds'] > 0:
+                ratio = result['seconds'] / base[name]['seconds']
+                lines.append(f"{run['rows']:>12,} {name:<20} {base[name]['seconds'] * 1000:>10.1f} мс -> "
+                             f"{result['seconds'] * 1000:>10.1f} мс  x{ratio:.2f}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры путей данных ВТБ Data Intelligence Hub")
+    parser.add_argument("--sizes", type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="benchmarks", help="папка для JSON с результатами")
+    parser.add_argument("--workdir", default=None, help="где создавать временные наборы данных")
+    parser.add_argument("--compare", default=None, help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args(argv)
+
+    result = run_benchmarks(args.sizes, repeat=args.repeat, seed=args.seed, workdir=args.workdir)
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {path}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print("\n".join(compare(result, baseline)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Графики окна "Аналитические графики".
+
+Фигуры строятся из уже посчитанного снимка AggregateSnapshot (готовые
+гистограммы и подсчёты), а не из строк выборки, поэтому время
+построения не зависит от числа клиентов. Используется
+matplotlib.figure.Figure без pyplot - фигуры не копятся в глобальном
+реестре. Готовые фигуры хранятся в LRU кэше по состоянию фильтров и
+очищаются при вытеснении.
+"""
+from collections import OrderedDict
+
+import numpy as np
+from matplotlib.figure import Figure
+
+# Вкладки окна графиков: (идентификатор, заголовок)
+CHART_TABS = (
+    ('products', "Распределение по продуктам"),
+    ('finance', "Финансовые показатели"),
+    ('demographics', "Демографический анализ"),
+)
+
+
+def _products_figure(snapshot):
+    fig = Figure(figsize=(12, 5))
+    ax1, ax2 = fig.subplots(1, 2)
+
+    # Круговая диаграмма продуктов
+    labels, counts = zip(*snapshot.product_counts)
+    ax1.pie(counts, labels=labels, autopct='%1.1f%%')
+    ax1.set_title('Распределение клиентов по продуктам')
+
+    # Столбчатая диаграмма регионов
+    labels, counts = zip(*snapshot.region_counts[:5])
+    ax2.bar(labels, counts)
+    ax2.set_title('Топ-5 регионов по количеству клиентов')
+    ax2.tick_params(axis='x', rotation=45)
+    return fig
+
+
+def _histogram_bar(ax, histogram, **kwargs):
+    counts, edges = histogram
+    edges = np.asarray(edges)
+    ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', alpha=0.7, edgecolor='black', **kwargs)
+
+
+def _finance_figure(snapshot):
+    fig = Figure(figsize=(12, 5))
+    ax3, ax4 = fig.subplots(1, 2)
+
+    # Распределение доходов
+    _histogram_bar(ax3, snapshot.income_histogram)
+    ax3.set_title('Распределение доходов клиентов')
+    ax3.set_xlabel('Доход (руб)')
+    ax3.set_ylabel('Количество клиентов')
+
+    # Распределение балансов
+    _histogram_bar(ax4, snapshot.balance_histogram, color='orange')
+    ax4.set_title('Распределение балансов клиентов')
+    ax4.set_xlabel('Баланс (руб)')
+    ax4.set_ylabel('Количество клиентов')
+    return fig
+
+
+def _demographics_figure(snapshot):
+    fig = Figure(figsize=(12, 5))
+    ax5, ax6 = fig.subplots(1, 2)
+
+    # Распределение по возрастам
+    labels, counts = zip(*snapshot.chart_age_groups)
+    ax5.bar(labels, counts, color='green', alpha=0.7)
+    ax5.set_title('Распределение клиентов по возрастам')
+    ax5.set_xlabel('Возрастные группы')
+    ax5.set_ylabel('Количество клиентов')
+    ax5.tick_params(axis='x', rotation=45)
+
+    # Уровни риска
+    labels, counts = zip(*snapshot.risk_counts)
+    ax6.pie(counts, labels=labels, autopct='%1.1f%%', colors=['lightgreen', 'yellow', 'red'])
+    ax6.set_title('Распределение по уровням риска')
+    return fig
+
+
+_BUILDERS = {
+    'products': _products_figure,
+    'finance': _finance_figure,
+    'demographics': _demographics_figure,
+}
+
+
+def build_figure(tab, snapshot):
+    fig = _BUILDERS[tab](snapshot)
+    fig.tight_layout()
+    return fig
+
+
+class ChartCache:
+    """LRU кэш фигур по (ключ состояния фильтров, вкладка)
+
+    Figure matplotlib можно показать только на одном холсте, поэтому у
+    закэшированной фигуры есть владелец - окно, в котором она показана.
+    Пока это окно открыто, другие окна получают новую фигуру вне кэша;
+    после release(окно) фигура снова переиспользуется.
+    """
+
+    def __init__(self, max_figures=12):
+        self.max_figures = max_figures
+        # (ключ, вкладка) -> [фигура, окно-владелец или None]
+        self._figures = OrderedDict()
+
+    def figure(self, key, tab, snapshot, owner=None):
+        """Фигура вкладки для показа в окне owner"""
+        cache_key = (key, tab)
+        entry = self._figures.get(cache_key)
+        if entry is None:
+            entry = [build_figure(tab, snapshot), owner]
+            self._figures[cache_key] = entry
+            self._evict(keep=cache_key)
+        elif entry[1] is None or entry[1] is owner:
+            entry[1] = owner
+            self._figures.move_to_end(cache_key)
+        else:
+            # Фигура на холсте другого открытого окна
+            return build_figure(tab, snapshot)
+        return entry[0]
+
+    def release(self, owner):
+        """Окно owner закрыто: его фигуры свободны для других окон"""
+        for entry in self._figures.values():
+            if entry[1] is owner:
+                entry[1] = None
+
+    def _evict(self, keep):
+        for cache_key in list(self._figures):
+            if len(self._figures) <= self.max_figures:
+                break
+            fig, owner = self._figures[cache_key]
+            # Фигуры открытых окон не очищаем, иначе окно останется с пустыми графиками
+            if owner is None and cache_key != keep:
+                del self._figures[cache_key]
+                fig.clear()
+
+    def clear(self):
+        for fig, owner in self._figures.values():
+            if owner is None:
+                fig.clear()
+        self._figures.clear()
@@ -0,0 +1,102 @@
+"""Фоновые вычисления для интерфейса.
+
+ComputeScheduler выполняет поиск, фильтрацию и агрегацию в пуле потоков
+(NumPy и pandas отпускают GIL на тяжёлых операциях), чтобы mainloop Tk
+не блокировался. Каждая задача относится к каналу ('search', 'view', ...)
+и получает номер поколения; результат задачи, которую успела заменить
+более новая в том же канале, отбрасывается. Готовые результаты
+передаются в главный поток через очередь, которую опрашивает root.after -
+виджеты Tk трогаются только из главного потока. Ошибки задач без своего
+on_error уходят в общий обработчик планировщика, а исключение в
+обработчике только пишется в лог и не останавливает опрос очереди.
+"""
+import os
+import queue
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# Опрос очереди результатов ~60 раз в секунду, пока есть незавершённые задачи
+POLL_MS = 16
+
+
+class ComputeScheduler:
+    """Пул потоков с поколениями задач по каналам"""
+
+    def __init__(self, root, max_workers=None, poll_ms=POLL_MS, on_error=None):
+        self.root = root
+        self.poll_ms = poll_ms
+        # Обработчик ошибок задач, поставленных без on_error
+        self.on_error = on_error
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or min(4, os.cpu_count() or 1),
+                                        thread_name_prefix="compute")
+        self._results = queue.SimpleQueue()
+        self._generations = {}
+        self._pending = {}
+        self._polling = False
+
+    def submit(self, channel, fn, *args, on_done=None, on_error=None):
+        """Ставит fn(*args) в очередь канала; предыдущая задача канала становится устаревшей"""
+        generation = self._generations.get(channel, 0) + 1
+        self._generations[channel] = generation
+
+        previous = self._pending.get(channel)
+        if previous is not None:
+            # Ещё не начатую задачу можно отменить; начатая досчитается, но результат отбросится
+            previous.cancel()
+
+        future = self._pool.submit(fn, *args)
+        future.add_done_callback(
+            lambda f: self._results.put((channel, generation, f, on_done, on_error)))
+        self._pending[channel] = future
+        self._ensure_polling()
+        return generation
+
+    def is_current(self, channel, generation):
+        return self._generations.get(channel) == generation
+
+    def busy(self):
+        return any(not f.done() for f in self._pending.values())
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _ensure_polling(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self._poll)
+
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    channel, generation, future, on_done, on_error = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                if future.cancelled() or not self.is_current(channel, generation):
+                    continue
+                if self._pending.get(channel) is future:
+                    del self._pending[channel]
+                self._deliver(future, on_done, on_error)
+        finally:
+            # Опрос продолжается при любом исходе, иначе следующие результаты не дойдут до интерфейса
+            if self._pending or not self._results.empty():
+                self.root.after(self.poll_ms, self._poll)
+            else:
+                self._polling = False
+
+    def _deliver(self, future, on_done, on_error):
+        """Передаёт результат или ошибку задачи обработчику; исключение обработчика пишется в лог"""
+        error = future.exception()
+        try:
+            if error is None:
+                if on_done is not None:
+                    on_done(future.result())
+                return
+            handler = on_error or self.on_error
+            if handler is not None:
+                handler(error)
+            else:
+                traceback.print_exception(type(error), error, error.__traceback__)
+        except Exception as e:
+            print("Ошибка в обработчике результата фоновой задачи:")
+            traceback.print_exception(type(e), e, e.__traceback__)
@@ -0,0 +1,265 @@
+"""Бинарный колоночный кэш рядом с CSV.
+
+Первая загрузка CSV сохраняет каждую колонку отдельным .npy файлом в
+папке `<csv>.cache/`. Числовые колонки и коды категорий открываются
+через mmap, поэтому страницы файлов делятся через page cache ОС между
+всеми экземплярами приложения на одной машине. Кэш сбрасывается, если у
+CSV изменился размер или mtime. В кэш пишется таблица уже в компактной
+схеме (см. schema.py), поэтому загрузка из кэша не пересчитывает типы.
+Строки, дописанные в конец CSV, дописываются и в кэш (append_cache): в
+конец каждого .npy, с заменой длины в заголовке, без перезаписи старых строк.
+"""
+import glob
+import io
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from schema import CATEGORICAL_COLUMNS, CSV_DTYPES, apply_schema
+
+CACHE_VERSION = 2
+
+_META_FILE = 'meta.json'
+
+# Временный файл прерванной записи, не менявшийся столько секунд, считается брошенным
+STALE_TMP_SECONDS = 3600
+
+
+def cache_dir(csv_path):
+    """Папка кэша для CSV файла"""
+    return f"{csv_path}.cache"
+
+
+def remove_stale_tmp(path, max_age=STALE_TMP_SECONDS):
+    """Удаляет брошенные `<path>.tmp-PID` - остатки записи кэша или базы, прерванной вместе с процессом
+
+    PID в имени не отличает живой процесс от упавшего, поэтому удаляются
+    только давно не менявшиеся файлы: запись, идущая в другом процессе,
+    обновляет их постоянно.
+    """
+    for tmp in glob.glob(f"{glob.escape(path)}.tmp-*"):
+        try:
+            stamps = [os.path.getmtime(tmp)]
+            if os.path.isdir(tmp):
+                stamps += [entry.stat().st_mtime for entry in os.scandir(tmp)]
+            if time.time() - max(stamps) < max_age:
+                continue
+            if os.path.isdir(tmp):
+                shutil.rmtree(tmp)
+            else:
+                os.remove(tmp)
+        except OSError:
+            # Файл удалил другой процесс или он ещё занят - попробуем при следующей загрузке
+            continue
+
+
+def csv_signature(csv_path):
+    stat = os.stat(csv_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, _META_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def cached_source(csv_path):
+    """Размер и mtime CSV, которому соответствует кэш, или None"""
+    meta = _read_meta(cache_dir(csv_path))
+    return None if meta is None else meta.get('source')
+
+
+def is_cache_valid(csv_path):
+    """Кэш существует, той же версии и соответствует текущему CSV"""
+    meta = _read_meta(cache_dir(csv_path))
+    if meta is None or meta.get('version') != CACHE_VERSION:
+        return False
+    try:
+        return meta.get('source') == csv_signature(csv_path)
+    except OSError:
+        return False
+
+
+def write_cache(csv_path, df, source=None):
+    """Сохраняет DataFrame колонками .npy; source - подпись CSV, из которого прочитан df"""
+    target = cache_dir(csv_path)
+    tmp = f"{target}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    columns = []
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        file_name = f"{i:03d}.npy"
+        entry = {'name': col, 'file': file_name}
+        if isinstance(series.dtype, pd.CategoricalDtype) or col in CATEGORICAL_COLUMNS:
+            cat = pd.Categorical(series)
+            entry['kind'] = 'category'
+            entry['categories'] = [str(c) for c in cat.categories]
+            values = cat.codes
+        elif pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_datetime64_dtype(series.dtype):
+            entry['kind'] = 'numeric'
+            values = series.to_numpy()
+        else:
+            # Строки высокой кардинальности храним в фиксированной ширине (<U)
+            entry['kind'] = 'string'
+            values = series.astype(str).to_numpy(dtype=str)
+        np.save(os.path.join(tmp, file_name), values, allow_pickle=False)
+        columns.append(entry)
+
+    meta = {'version': CACHE_VERSION, 'source': source or csv_signature(csv_path), 'rows': len(df),
+            'columns': columns}
+    with open(os.path.join(tmp, _META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+
+
+def _new_values(entry, series):
+    """(обновлённое описание колонки, значения для дописывания) или None, если в формат колонки не входят"""
+    entry = dict(entry)
+    if entry['kind'] == 'category':
+        values = series.astype(str).where(series.notna(), None)
+        extra = sorted(set(values.dropna()) - set(entry['categories']))
+        # Новые значения - в конец словаря, коды старых строк остаются прежними. Словарь
+        # перестаёт быть отсортированным: порядок значений индексы берут по подписям, не по кодам
+        entry['categories'] = entry['categories'] + extra
+        return entry, pd.Categorical(values, categories=entry['categories']).codes
+    if entry['kind'] == 'numeric':
+        return entry, series.to_numpy()
+    return entry, series.astype(str).to_numpy(dtype=str)
+
+
+def _append_npy(path, values):
+    """Дописывает values в одномерный .npy: данные в конец файла, затем новая длина в заголовке"""
+    with open(path, 'r+b') as f:
+        version = np.lib.format.read_magic(f)
+        if version != (1, 0):
+            raise ValueError(f"версия .npy {version}")
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        header_size = f.tell()
+        converted = np.asarray(values).astype(dtype)
+        if len(shape) != 1 or not np.array_equal(converted, values, equal_nan=converted.dtype.kind in 'fcmM'):
+            raise ValueError(f"значения не помещаются в {dtype}")
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(
+            header, {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': fortran_order,
+                     'shape': (shape[0] + len(converted),)})
+        if len(header.getvalue()) != header_size:
+            raise ValueError("заголовок .npy не помещается на месте")
+        f.seek(header_size + shape[0] * dtype.itemsize)
+        f.write(np.ascontiguousarray(converted).tobytes())
+        f.seek(0)
+        f.write(header.getvalue())
+
+
+def append_cache(csv_path, new_rows, base_size, source):
+    """Дописывает new_rows в кэш, если он описывает первые base_size байт CSV; source - новая подпись
+
+    Пока кэш меняется, meta.json убран: параллельные процессы считают кэш
+    устаревшим, а прерванная запись оставляет его недействительным - тогда он
+    пересоздаётся при следующей загрузке. False - кэш не подошёл или не дописан.
+    """
+    directory = cache_dir(csv_path)
+    meta = _read_meta(directory)
+    if (meta is None or meta.get('version') != CACHE_VERSION or (meta.get('source') or {}).get('size') != base_size
+            or [entry['name'] for entry in meta['columns']] != list(new_rows.columns)):
+        return False
+    columns = [_new_values(entry, new_rows[entry['name']]) for entry in meta['columns']]
+
+    meta_path = os.path.join(directory, _META_FILE)
+    claimed = f"{meta_path}.append-{os.getpid()}"
+    try:
+        # Переименование атомарно: дописывает только один процесс
+        os.rename(meta_path, claimed)
+    except OSError:
+        return False
+    try:
+        for entry, values in columns:
+            _append_npy(os.path.join(directory, entry['file']), values)
+        meta.update(source=source, rows=meta['rows'] + len(new_rows), columns=[entry for entry, _ in columns])
+        tmp = f"{meta_path}.tmp-{os.getpid()}"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, meta_path)
+    except (OSError, ValueError) as e:
+        print(f"Не удалось дописать кэш {directory}: {e}")
+        return False
+    finally:
+        os.remove(claimed)
+    return True
+
+
+def load_cache(csv_path, mmap=True):
+    """Загружает DataFrame из кэша; возвращает None, если кэш устарел"""
+    if not is_cache_valid(csv_path):
+        return None
+    directory = cache_dir(csv_path)
+    meta = _read_meta(directory)
+    mmap_mode = 'r' if mmap else None
+    index = pd.RangeIndex(meta['rows'])
+
+    data = {}
+    for entry in meta['columns']:
+        values = np.load(os.path.join(directory, entry['file']), mmap_mode=mmap_mode, allow_pickle=False)
+        if entry['kind'] == 'category':
+            values = pd.Categorical.from_codes(values, categories=entry['categories'])
+        elif entry['kind'] == 'string':
+            values = np.asarray(values, dtype=object)
+        data[entry['name']] = pd.Series(values, index=index, name=entry['name'], copy=False)
+    # copy=False не даёт pandas склеить колонки в блоки и потерять mmap
+    return pd.DataFrame(data, index=index, copy=False)
+
+
+class PrefixReader(io.RawIOBase):
+    """Первые limit байт файла: строки, дописанные во время чтения, в таблицу не попадают"""
+
+    def __init__(self, f, limit):
+        self._f = f
+        self._left = limit
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._left <= 0:
+            return 0
+        n = self._f.readinto(memoryview(buffer)[:self._left])
+        self._left -= n
+        return n
+
+
+def read_csv_cached(csv_path, **read_csv_kwargs):
+    """pd.read_csv с бинарным кэшем; ошибки кэша не мешают загрузке CSV"""
+    remove_stale_tmp(cache_dir(csv_path))
+    try:
+        df = load_cache(csv_path)
+    except Exception as e:
+        print(f"Кэш {cache_dir(csv_path)} повреждён: {e}")
+        df = None
+    if df is not None:
+        return df
+
+    read_csv_kwargs.setdefault('dtype', CSV_DTYPES)
+    read_csv_kwargs.setdefault('encoding', 'utf-8')
+    # Читаем ровно ту часть файла, которую описывает подпись, - её же запишем в кэш
+    with open(csv_path, 'rb') as f:
+        source = csv_signature(csv_path)
+        reader = io.BufferedReader(PrefixReader(f, source['size']), buffer_size=1 << 20)
+        df = apply_schema(pd.read_csv(reader, **read_csv_kwargs))
+    try:
+        write_cache(csv_path, df, source)
+        # Сразу переходим на кэш, чтобы типы колонок не зависели от того, первый ли это запуск
+        cached = load_cache(csv_path)
+    except Exception as e:
+        print(f"Не удалось записать кэш {cache_dir(csv_path)}: {e}")
+        cached = None
+    return df if cached is None else cached
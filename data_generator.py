@@ -0,0 +1,147 @@
+"""Векторизованный генератор синтетических клиентских данных.
+
+Каждая колонка строится целым массивом NumPy, а большие наборы делятся
+на шарды фиксированного размера. Шард получает собственный seed,
+производный от общего (SeedSequence со spawn_key), поэтому результат
+зависит только от (n, seed, chunk_size), но не от числа процессов.
+"""
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+REGIONS = ['Москва', 'Санкт-Петербург', 'Новосибирск', 'Екатеринбург', 'Казань', 'Нижний Новгород']
+PRODUCTS = ['Кредит', 'Вклад', 'Инвестиции', 'Ипотека', 'Страхование', 'Дебетовая карта']
+RISK_LEVELS = ['Низкий', 'Средний', 'Высокий']
+RISK_WEIGHTS = [0.6, 0.3, 0.1]
+
+COLUMNS = ['id', 'name', 'age', 'region', 'income', 'balance', 'assets', 'transactions',
+           'product', 'loyalty_years', 'risk_level', 'last_activity']
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+# Все возможные даты активности (2024 год, дни 1-28) - строки формируются один раз
+_ACTIVITY_DATES = np.array([f"2024-{month:02d}-{day:02d}" for month in range(1, 13) for day in range(1, 29)],
+                           dtype=object)
+_REGIONS = np.array(REGIONS, dtype=object)
+_PRODUCTS = np.array(PRODUCTS, dtype=object)
+_RISK_LEVELS = np.array(RISK_LEVELS, dtype=object)
+
+
+def shard_rng(seed, shard_index):
+    """Независимый генератор для шарда, воспроизводимый по (seed, shard_index)"""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(shard_index,)))
+
+
+def generate_shard(n, seed=42, shard_index=0, start_id=1):
+    """Генерирует n клиентов одним проходом по колонкам"""
+    rng = shard_rng(seed, shard_index)
+
+    ids = np.arange(start_id, start_id + n, dtype=np.int64)
+    age = np.clip(rng.normal(45, 15, n), 18, 75).astype(np.int64)
+    income = np.clip(rng.lognormal(11, 0.5, n), 20000, 500000).astype(np.int64)
+    balance = np.maximum(5000, (income * rng.uniform(0.5, 12, n)).astype(np.int64))
+    assets = balance * rng.uniform(0.5, 3, n)
+    transactions = rng.poisson(15, n)
+    loyalty_years = rng.integers(0, 25, n)
+
+    return pd.DataFrame({
+        'id': ids,
+        'name': 'Клиент_' + pd.Series(ids).astype(str),
+        'age': age,
+        'region': _REGIONS[rng.integers(0, len(REGIONS), n)],
+        'income': income,
+        'balance': balance,
+        'assets': assets,
+        'transactions': transactions,
+        'product': _PRODUCTS[rng.integers(0, len(PRODUCTS), n)],
+        'loyalty_years': loyalty_years,
+        'risk_level': _RISK_LEVELS[rng.choice(len(RISK_LEVELS), size=n, p=RISK_WEIGHTS)],
+        'last_activity': _ACTIVITY_DATES[rng.integers(0, len(_ACTIVITY_DATES), n)],
+    }, columns=COLUMNS)
+
+
+def _shard_plan(n, chunk_size):
+    """Список (shard_index, start_id, size) для n строк"""
+    chunk_size = max(1, int(chunk_size))
+    return [(i, start + 1, min(chunk_size, n - start)) for i, start in enumerate(range(0, n, chunk_size))]
+
+
+def _generate_shard_task(args):
+    shard_index, start_id, size, seed = args
+    return generate_shard(size, seed=seed, shard_index=shard_index, start_id=start_id)
+
+
+def iter_client_chunks(n, seed=42, chunk_size=DEFAULT_CHUNK_SIZE, workers=1):
+    """Отдаёт шарды по порядку; при workers > 1 они считаются в пуле процессов.
+
+    Одновременно в памяти держится не больше 2 * workers шардов.
+    """
+    tasks = [(shard_index, start_id, size, seed) for shard_index, start_id, size in _shard_plan(n, chunk_size)]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(tasks))
+
+    if workers <= 1:
+        for task in tasks:
+            yield _generate_shard_task(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        remaining = iter(tasks)
+        for task in remaining:
+            pending.append(pool.submit(_generate_shard_task, task))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            chunk = pending.popleft().result()
+            next_task = next(remaining, None)
+            if next_task is not None:
+                pending.append(pool.submit(_generate_shard_task, next_task))
+            yield chunk
+
+
+def generate_clients(n=100, seed=42, chunk_size=DEFAULT_CHUNK_SIZE, workers=1):
+    """Генерирует n клиентов целиком в памяти"""
+    if n <= 0:
+        return pd.DataFrame({col: [] for col in COLUMNS}, columns=COLUMNS)
+    chunks = list(iter_client_chunks(n, seed=seed, chunk_size=chunk_size, workers=workers))
+    if len(chunks) == 1:
+        return chunks[0]
+    return pd.concat(chunks, ignore_index=True)
+
+
+def write_clients_csv(path, n, seed=42, chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+    """Пишет n клиентов в CSV по шардам, не собирая весь набор в памяти"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    written = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for chunk in iter_client_chunks(n, seed=seed, chunk_size=chunk_size, workers=workers):
+            chunk.to_csv(f, header=(written == 0), index=False)
+            written += len(chunk)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Генерация синтетических клиентских данных ВТБ")
+    parser.add_argument("--rows", type=int, default=int(os.environ.get("DATA_SAMPLE_SIZE", 100)))
+    parser.add_argument("--seed", type=int, default=int(os.environ.get("DATA_RANDOM_SEED", 42)))
+    parser.add_argument("--out", default=os.environ.get("DATA_CSV_PATH", "data/clients_data.csv"))
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None, help="по умолчанию - число ядер")
+    args = parser.parse_args(argv)
+
+    written = write_clients_csv(args.out, args.rows, seed=args.seed, chunk_size=args.chunk_size,
+                                workers=args.workers)
+    print(f"Сгенерировано {written} клиентов в {args.out}")
+
+
+if __name__ == "__main__":
+    main()
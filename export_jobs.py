@@ -0,0 +1,188 @@
+"""Фоновый экспорт выборки клиентов по частям.
+
+ExportJob пишет выборку в отдельном потоке блоками по chunk_size строк,
+поэтому интерфейс не блокируется. Прогресс и скорость читаются из полей
+задачи (их опрашивает UI через root.after), задачу можно отменить -
+недописанный файл при этом удаляется.
+
+Форматы: CSV, CSV.gz, CSV.zst (нужен zstandard), Parquet и Feather
+(нужен pyarrow).
+"""
+import gzip
+import io
+import os
+import threading
+import time
+
+from schema import with_names
+
+try:
+    import zstandard
+
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+EXPORT_FORMATS = {
+    'csv': '.csv',
+    'csv.gz': '.csv.gz',
+    'csv.zst': '.csv.zst',
+    'parquet': '.parquet',
+    'feather': '.feather',
+}
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+def available_formats():
+    """Форматы, для которых установлены нужные библиотеки"""
+    formats = ['csv', 'csv.gz']
+    if ZSTD_AVAILABLE:
+        formats.append('csv.zst')
+    if PYARROW_AVAILABLE:
+        formats += ['parquet', 'feather']
+    return formats
+
+
+class _CsvWriter:
+    def __init__(self, path, fmt):
+        if fmt == 'csv.gz':
+            self.file = gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=6)
+        elif fmt == 'csv.zst':
+            raw = open(path, 'wb')
+            self.file = io.TextIOWrapper(zstandard.ZstdCompressor(level=3).stream_writer(raw),
+                                         encoding='utf-8', newline='')
+        else:
+            self.file = open(path, 'w', encoding='utf-8', newline='')
+        self.header = True
+
+    def write(self, chunk):
+        chunk.to_csv(self.file, header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        self.file.close()
+
+
+class _ArrowWriter:
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self.writer = None
+
+    def write(self, chunk):
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if self.writer is None:
+            if self.fmt == 'parquet':
+                self.writer = pyarrow.parquet.ParquetWriter(self.path, table.schema)
+            else:
+                # Feather v2 - это файл формата Arrow IPC
+                self.writer = pyarrow.ipc.new_file(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _open_writer(path, fmt):
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат экспорта: {fmt}")
+    if fmt not in available_formats():
+        raise RuntimeError(f"Для формата {fmt} не установлены нужные библиотеки")
+    if fmt in ('parquet', 'feather'):
+        return _ArrowWriter(path, fmt)
+    return _CsvWriter(path, fmt)
+
+
+class ExportJob:
+    """Экспорт строк rows из df (None - все строки) в файл path в отдельном потоке"""
+
+    def __init__(self, df, rows, path, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+        self.df = df
+        self.rows = rows
+        self.path = path
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+        self.total = self._count()
+        self.rows_written = 0
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.done = False
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def _count(self):
+        return len(self.df) if self.rows is None else len(self.rows)
+
+    def chunks(self):
+        """Выборка блоками по chunk_size строк"""
+        for start in range(0, self.total, self.chunk_size):
+            stop = min(start + self.chunk_size, self.total)
+            yield self.df.iloc[start:stop] if self.rows is None else self.df.iloc[self.rows[start:stop]]
+
+    @property
+    def cancelled(self):
+        """Отмена успела прервать запись до конца выборки"""
+        return self._cancel.is_set() and self.rows_written < self.total
+
+    @property
+    def progress(self):
+        return self.rows_written / self.total if self.total else 1.0
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def throughput(self):
+        """Строк в секунду"""
+        elapsed = self.elapsed
+        return self.rows_written / elapsed if elapsed > 0 else 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name=f"export-{os.path.basename(self.path)}", daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self):
+        self.started_at = time.perf_counter()
+        writer = None
+        try:
+            writer = _open_writer(self.path, self.fmt)
+            for chunk in self.chunks():
+                if self._cancel.is_set():
+                    break
+                writer.write(with_names(chunk))
+                self.rows_written += len(chunk)
+        except Exception as e:
+            self.error = e
+        finally:
+            if writer is not None:
+                try:
+                    writer.close()
+                except Exception as e:
+                    self.error = self.error or e
+            if (self.error is not None or self.cancelled) and os.path.exists(self.path):
+                os.remove(self.path)
+            self.finished_at = time.perf_counter()
+            self.done = True
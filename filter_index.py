@@ -0,0 +1,134 @@
+"""Битовый индекс для фильтров по возрасту, региону и продукту.
+
+Для каждого значения региона, продукта и каждой возрастной группы
+заранее строится упакованная битовая маска (1 бит на клиента, слова по
+64 бита). Любая комбинация фильтров и маски поиска - это AND нескольких
+масок, результат - один массив номеров строк без копий DataFrame.
+Строки, дописанные в конец таблицы, добавляются в маски без пересчёта
+и копирования старых строк (appended, маски лежат в growable.GrowableArray).
+"""
+import numpy as np
+import pandas as pd
+
+from growable import GrowableArray
+
+ALL = "Все"
+
+AGE_RANGES = {"18-30": (18, 30), "31-45": (31, 45), "46-60": (46, 60), "60+": (60, 75)}
+
+
+class FilterIndex:
+    """Упакованные битовые маски по значениям колонок фильтров"""
+
+    def __init__(self, df, columns=('region', 'product')):
+        self.columns = tuple(columns)
+        self.n_rows = len(df)
+        self._bitmaps = {'age': {}}
+        self._bitmaps.update({col: {} for col in self.columns})
+        # Байты масок с запасом для дописывания; в _bitmaps - они же как слова uint64
+        self._buffers = {col: {} for col in self._bitmaps}
+        self._empty_buffer = self._buffer(np.zeros(self.n_rows, dtype=bool))
+        self._empty = self._words_of(self._empty_buffer)
+        for col, value, mask in self._value_masks(df):
+            self._store(col, value, self._buffer(mask))
+
+    def _value_masks(self, df):
+        """(колонка, значение, булева маска строк df) для всех масок индекса"""
+        ages = df['age'].to_numpy()
+        for label, (low, high) in AGE_RANGES.items():
+            yield 'age', label, (ages >= low) & (ages <= high)
+
+        for col in self.columns:
+            series = df[col]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                codes, values = series.cat.codes.to_numpy(), series.cat.categories
+            else:
+                codes, values = pd.factorize(series)
+            for code, value in enumerate(values):
+                yield col, value, codes == code
+
+    def pack(self, mask):
+        """Булева маска -> массив uint64 (по 64 строки в слове)"""
+        return self._words(np.packbits(mask))
+
+    @staticmethod
+    def _words(packed):
+        padding = -len(packed) % 8
+        if padding:
+            packed = np.concatenate([packed, np.zeros(padding, dtype=np.uint8)])
+        return packed.view(np.uint64)
+
+    def _buffer(self, mask):
+        return GrowableArray(self.pack(mask).view(np.uint8), size=(self.n_rows + 7) // 8)
+
+    @staticmethod
+    def _words_of(buffer):
+        return buffer.padded(8).view(np.uint64)
+
+    def _store(self, col, value, buffer):
+        self._buffers[col][value] = buffer
+        self._bitmaps[col][value] = self._words_of(buffer)
+
+    def _extend(self, buffer, mask):
+        """Байты маски buffer с дописанными в конец битами mask"""
+        keep = len(buffer)
+        tail = self.n_rows % 8
+        if tail:
+            # Последний байт заполнен частично: его биты идут перед новыми
+            keep -= 1
+            mask = np.concatenate([np.unpackbits(buffer.values[-1:])[:tail].astype(bool), mask])
+        return buffer.appended(np.packbits(mask), keep=keep)
+
+    def appended(self, df_new):
+        """Новый индекс для таблицы, дополненной строками df_new; старые строки не пересчитываются"""
+        result = FilterIndex.__new__(FilterIndex)
+        result.columns = self.columns
+        result.n_rows = self.n_rows + len(df_new)
+        result._bitmaps = {col: {} for col in self._bitmaps}
+        result._buffers = {col: {} for col in self._bitmaps}
+        no_rows = np.zeros(len(df_new), dtype=bool)
+        result._empty_buffer = self._extend(self._empty_buffer, no_rows)
+        result._empty = self._words_of(result._empty_buffer)
+        new_masks = {}
+        for col, value, mask in self._value_masks(df_new):
+            new_masks[(col, value)] = mask
+        for col, buffers in self._buffers.items():
+            for value, buffer in buffers.items():
+                result._store(col, value, self._extend(buffer, new_masks.pop((col, value), no_rows)))
+        # Значения, которых раньше не было: пустая маска старых строк (копия буфера) и биты новых
+        for (col, value), mask in new_masks.items():
+            result._store(col, value, self._extend(self._empty_buffer, mask))
+        for col in {col for col, _ in new_masks if col != 'age'}:
+            # values() - по алфавиту, как словарь категорий при полной загрузке
+            for masks in (result._bitmaps, result._buffers):
+                masks[col] = dict(sorted(masks[col].items(), key=lambda item: str(item[0])))
+        return result
+
+    def unpack(self, bitmap):
+        """Массив uint64 -> булева маска длиной n_rows"""
+        return np.unpackbits(bitmap.view(np.uint8), count=self.n_rows).astype(bool)
+
+    def values(self, column):
+        """Значения колонки, для которых построены маски"""
+        return list(self._bitmaps[column])
+
+    def bitmap(self, age=ALL, region=ALL, product=ALL, search=None):
+        """AND масок выбранных фильтров; None, если не выбран ни один фильтр"""
+        selected = [search] if search is not None else []
+        for column, value in (('age', age), ('region', region), ('product', product)):
+            if value != ALL:
+                selected.append(self._bitmaps[column].get(value, self._empty))
+
+        if not selected:
+            return None
+        result = selected[0].copy()
+        for bitmap in selected[1:]:
+            np.bitwise_and(result, bitmap, out=result)
+        return result
+
+    def select(self, age=ALL, region=ALL, product=ALL, search=None):
+        """Номера отобранных строк; None означает все строки"""
+        result = self.bitmap(age, region, product, search)
+        if result is None:
+            return None
+        return np.flatnonzero(self.unpack(result))
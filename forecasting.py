@@ -0,0 +1,135 @@
+"""Прогноз балансов клиентов.
+
+Годовой темп роста баланса задаётся для сегмента (уровень риска x
+группа дохода x группа лояльности) и один раз раскладывается по строкам
+таблицы. Прогноз выборки - это одна векторная операция по её строкам,
+лучшие по приросту клиенты отбираются через argpartition без полной
+сортировки. Результаты кэшируются в LRU по состоянию фильтров, как
+снимки analytics.Aggregator.
+"""
+import copy
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from growable import GrowableArray
+
+# Базовый годовой рост баланса по уровню риска
+RISK_GROWTH = {'Низкий': 0.03, 'Средний': 0.06, 'Высокий': 0.10}
+DEFAULT_GROWTH = 0.05
+
+# Надбавки по группам дохода (руб/мес) и лояльности (лет): интервалы [bins[i], bins[i + 1])
+INCOME_BINS = (50000, 100000, 150000)
+INCOME_GROWTH = (0.0, 0.01, 0.02, 0.04)
+LOYALTY_BINS = (3, 10)
+LOYALTY_GROWTH = (0.0, 0.01, 0.02)
+
+HORIZON_MONTHS = 12
+TOP_N = 10
+
+
+@dataclass(frozen=True)
+class Forecast:
+    """Прогноз балансов одной выборки клиентов"""
+    count: int
+    total_balance: float
+    total_projected: float
+    horizon_months: int
+    top_rows: tuple  # номера строк с наибольшим приростом, по убыванию прироста
+    top_balance: tuple
+    top_projected: tuple
+
+    @property
+    def growth(self):
+        return self.total_projected - self.total_balance
+
+    @property
+    def growth_pct(self):
+        return self.growth / self.total_balance * 100 if self.total_balance else 0.0
+
+
+def segment_growth(risk_levels, income, loyalty_years):
+    """Годовой темп роста для каждой строки по её сегменту"""
+    risk = np.asarray(pd.Series(risk_levels).map(RISK_GROWTH).fillna(DEFAULT_GROWTH), dtype=np.float64)
+    income_bonus = np.take(INCOME_GROWTH, np.searchsorted(INCOME_BINS, income, side='right'))
+    loyalty_bonus = np.take(LOYALTY_GROWTH, np.searchsorted(LOYALTY_BINS, loyalty_years, side='right'))
+    return risk + income_bonus + loyalty_bonus
+
+
+def top_indices(values, n):
+    """Позиции n наибольших значений по убыванию; сортируются только они"""
+    if n <= 0 or len(values) == 0:
+        return np.empty(0, dtype=np.intp)
+    if n < len(values):
+        candidates = np.argpartition(values, len(values) - n)[len(values) - n:]
+    else:
+        candidates = np.arange(len(values))
+    return candidates[np.argsort(-values[candidates], kind='stable')]
+
+
+class Forecaster:
+    """Прогноз балансов по номерам строк с LRU кэшем по состоянию фильтров"""
+
+    def __init__(self, df, horizon_months=HORIZON_MONTHS, top_n=TOP_N, cache_size=32):
+        self.horizon_months = horizon_months
+        self.top_n = top_n
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        # Колонки строк с запасом ёмкости: appended не копирует старые строки
+        self._balance = GrowableArray(df['balance'].to_numpy(dtype=np.float64))
+        rate = segment_growth(df['risk_level'], df['income'].to_numpy(), df['loyalty_years'].to_numpy())
+        # Множитель баланса за горизонт прогноза
+        self._factor = GrowableArray((1 + rate) ** (horizon_months / 12))
+
+    def appended(self, df_new):
+        """Новый Forecaster для таблицы, дополненной строками df_new; кэш не переносится"""
+        result = copy.copy(self)
+        result._cache = OrderedDict()
+        result._lock = threading.Lock()
+        rate = segment_growth(df_new['risk_level'], df_new['income'].to_numpy(), df_new['loyalty_years'].to_numpy())
+        result._balance = self._balance.appended(df_new['balance'].to_numpy(dtype=np.float64))
+        result._factor = self._factor.appended((1 + rate) ** (self.horizon_months / 12))
+        return result
+
+    def forecast(self, rows=None, key=None):
+        """Прогноз для строк rows (None - все строки); key - ключ состояния фильтров для кэша"""
+        if key is not None:
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    return cached
+
+        result = self.compute(rows)
+
+        if key is not None:
+            with self._lock:
+                self._cache[key] = result
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def compute(self, rows=None):
+        balance, factor = self._balance.values, self._factor.values
+        if rows is not None:
+            balance, factor = balance[rows], factor[rows]
+        projected = balance * factor
+        top = top_indices(projected - balance, self.top_n)
+        top_rows = top if rows is None else np.asarray(rows)[top]
+        return Forecast(
+            count=len(balance),
+            total_balance=float(balance.sum()),
+            total_projected=float(projected.sum()),
+            horizon_months=self.horizon_months,
+            top_rows=tuple(int(r) for r in top_rows),
+            top_balance=tuple(float(v) for v in balance[top]),
+            top_projected=tuple(float(v) for v in projected[top]),
+        )
@@ -0,0 +1,66 @@
+"""Массивы NumPy с запасом ёмкости для дописывания строк.
+
+Индексы хаба при живом обновлении не пересчитывают старые строки, но
+np.concatenate всё равно копировал бы их целиком. GrowableArray держит
+буфер с запасом: дописанные значения кладутся после занятой части, а
+новая версия получает view на больший префикс того же буфера. Прежняя
+версия по-прежнему видит свой префикс. Буфер копируется, только когда
+кончается запас (ёмкость растёт вдвое), поэтому дописывание k строк
+стоит в среднем O(k), а не O(n).
+"""
+import threading
+
+import numpy as np
+
+# Наименьшая ёмкость нового буфера; кратна 8, чтобы байтовый буфер смотрелся как uint64
+MIN_CAPACITY = 64
+
+
+class _Buffer:
+    def __init__(self, data, used):
+        self.data = data
+        # Сколько элементов занято последней версией: писать на место может только она
+        self.used = used
+        self.lock = threading.Lock()
+
+
+class GrowableArray:
+    """Одномерный массив и общий с его продолжениями буфер"""
+
+    def __init__(self, values, size=None):
+        """values - данные (без копии); size - сколько из них занято, остальное - запас"""
+        values = np.asarray(values)
+        size = len(values) if size is None else size
+        self._buffer = _Buffer(values, size)
+        self.values = values[:size]
+
+    def __len__(self):
+        return len(self.values)
+
+    def padded(self, multiple):
+        """Занятая часть, дополненная до кратной multiple длины из запаса буфера"""
+        return self._buffer.data[:-(-len(self) // multiple) * multiple]
+
+    def appended(self, new_values, keep=None):
+        """Новая версия: первые keep элементов (по умолчанию все) и за ними new_values"""
+        new_values = np.asarray(new_values)
+        keep = len(self) if keep is None else keep
+        size = keep + len(new_values)
+        dtype = np.promote_types(self.values.dtype, new_values.dtype)
+        buffer = self._buffer
+        with buffer.lock:
+            in_place = (buffer.used == len(self) and len(buffer.data) >= size and buffer.data.dtype == dtype
+                        and buffer.data.flags.writeable)
+            if in_place:
+                buffer.data[keep:size] = new_values
+                buffer.used = size
+        if not in_place:
+            capacity = max(MIN_CAPACITY, -(-2 * size // 8) * 8)
+            data = np.zeros(capacity, dtype=dtype)
+            data[:keep] = self.values[:keep]
+            data[keep:size] = new_values
+            buffer = _Buffer(data, size)
+        result = GrowableArray.__new__(GrowableArray)
+        result._buffer = buffer
+        result.values = buffer.data[:size]
+        return result
@@ -0,0 +1,104 @@
+"""Живое обновление данных из дописываемого CSV.
+
+CsvTail помнит, до какого байта файл уже прочитан, и при опросе разбирает
+только дописанные с тех пор полные строки - стоимость обновления зависит
+от числа новых строк, а не от размера файла. Перезапись файла (другой
+inode, файл стал короче, изменились заголовок или байты перед прочитанным
+смещением) опрос сообщает отдельно - тогда данные загружаются заново.
+
+append_rows дописывает новые строки к таблице в компактной схеме,
+объединяя словари категорий так, что коды старых строк не меняются.
+"""
+import io
+import os
+
+import pandas as pd
+
+from schema import CSV_DTYPES, NAME_COLUMN, apply_schema, has_derived_names, with_names
+
+UNCHANGED = 'unchanged'
+APPENDED = 'appended'
+REWRITTEN = 'rewritten'
+
+# Сколько байт перед прочитанным смещением сверяется при каждом опросе
+GUARD_BYTES = 256
+
+
+class CsvTail:
+    """Прочитанная часть CSV файла и разбор дописанных после неё строк"""
+
+    def __init__(self, path, offset=None):
+        self.path = path
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self._inode = stat.st_ino
+            self._header = f.readline()
+            self.columns = self._header.decode('utf-8').strip().split(',')
+            self.offset = stat.st_size if offset is None else offset
+            self._guard = self._read_guard(f)
+
+    def _read_guard(self, f):
+        start = max(len(self._header), self.offset - GUARD_BYTES)
+        f.seek(start)
+        return f.read(self.offset - start)
+
+    def _rewritten(self, f, stat):
+        if stat.st_ino != self._inode or stat.st_size < self.offset:
+            return True
+        f.seek(0)
+        if f.read(len(self._header)) != self._header:
+            return True
+        return self._read_guard(f) != self._guard
+
+    def poll(self):
+        """(UNCHANGED, None), (APPENDED, новые строки в компактной схеме) или (REWRITTEN, None)"""
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            # Файл на время убрали - остаёмся на уже загруженных данных
+            return UNCHANGED, None
+        with f:
+            stat = os.fstat(f.fileno())
+            if self._rewritten(f, stat):
+                return REWRITTEN, None
+            if stat.st_size == self.offset:
+                return UNCHANGED, None
+            f.seek(self.offset)
+            data = f.read(stat.st_size - self.offset)
+
+        # Недописанная последняя строка остаётся до следующего опроса
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            return UNCHANGED, None
+        data = data[:end]
+        rows = pd.read_csv(io.BytesIO(data), header=None, names=self.columns, dtype=CSV_DTYPES, encoding='utf-8')
+        self.offset += end
+        self._guard = (self._guard + data)[-GUARD_BYTES:]
+        return APPENDED, apply_schema(rows)
+
+
+def append_rows(df, new_rows):
+    """Таблица df с дописанными new_rows; None, если схемы не совпадают и нужна полная загрузка"""
+    if has_derived_names(df):
+        if NAME_COLUMN in new_rows.columns:
+            return None
+    elif NAME_COLUMN in df.columns:
+        new_rows = with_names(new_rows)
+    if list(new_rows.columns) != list(df.columns):
+        return None
+
+    data = {}
+    for col in df.columns:
+        old, new = df[col], new_rows[col]
+        if isinstance(old.dtype, pd.CategoricalDtype):
+            if not isinstance(new.dtype, pd.CategoricalDtype):
+                new = new.astype('category')
+            known = set(old.cat.categories)
+            extra = [value for value in new.cat.categories if value not in known]
+            if extra:
+                # Новые значения - в конец словаря, коды старых строк остаются прежними
+                # (порядок значений индексы берут по подписям, не по кодам)
+                old = old.cat.add_categories(extra)
+            new = new.cat.set_categories(old.cat.categories)
+        data[col] = pd.concat([old, new], ignore_index=True)
+    return pd.DataFrame(data)
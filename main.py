@@ -1,29 +1,214 @@
 import ttkbootstrap as tb
 from ttkbootstrap.constants import *
 from ttkbootstrap.widgets.scrolled import ScrolledText
-import pandas as pd
-import numpy as np
 from datetime import datetime
-import random
+import importlib.util
+import multiprocessing as mp
 import os
 import sys
+import traceback
+
+import analytics
+from analytics import Aggregator
+from compute import ComputeScheduler
+from data_cache import append_cache, cached_source, csv_signature, load_cache, read_csv_cached
+from data_generator import DEFAULT_CHUNK_SIZE, generate_clients, write_clients_csv
+from export_jobs import EXPORT_FORMATS, ExportJob, available_formats
+from filter_index import AGE_RANGES, ALL, FilterIndex
+from forecasting import Forecaster
+from live_refresh import APPENDED, UNCHANGED, CsvTail, append_rows
+from olap_cube import OlapCube
+from profiling import Profiler
+from schema import apply_schema, display_frame, format_memory, memory_usage, with_names
+from search_index import SearchIndex
+from sqlite_store import SqliteStore
+from streaming import FilterAggregates
+from table_view import SortIndex, TableView
+
+# matplotlib импортируется при первом открытии графиков - это заметная часть времени запуска
+MATPLOTLIB_AVAILABLE = importlib.util.find_spec("matplotlib") is not None
+_matplotlib = None
+
+
+def load_matplotlib():
+    """(FigureCanvasTkAgg, CHART_TABS, ChartCache) при первом обращении; None, если matplotlib недоступен"""
+    global _matplotlib, MATPLOTLIB_AVAILABLE
+    if _matplotlib is None and MATPLOTLIB_AVAILABLE:
+        try:
+            import matplotlib
+
+            matplotlib.use('Agg')  # Используем бэкенд без GUI для избежания конфликтов
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
-# Попытка импорта matplotlib с обработкой ошибок
-try:
-    import matplotlib
+            from charts import CHART_TABS, ChartCache
 
-    matplotlib.use('Agg')  # Используем бэкенд без GUI для избежания конфликтов
-    import matplotlib.pyplot as plt
-    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-    from matplotlib.figure import Figure
+            _matplotlib = (FigureCanvasTkAgg, CHART_TABS, ChartCache)
+        except ImportError as e:
+            print(f"Matplotlib не доступен: {e}")
+            MATPLOTLIB_AVAILABLE = False
+        except Exception as e:
+            print(f"Ошибка при импорте matplotlib: {e}")
+            MATPLOTLIB_AVAILABLE = False
+    return _matplotlib
+
+
+# Пауза в наборе текста, после которой запускается поиск
+SEARCH_DEBOUNCE_MS = 250
+# Период обновления прогресса экспорта в строке состояния
+EXPORT_POLL_MS = 200
+# Пауза между заполнением панелей дашборда: Tk успевает нарисовать уже готовые
+PANEL_STEP_MS = 1
+# Период обновления гистограммы задержек в строке состояния (при LOG_LEVEL=DEBUG)
+LATENCY_POLL_MS = 500
+
+# Обработчики интерфейса и фоновые задачи, которые оборачиваются интервалами профилировщика
+PROFILED_HANDLERS = (
+    'smart_search', 'apply_filters', 'reset_filters', 'update_dashboard', '_render_dashboard',
+    'generate_ai_insights', 'show_predictions', 'show_charts', 'show_data_table', 'export_to_csv',
+)
+PROFILED_TASKS = ('load_or_generate_data', '_load_streaming', '_compute_search', '_compute_view',
+                  '_compute_store_view', '_compute_streaming_view', '_compute_predictions', '_compute_refresh')
+
+
+class DashboardPanel:
+    """Панель дашборда с пулом строк: виджеты создаются один раз, обновляется только изменившийся текст"""
+
+    def __init__(self, parent, title, row, column, font=('Arial', 9), pady=1):
+        self.frame = tb.Labelframe(parent, text=title, padding=10)
+        self.grid_options = dict(row=row, column=column, padx=5, pady=5, sticky=NSEW)
+        self.frame.grid(**self.grid_options)
+        self.font = font
+        self.pady = pady
+        self._vars = []
+        self._labels = []
+        self._visible = 0
+
+    def set_lines(self, lines):
+        for i, line in enumerate(lines):
+            if i == len(self._labels):
+                self._vars.append(tb.StringVar(value=line))
+                self._labels.append(tb.Label(self.frame, textvariable=self._vars[i], font=self.font))
+            elif self._vars[i].get() != line:
+                self._vars[i].set(line)
+            if i >= self._visible:
+                self._labels[i].pack(anchor=W, pady=self.pady)
+        # Лишние строки прячем с конца, чтобы порядок pack не нарушался
+        for label in self._labels[len(lines):self._visible]:
+            label.pack_forget()
+        self._visible = len(lines)
+
+    def show(self):
+        self.frame.grid(**self.grid_options)
+
+    def hide(self):
+        self.frame.grid_remove()
+
+
+class RecommendationsPanel(DashboardPanel):
+    """Панель рекомендаций: ScrolledText перезаполняется только при изменении текста"""
+
+    def __init__(self, parent, title, row, column):
+        super().__init__(parent, title, row, column)
+        self.text_area = ScrolledText(self.frame, width=40, height=12, autohide=True)
+        self.text_area.pack(fill='both', expand=True)
+        self._text = None
+
+    def set_lines(self, lines):
+        text = "".join(f"• {r}\n" for r in lines)
+        if text == self._text:
+            return
+        self._text = text
+        self.text_area.delete('1.0', 'end')
+        self.text_area.insert('end', text)
+
+
+class VirtualTable:
+    """Treeview, в котором существуют только видимые строки; данные читаются блоками с запасом"""
+
+    def __init__(self, parent, view, height=25, buffer=200):
+        self.view = view
+        self.height = height
+        self.buffer = buffer
+        self.offset = 0
+        self._block = None
+        self._block_start = 0
+
+        self.tree = tb.Treeview(parent, columns=view.columns, show='headings', height=height)
+        for col in view.columns:
+            self.tree.heading(col, text=col, command=lambda c=col: self.sort_by(c))
+            self.tree.column(col, width=100, anchor=CENTER)
+        self.tree.pack(side=LEFT, fill=BOTH, expand=True)
+
+        self.vsb = tb.Scrollbar(parent, orient="vertical", command=self.yview)
+        self.vsb.pack(side=RIGHT, fill=Y)
+
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3))
+        self.tree.bind("<Configure>", self._on_resize)
+        self.render()
+
+    def yview(self, *args):
+        """Обработчик полосы прокрутки: ('moveto', доля) или ('scroll', шаг, 'units'|'pages')"""
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * len(self.view)))
+        elif args[0] == 'scroll':
+            self.scroll(int(args[1]) * (self.height if args[2] == 'pages' else 1))
+
+    def scroll(self, step):
+        self.scroll_to(self.offset + step)
+
+    def scroll_to(self, offset):
+        offset = max(0, min(offset, len(self.view) - self.height))
+        if offset != self.offset:
+            self.offset = offset
+            self.render()
+
+    def sort_by(self, column):
+        descending = self.view.sort_column == column and not self.view.descending
+        self.view.sort(column, descending)
+        for col in self.view.columns:
+            arrow = (" ▼" if descending else " ▲") if col == column else ""
+            self.tree.heading(col, text=col + arrow)
+        self._block = None
+        self.offset = 0
+        self.render()
+
+    def _visible_rows(self):
+        end = min(self.offset + self.height, len(self.view))
+        if (self._block is None or self.offset < self._block_start
+                or end > self._block_start + len(self._block)):
+            # Окно вышло за прочитанный блок - читаем новый с запасом в обе стороны
+            self._block_start = max(0, self.offset - self.buffer)
+            self._block = self.view.page(self._block_start, self.height + 2 * self.buffer)
+        start = self.offset - self._block_start
+        return self._block.iloc[start:start + self.height]
+
+    def render(self):
+        rows = list(self._visible_rows().itertuples(index=False))
+        items = self.tree.get_children()
+        for i, values in enumerate(rows):
+            if i < len(items):
+                self.tree.item(items[i], values=values)
+            else:
+                self.tree.insert('', END, values=values)
+        if len(items) > len(rows):
+            self.tree.delete(*items[len(rows):])
+
+        total = len(self.view)
+        if total:
+            self.vsb.set(self.offset / total, min(1.0, (self.offset + self.height) / total))
+        else:
+            self.vsb.set(0, 1)
 
-    MATPLOTLIB_AVAILABLE = True
-except ImportError as e:
-    print(f"Matplotlib не доступен: {e}")
-    MATPLOTLIB_AVAILABLE = False
-except Exception as e:
-    print(f"Ошибка при импорте matplotlib: {e}")
-    MATPLOTLIB_AVAILABLE = False
+    def _on_resize(self, event):
+        row_height = int(tb.Style().lookup('Treeview', 'rowheight') or 20)
+        # Одна строка уходит под заголовки колонок
+        height = max(1, event.height // row_height - 1)
+        if height != self.height:
+            self.height = height
+            self.offset = max(0, min(self.offset, len(self.view) - height))
+            self.render()
 
 
 class VTBIntelligenceHub:
@@ -32,61 +217,246 @@ class VTBIntelligenceHub:
         self.root.title("ВТБ Data Intelligence Hub")
         self.root.geometry("1400x900")
         self.is_dark_mode = False
-
-        # Загрузка данных
-        self.df = self.load_or_generate_data()
-        self.filtered_df = self.df.copy()
-
+        self.csv_file = os.environ.get("DATA_CSV_PATH", "data/clients_data.csv")
+        # Период опроса CSV на новые строки (мс); 0 - без живого обновления
+        self.refresh_interval = int(os.environ.get("AUTO_REFRESH_INTERVAL", 0))
+        self.csv_tail = None
+        # Где хранится таблица: pandas - в памяти, sqlite - в файле базы с индексами (см. sqlite_store.py)
+        self.storage_backend = os.environ.get("STORAGE_BACKEND", "pandas").lower()
+        # CSV больше порога (МБ) при хранилище pandas не загружается в память, а сворачивается
+        # потоково в агрегаты по фильтрам (см. streaming.py); 0 - загружать всегда
+        self.streaming_threshold = int(os.environ.get("STREAMING_THRESHOLD_MB", 4096)) * 1024 * 1024
+
+        # Профилирование включается LOG_LEVEL=DEBUG; обёртки ставятся до привязки обработчиков к виджетам
+        self.profiler = Profiler.from_env()
+        self.profiler.instrument(self, PROFILED_HANDLERS)
+        self.profiler.instrument(self, PROFILED_TASKS, category="compute")
+
+        # Данные и индексы появляются после фоновой загрузки (см. start_loading)
+        self.df = None
+        self.store = None
+        self.streaming = None
+        self.search_index = None
+        self.filter_index = None
+        self.aggregator = None
+        self.forecaster = None
+        self.sort_index = None
+        self.cube = None
+        self.search_bitmap = None
+        self.search_query = ""
+        self.view_rows = None
+        self.view_key = (ALL, ALL, ALL, "")
+        self.view_count = 0
+        self._search_job = None
+        self._dashboard_job = None
+        self._panel_job = None
+        self.export_job = None
+        self.scheduler = ComputeScheduler(self.root, on_error=self._on_task_error)
+        self.chart_cache = None
+
+        # Окно рисуется сразу, загрузка данных и первый расчёт панелей идут в фоне
         self.setup_ui()
-        self.update_dashboard()
+        self.start_loading()
+
+    @property
+    def data_ready(self):
+        return self.aggregator is not None or self.store is not None or self.streaming is not None
+
+    @property
+    def streaming_mode(self):
+        """CSV больше STREAMING_THRESHOLD_MB: в памяти только агрегаты, без строк таблицы"""
+        return (self.streaming_threshold > 0 and os.path.exists(self.csv_file)
+                and os.path.getsize(self.csv_file) > self.streaming_threshold)
+
+    def start_loading(self):
+        self.status_var.set("Загрузка данных...")
+        self.loading_bar.pack(side=RIGHT, padx=5)
+        self.loading_bar.start(10)
+        self.scheduler.submit('load', self._load_data, on_done=self._on_data_loaded, on_error=self._on_load_error)
+
+    def _load_data(self):
+        """Фоновая задача: набор данных, индексы над ним и прочитанная часть CSV для живого обновления"""
+        if self.storage_backend == 'sqlite':
+            return self._load_store()
+        if self.streaming_mode:
+            return self._load_streaming()
+        df = self.load_or_generate_data()
+        tail = None
+        if self.refresh_interval > 0:
+            # Кэш помнит размер CSV, из которого прочитана таблица: с этого байта и читаем новые строки
+            source = cached_source(self.csv_file)
+            tail = CsvTail(self.csv_file, offset=source['size'] if source else None)
+        return (df, SearchIndex(df), FilterIndex(df), Aggregator(df), Forecaster(df), SortIndex(df),
+                OlapCube.from_frame(df)), tail
+
+    def _load_store(self):
+        """Загрузка для STORAGE_BACKEND=sqlite: база строится из CSV один раз, дальше только открывается"""
+        if not os.path.exists(self.csv_file):
+            self.generate_data_csv()
+        # При перезагрузке после перезаписи CSV прежняя база открыта: новая строится в другой файл
+        store = SqliteStore.from_csv(self.csv_file, os.environ.get("SQLITE_PATH") or None)
+        # Число клиентов и куб читаются здесь, в фоне, а не первым обращением из главного потока
+        len(store)
+        store.cube
+        tail = CsvTail(self.csv_file, offset=store.source['size']) if self.refresh_interval > 0 else None
+        return store, tail
+
+    def _load_streaming(self):
+        """Загрузка CSV больше STREAMING_THRESHOLD_MB: один потоковый проход, пиковая память - размер части"""
+        # spawn: процессы пула не наследуют потоки Tk и фоновых вычислений этого процесса
+        return FilterAggregates.from_csv(self.csv_file, workers=None, mp_context=mp.get_context('spawn')), None
+
+    def _set_data(self, data):
+        if isinstance(data, FilterAggregates):
+            # Строк нет - индексы прежней таблицы освобождаются
+            self.streaming = data
+            (self.df, self.search_index, self.filter_index, self.aggregator,
+             self.forecaster, self.sort_index, self.cube) = (None,) * 7
+            values, count = self.streaming.values, len(self.streaming)
+        elif self.storage_backend == 'sqlite':
+            previous, self.store = self.store, data
+            # Прежняя база закроется, когда её отпустят открытые окна таблицы и экспорт
+            if previous is not None and previous is not data:
+                previous.retire()
+            self.cube = self.store.cube
+            values, count = self.store.values, len(self.store)
+        else:
+            (self.df, self.search_index, self.filter_index, self.aggregator,
+             self.forecaster, self.sort_index, self.cube) = data
+            self.streaming = None
+            values, count = self.filter_index.values, len(self.df)
+        # Выборка пересчитается в фоне; до этого действия работают со всей таблицей
+        self.view_rows = None
+        self.view_key = (ALL, ALL, ALL, "")
+        self.view_count = count
+        self.region_combo.configure(values=[ALL] + values('region'))
+        self.product_combo.configure(values=[ALL] + values('product'))
+        # Поиск, прогноз и таблица работают по строкам - в потоковом режиме их нет
+        for widget in self.row_controls:
+            widget.configure(state=DISABLED if self.streaming is not None else NORMAL)
+        if self.chart_cache is not None:
+            self.chart_cache.clear()
+
+    def _on_data_loaded(self, result):
+        data, self.csv_tail = result
+        for widget, state in self.data_controls:
+            widget.configure(state=state)
+        self._set_data(data)
+        self.loading_bar.stop()
+        self.loading_bar.pack_forget()
+        ready = "Готово" if MATPLOTLIB_AVAILABLE else "Готово (Matplotlib не доступен)"
+        # Первый снимок агрегатов тоже считается в фоне; панели заполнятся по мере готовности
+        self.refresh_view(f"{ready}. {self.memory_report()}")
+        if self.csv_tail is not None:
+            self.root.after(self.refresh_interval, self._poll_data_file)
+
+    def _on_load_error(self, error):
+        self.loading_bar.stop()
+        self.loading_bar.pack_forget()
+        self.status_var.set("Ошибка загрузки данных")
+        tb.messagebox.showerror("Ошибка", f"Не удалось загрузить данные: {error}")
+
+    def _on_task_error(self, error):
+        """Ошибка фоновой задачи без своего обработчика (выборка, поиск, инсайты, прогноз, графики)"""
+        traceback.print_exception(type(error), error, error.__traceback__)
+        self.status_var.set(f"Ошибка расчёта: {error}")
+
+    def _poll_data_file(self):
+        if self.csv_tail is None:
+            # После перезагрузки данные открыты в потоковом режиме - опрос файла не ведётся
+            return
+        self.scheduler.submit('refresh', self._compute_refresh, self.csv_tail, self.search_query,
+                              on_done=self._on_refresh_done, on_error=self._on_refresh_error)
+
+    def _compute_refresh(self, tail, query):
+        """Фоновая задача: таблица, индексы и маска поиска с дописанными в CSV строками
+
+        None, если файл не менялся. Опрос идёт только из этой задачи, поэтому
+        self.df и индексы здесь не меняются до её завершения.
+        """
+        base_size = tail.offset
+        status, new_rows = tail.poll()
+        if status == UNCHANGED:
+            return None
+        added = None
+        data = None
+        if status == APPENDED and self.store is not None:
+            # Подпись CSV сохраняется, только если база теперь описывает весь файл
+            source = csv_signature(tail.path)
+            self.store.append(new_rows, source if source['size'] == tail.offset else None)
+            return len(new_rows), self.store, tail, query, None
+        if status == APPENDED:
+            df = None
+            source = csv_signature(tail.path)
+            if source['size'] == tail.offset and append_cache(self.csv_file, new_rows, base_size, source):
+                # Строки дописаны в бинарный кэш: таблица снова открывается через mmap, без копии в памяти,
+                # и следующий запуск не разбирает CSV заново
+                df = load_cache(self.csv_file)
+            if df is None:
+                df = append_rows(self.df, new_rows)
+            if df is not None:
+                # Индексы продлеваются только на новые строки, старые не пересчитываются и не копируются
+                added = len(new_rows)
+                data = (df, self.search_index.appended(df), self.filter_index.appended(new_rows),
+                        self.aggregator.appended(df), self.forecaster.appended(new_rows),
+                        self.sort_index.appended(df), self.cube.appended(new_rows))
+        if data is None:
+            # Файл перезаписан - полная перезагрузка
+            data, tail = self._load_data()
+        if self.store is not None or isinstance(data, FilterAggregates):
+            return added, data, tail, query, None
+        mask = data[1].search(query)
+        return added, data, tail, query, (data[2].pack(mask) if mask is not None else None)
+
+    def _on_refresh_done(self, result):
+        self.root.after(self.refresh_interval, self._poll_data_file)
+        if result is None:
+            return
+        added, data, self.csv_tail, query, search_bitmap = result
+        self._set_data(data)
+        self.search_bitmap = search_bitmap
+        status = "Данные перезагружены" if added is None else f"Добавлено клиентов: {added:,}"
+        self.refresh_view(f"{status}. {self.memory_report()}")
+        if query != self.search_query:
+            # Запрос сменился, пока шло обновление: маска выше - для прежнего запроса
+            self._run_search()
+
+    def _on_refresh_error(self, error):
+        print(f"Ошибка обновления данных: {error}")
+        self.root.after(self.refresh_interval, self._poll_data_file)
 
     def load_or_generate_data(self):
-        """Загружает данные из CSV или генерирует новые"""
-        csv_file = "data/clients_data.csv"
+        """Загружает данные из CSV (через бинарный кэш) или генерирует новые"""
+        csv_file = self.csv_file
 
         if os.path.exists(csv_file):
             try:
-                df = pd.read_csv(csv_file)
+                df = read_csv_cached(csv_file)
                 print(f"Данные загружены из {csv_file}")
                 return df
             except Exception as e:
                 print(f"Ошибка загрузки CSV: {e}. Генерирую новые данные.")
 
-        # Генерация новых данных
-        df = self.generate_sample_data(100)
-        # Создаем папку data если её нет
-        os.makedirs("data", exist_ok=True)
-        df.to_csv(csv_file, index=False, encoding='utf-8')
+        self.generate_data_csv()
+        return read_csv_cached(csv_file)
+
+    def generate_data_csv(self):
+        """Генерирует новые данные в CSV"""
+        csv_file = self.csv_file
+        n = int(os.environ.get("DATA_SAMPLE_SIZE", 100))
+        seed = int(os.environ.get("DATA_RANDOM_SEED", 42))
+        if n > DEFAULT_CHUNK_SIZE:
+            # Большие наборы пишем шардами в пуле процессов
+            write_clients_csv(csv_file, n, seed=seed)
+        else:
+            df = self.generate_sample_data(n, seed)
+            # Создаем папку data если её нет
+            os.makedirs(os.path.dirname(csv_file) or ".", exist_ok=True)
+            with_names(df).to_csv(csv_file, index=False, encoding='utf-8')
         print(f"Новые данные сохранены в {csv_file}")
-        return df
-
-    def generate_sample_data(self, n=100):
-        np.random.seed(42)
-        random.seed(42)
-
-        regions = ['Москва', 'Санкт-Петербург', 'Новосибирск', 'Екатеринбург', 'Казань', 'Нижний Новгород']
-        products = ['Кредит', 'Вклад', 'Инвестиции', 'Ипотека', 'Страхование', 'Дебетовая карта']
-
-        data = []
-        for i in range(n):
-            age = int(np.clip(np.random.normal(45, 15), 18, 75))
-            income = int(np.clip(np.random.lognormal(11, 0.5), 20000, 500000))
-            balance = max(5000, int(income * np.random.uniform(0.5, 12)))
-            data.append({
-                'id': i + 1,
-                'name': f'Клиент_{i + 1}',
-                'age': age,
-                'region': random.choice(regions),
-                'income': income,
-                'balance': balance,
-                'assets': balance * np.random.uniform(0.5, 3),
-                'transactions': np.random.poisson(15),
-                'product': random.choice(products),
-                'loyalty_years': np.random.randint(0, 25),
-                'risk_level': random.choices(['Низкий', 'Средний', 'Высокий'], weights=[0.6, 0.3, 0.1])[0],
-                'last_activity': datetime(2024, random.randint(1, 12), random.randint(1, 28)).strftime('%Y-%m-%d')
-            })
-        return pd.DataFrame(data)
+
+    def generate_sample_data(self, n=100, seed=42):
+        return apply_schema(generate_clients(n, seed=seed, workers=None if n > DEFAULT_CHUNK_SIZE else 1))
 
     def toggle_dark_mode(self):
         self.is_dark_mode = not self.is_dark_mode
@@ -118,124 +488,194 @@ class VTBIntelligenceHub:
         search_entry.pack(side=LEFT, padx=5)
         search_entry.bind("<KeyRelease>", self.smart_search)
 
-        tb.Button(row1, text="AI инсайты", bootstyle="success", command=self.generate_ai_insights).pack(side=LEFT,
-                                                                                                        padx=5)
-        tb.Button(row1, text="Прогнозы", bootstyle="primary", command=self.show_predictions).pack(side=LEFT, padx=5)
+        insights_btn = tb.Button(row1, text="AI инсайты", bootstyle="success", command=self.generate_ai_insights)
+        insights_btn.pack(side=LEFT, padx=5)
+        predictions_btn = tb.Button(row1, text="Прогнозы", bootstyle="primary", command=self.show_predictions)
+        predictions_btn.pack(side=LEFT, padx=5)
 
         # Кнопка графиков только если matplotlib доступен
         if MATPLOTLIB_AVAILABLE:
-            tb.Button(row1, text="Графики", bootstyle="info", command=self.show_charts).pack(side=LEFT, padx=5)
+            charts_btn = tb.Button(row1, text="Графики", bootstyle="info", command=self.show_charts)
         else:
-            tb.Button(row1, text="Графики (недоступно)", bootstyle="secondary",
-                      command=lambda: tb.messagebox.showwarning("Внимание", "Matplotlib не установлен")).pack(side=LEFT,
-                                                                                                              padx=5)
+            charts_btn = tb.Button(row1, text="Графики (недоступно)", bootstyle="secondary",
+                                   command=lambda: tb.messagebox.showwarning("Внимание", "Matplotlib не установлен"))
+        charts_btn.pack(side=LEFT, padx=5)
 
-        tb.Button(row1, text="Данные", bootstyle="secondary", command=self.show_data_table).pack(side=LEFT, padx=5)
-        tb.Button(row1, text="Сброс", bootstyle="warning", command=self.reset_filters).pack(side=LEFT, padx=5)
+        data_btn = tb.Button(row1, text="Данные", bootstyle="secondary", command=self.show_data_table)
+        data_btn.pack(side=LEFT, padx=5)
+        reset_btn = tb.Button(row1, text="Сброс", bootstyle="warning", command=self.reset_filters)
+        reset_btn.pack(side=LEFT, padx=5)
 
         # Row 2 - Combobox filters
         row2 = tb.Frame(filter_frame)
         row2.pack(fill=X, pady=5)
 
         tb.Label(row2, text="Возраст:").pack(side=LEFT)
-        self.age_var = tb.StringVar(value="Все")
-        age_combo = tb.Combobox(row2, textvariable=self.age_var, values=["Все", "18-30", "31-45", "46-60", "60+"],
+        self.age_var = tb.StringVar(value=ALL)
+        age_combo = tb.Combobox(row2, textvariable=self.age_var, values=[ALL] + list(AGE_RANGES),
                                 width=10, state="readonly")
         age_combo.pack(side=LEFT, padx=5)
         age_combo.bind("<<ComboboxSelected>>", self.apply_filters)
 
         tb.Label(row2, text="Регион:").pack(side=LEFT, padx=(20, 0))
-        self.region_var = tb.StringVar(value="Все")
-        region_combo = tb.Combobox(row2, textvariable=self.region_var,
-                                   values=["Все"] + list(self.df['region'].unique()), width=15, state="readonly")
-        region_combo.pack(side=LEFT, padx=5)
-        region_combo.bind("<<ComboboxSelected>>", self.apply_filters)
+        self.region_var = tb.StringVar(value=ALL)
+        self.region_combo = tb.Combobox(row2, textvariable=self.region_var, values=[ALL], width=15, state="readonly")
+        self.region_combo.pack(side=LEFT, padx=5)
+        self.region_combo.bind("<<ComboboxSelected>>", self.apply_filters)
 
         tb.Label(row2, text="Продукт:").pack(side=LEFT, padx=(20, 0))
-        self.product_var = tb.StringVar(value="Все")
-        product_combo = tb.Combobox(row2, textvariable=self.product_var,
-                                    values=["Все"] + list(self.df['product'].unique()), width=15, state="readonly")
-        product_combo.pack(side=LEFT, padx=5)
-        product_combo.bind("<<ComboboxSelected>>", self.apply_filters)
+        self.product_var = tb.StringVar(value=ALL)
+        self.product_combo = tb.Combobox(row2, textvariable=self.product_var, values=[ALL], width=15,
+                                         state="readonly")
+        self.product_combo.pack(side=LEFT, padx=5)
+        self.product_combo.bind("<<ComboboxSelected>>", self.apply_filters)
+
+        # До загрузки данных элементы управления выключены; (виджет, состояние после загрузки)
+        self.data_controls = [(search_entry, NORMAL), (insights_btn, NORMAL), (predictions_btn, NORMAL),
+                              (charts_btn, NORMAL), (data_btn, NORMAL), (reset_btn, NORMAL),
+                              (age_combo, "readonly"), (self.region_combo, "readonly"),
+                              (self.product_combo, "readonly")]
+        self.row_controls = (search_entry, predictions_btn, data_btn)
+        for widget, _ in self.data_controls:
+            widget.configure(state=DISABLED)
 
         # Dashboard
         self.dashboard_frame = tb.Frame(self.main_container)
         self.dashboard_frame.pack(fill=BOTH, expand=True)
+        self.setup_dashboard()
 
         # Status bar
-        self.status_var = tb.StringVar(value="Готово")
-        if not MATPLOTLIB_AVAILABLE:
-            self.status_var.set("Готово (Matplotlib не доступен)")
-        tb.Label(self.main_container, textvariable=self.status_var, relief=SUNKEN).pack(fill=X, pady=(5, 0))
+        self.status_var = tb.StringVar()
+        status_frame = tb.Frame(self.main_container)
+        status_frame.pack(fill=X, pady=(5, 0))
+        self.loading_bar = tb.Progressbar(status_frame, mode='indeterminate', length=120, bootstyle="info")
+        if self.profiler.enabled:
+            self.latency_var = tb.StringVar()
+            tb.Label(status_frame, textvariable=self.latency_var, relief=SUNKEN).pack(side=RIGHT)
+            self.root.after(LATENCY_POLL_MS, self._update_latency)
+        tb.Label(status_frame, textvariable=self.status_var, relief=SUNKEN).pack(side=LEFT, fill=X, expand=True)
+
+    def _update_latency(self):
+        self.latency_var.set(self.profiler.status_text())
+        self.root.after(LATENCY_POLL_MS, self._update_latency)
+
+    def memory_report(self):
+        if self.streaming is not None:
+            return (f"Клиентов: {len(self.streaming):,}, CSV {format_memory(os.path.getsize(self.csv_file))} "
+                    f"свёрнут потоково (поиск, таблица и прогноз недоступны)")
+        if self.store is not None:
+            return f"Клиентов: {len(self.store):,}, база SQLite: {format_memory(self.store.file_size)}"
+        return f"Клиентов: {len(self.df):,}, данные в памяти: {format_memory(memory_usage(self.df))}"
 
     def smart_search(self, event=None):
+        """Откладывает поиск до паузы в наборе, чтобы считался только последний запрос"""
+        if not self.data_ready:
+            return
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+        self._search_job = self.root.after(SEARCH_DEBOUNCE_MS, self._run_search)
+
+    def _run_search(self):
+        self._search_job = None
         query = self.search_var.get().lower()
-        if query:
-            mask = (self.df['name'].str.lower().str.contains(query) |
-                    self.df['region'].str.lower().str.contains(query) |
-                    self.df['product'].str.lower().str.contains(query) |
-                    self.df['risk_level'].str.lower().str.contains(query))
-            self.filtered_df = self.df[mask]
-        else:
-            self.filtered_df = self.df.copy()
-        self.update_dashboard()
-        self.status_var.set(f"Найдено клиентов: {len(self.filtered_df)}")
+        if self.store is not None:
+            # В SQLite поиск - часть условия WHERE выборки
+            self.search_query = query
+            self.refresh_view("Найдено клиентов: {count}")
+            return
+        self.scheduler.submit('search', self._compute_search, query,
+                              self.search_index, self.filter_index, on_done=self._on_search_done)
+
+    def _compute_search(self, query, search_index, filter_index):
+        """Фоновая задача: маска поиска, упакованная для AND с фильтрами"""
+        mask = search_index.search(query)
+        return query, (filter_index.pack(mask) if mask is not None else None), filter_index
+
+    def _on_search_done(self, result):
+        query, bitmap, filter_index = result
+        if filter_index is not self.filter_index:
+            # Пока шёл поиск, данные обновились - маска построена для прежних строк
+            self._run_search()
+            return
+        self.search_query, self.search_bitmap = query, bitmap
+        self.refresh_view("Найдено клиентов: {count}")
 
     def apply_filters(self, event=None):
-        self.filtered_df = self.df.copy()
-        if self.age_var.get() != "Все":
-            age_ranges = {"18-30": (18, 30), "31-45": (31, 45), "46-60": (46, 60), "60+": (60, 75)}
-            low, high = age_ranges[self.age_var.get()]
-            self.filtered_df = self.filtered_df[self.filtered_df['age'].between(low, high)]
-        if self.region_var.get() != "Все":
-            self.filtered_df = self.filtered_df[self.filtered_df['region'] == self.region_var.get()]
-        if self.product_var.get() != "Все":
-            self.filtered_df = self.filtered_df[self.filtered_df['product'] == self.product_var.get()]
-        self.update_dashboard()
-        self.status_var.set(f"Отфильтровано клиентов: {len(self.filtered_df)}")
+        self.refresh_view("Отфильтровано клиентов: {count}")
 
     def reset_filters(self):
         self.search_var.set("")
-        self.age_var.set("Все")
-        self.region_var.set("Все")
-        self.product_var.set("Все")
-        self.filtered_df = self.df.copy()
+        self.age_var.set(ALL)
+        self.region_var.set(ALL)
+        self.product_var.set(ALL)
+        self.search_bitmap = None
+        self.search_query = ""
+        self.refresh_view("Фильтры сброшены")
+
+    def refresh_view(self, status=None):
+        """Пересчитывает выборку в фоне; status - шаблон строки состояния с {count}"""
+        state = (self.age_var.get(), self.region_var.get(), self.product_var.get())
+        key = state + (self.search_query,)
+        if self.streaming is not None:
+            self.scheduler.submit('view', self._compute_streaming_view, key, self.streaming,
+                                  on_done=lambda result: self._on_view_done(result, status))
+            return
+        if self.store is not None:
+            self.scheduler.submit('view', self._compute_store_view, key, self.store,
+                                  on_done=lambda result: self._on_view_done(result, status))
+            return
+        # Индексы передаются явно: живое обновление может заменить их, пока задача считается
+        self.scheduler.submit('view', self._compute_view, state, self.search_bitmap, key,
+                              self.filter_index, self.aggregator, self.cube,
+                              on_done=lambda result: self._on_view_done(result, status))
+
+    def _compute_view(self, state, search_bitmap, key, filter_index, aggregator, cube):
+        """Фоновая задача: AND битовых масок, выборка и снимок агрегатов"""
+        rows = filter_index.select(*state, search_bitmap)
+        # Без поиска панели считаются по кубу - время не зависит от числа клиентов
+        snapshot = aggregator.snapshot(rows, key=key) if key[3] else cube.snapshot(*state)
+        return rows, key, snapshot
+
+    def _compute_store_view(self, key, store):
+        """Фоновая задача: снимок агрегатов выборки по кубу или запросами к SQLite"""
+        return None, key, store.snapshot(key) if key[3] else store.cube.snapshot(*key[:3])
+
+    def _compute_streaming_view(self, key, aggregates):
+        """Фоновая задача: снимок агрегатов слиянием групп потокового прохода"""
+        return None, key, aggregates.snapshot(*key[:3])
+
+    def _on_view_done(self, result, status):
+        self.view_rows, self.view_key, snapshot = result
+        self.view_count = snapshot.count
         self.update_dashboard()
-        self.status_var.set("Фильтры сброшены")
+        if status is not None:
+            self.status_var.set(status.format(count=snapshot.count))
+
+    def current_snapshot(self):
+        """Агрегаты текущей выборки (из куба или LRU кэша, если это состояние фильтров уже встречалось)"""
+        return self.snapshot(self.view_rows, self.view_key)
+
+    def snapshot(self, rows, key, histograms=False):
+        """Агрегаты выборки; без поиска и гистограмм - по кубу"""
+        if self.streaming is not None:
+            # Гистограммы в потоковом режиме строятся по скетчам значений
+            return self.streaming.snapshot(*key[:3])
+        if not histograms and not key[3]:
+            return self.cube.snapshot(*key[:3])
+        if self.store is not None:
+            return self.store.snapshot(key)
+        return self.aggregator.snapshot(rows, key=key)
 
     def generate_ai_insights(self):
-        if len(self.filtered_df) == 0:
+        if self.view_count == 0:
             tb.messagebox.showwarning("Предупреждение", "Нет данных!")
             return
 
-        insights = []
-        # Age
-        age_groups = pd.cut(self.filtered_df['age'], [18, 30, 45, 60, 75], labels=['18-30', '31-45', '46-60', '60+'])
-        insights.append(f"Преобладающая возрастная группа: {age_groups.mode()[0]}")
-        # Income
-        high_income = len(self.filtered_df[self.filtered_df['income'] > 150000])
-        if high_income > 0:
-            insights.append(f"Клиентов с доходом >150k ₽: {high_income}")
-        # Products
-        popular_product = self.filtered_df['product'].mode()[0]
-        insights.append(f"Самый популярный продукт: {popular_product}")
-        # Regions
-        top_region = self.filtered_df['region'].mode()[0]
-        insights.append(f"Наиболее активный регион: {top_region}")
-        # Loyalty
-        avg_loyalty = self.filtered_df['loyalty_years'].mean()
-        insights.append(f"Средняя лояльность: {avg_loyalty:.1f} лет")
-        # Risk
-        main_risk = self.filtered_df['risk_level'].mode()[0]
-        insights.append(f"Преобладающий уровень риска: {main_risk}")
-        # Transactions
-        avg_transactions = self.filtered_df['transactions'].mean()
-        insights.append(f"Среднее количество транзакций: {avg_transactions:.1f}")
-        # Balance
-        total_balance = self.filtered_df['balance'].sum()
-        insights.append(f"Общий баланс клиентов: {total_balance:,.0f} ₽")
-
-        # Show window
+        rows, key = self.view_rows, self.view_key
+        self.scheduler.submit('insights', lambda: analytics.insights(self.snapshot(rows, key)),
+                              on_done=self._show_insights)
+
+    def _show_insights(self, insights):
         win = tb.Toplevel(self.root)
         win.title("AI Инсайты")
         win.geometry("700x500")
@@ -252,10 +692,35 @@ class VTBIntelligenceHub:
         tb.Button(win, text="Закрыть", bootstyle="danger", command=win.destroy).pack(pady=10)
 
     def show_predictions(self):
-        if len(self.filtered_df) == 0:
+        if self.view_count == 0:
             tb.messagebox.showwarning("Предупреждение", "Нет данных для прогнозирования!")
             return
 
+        self.scheduler.submit('predictions', self._compute_predictions, self.view_rows, self.view_key,
+                              on_done=self._show_predictions)
+
+    def _compute_predictions(self, rows, key):
+        """Фоновая задача: прогноз всей выборки и строки отчёта по лучшим клиентам"""
+        if self.store is not None:
+            forecast = self.store.forecast(key)
+            clients = self.store.clients(forecast.top_rows)
+        else:
+            forecast = self.forecaster.forecast(rows, key=key)
+            clients = display_frame(self.df.iloc[list(forecast.top_rows)])
+        lines = [
+            f"Клиентов в прогнозе: {forecast.count:,}\n",
+            f"Баланс сейчас: {forecast.total_balance:,.0f} ₽\n",
+            f"Прогноз через {forecast.horizon_months} мес.: {forecast.total_projected:,.0f} ₽ "
+            f"(+{forecast.growth_pct:.1f}%)\n",
+            f"\nТоп-{len(forecast.top_rows)} клиентов по приросту баланса:\n",
+        ]
+        for i, pred_balance in enumerate(forecast.top_projected):
+            client = clients.iloc[i]
+            lines.append(f"{client['name']} ({client['region']}) - прогноз баланса: {pred_balance:,.0f} ₽ "
+                         f"(+{pred_balance - forecast.top_balance[i]:,.0f} ₽)\n")
+        return lines
+
+    def _show_predictions(self, lines):
         win = tb.Toplevel(self.root)
         win.title("Прогнозы")
         win.geometry("600x400")
@@ -263,116 +728,70 @@ class VTBIntelligenceHub:
         text_area = ScrolledText(win, width=70, height=20)
         text_area.pack(fill=BOTH, expand=True, padx=10, pady=10)
 
-        for i in range(min(10, len(self.filtered_df))):
-            client = self.filtered_df.iloc[i]
-            pred_balance = client['balance'] * np.random.uniform(1.02, 1.2)
-            text_area.insert(END, f"{client['name']} ({client['region']}) - прогноз баланса: {pred_balance:,.0f} ₽\n")
+        for line in lines:
+            text_area.insert(END, line)
 
         text_area.config(state=DISABLED)
         tb.Button(win, text="Закрыть", bootstyle="danger", command=win.destroy).pack(pady=10)
 
     def show_charts(self):
         """Показывает окно с графиками"""
-        if not MATPLOTLIB_AVAILABLE:
+        loaded = load_matplotlib()
+        if loaded is None:
             tb.messagebox.showerror("Ошибка", "Matplotlib не установлен или не доступен")
             return
+        figure_canvas, chart_tabs, chart_cache_class = loaded
+        if self.chart_cache is None:
+            self.chart_cache = chart_cache_class()
 
-        if len(self.filtered_df) == 0:
+        if self.view_count == 0:
             tb.messagebox.showwarning("Предупреждение", "Нет данных для построения графиков!")
             return
 
+        # Гистограммы по ячейкам куба не восстановить - снимок для графиков считается по строкам в фоне
+        key = self.view_key
+        self.scheduler.submit('charts', self.snapshot, self.view_rows, key, True,
+                              on_done=lambda snapshot: self._show_charts(snapshot, key, figure_canvas, chart_tabs))
+
+    def _show_charts(self, snapshot, key, figure_canvas, chart_tabs):
         win = tb.Toplevel(self.root)
         win.title("Аналитические графики")
         win.geometry("1000x700")
+        # Фигуры окна возвращаются в кэш, когда окно закрыто и их холсты уничтожены
+        win.bind("<Destroy>", lambda event: self.chart_cache.release(win) if event.widget is win else None)
 
-        # Создаем notebook для вкладок
+        # Создаем notebook для вкладок; каждая вкладка рисуется при первом открытии
         notebook = tb.Notebook(win)
         notebook.pack(fill=BOTH, expand=True, padx=10, pady=10)
 
-        try:
-            # График 1: Распределение по продуктам
-            frame1 = tb.Frame(notebook)
-            notebook.add(frame1, text="Распределение по продуктам")
-
-            fig1, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
-
-            # Круговая диаграмма продуктов
-            product_counts = self.filtered_df['product'].value_counts()
-            ax1.pie(product_counts.values, labels=product_counts.index, autopct='%1.1f%%')
-            ax1.set_title('Распределение клиентов по продуктам')
-
-            # Столбчатая диаграмма регионов
-            region_counts = self.filtered_df['region'].value_counts().head(5)
-            ax2.bar(region_counts.index, region_counts.values)
-            ax2.set_title('Топ-5 регионов по количеству клиентов')
-            ax2.tick_params(axis='x', rotation=45)
-
-            plt.tight_layout()
-            canvas1 = FigureCanvasTkAgg(fig1, frame1)
-            canvas1.draw()
-            canvas1.get_tk_widget().pack(fill=BOTH, expand=True)
-
-            # График 2: Финансовые показатели
-            frame2 = tb.Frame(notebook)
-            notebook.add(frame2, text="Финансовые показатели")
-
-            fig2, (ax3, ax4) = plt.subplots(1, 2, figsize=(12, 5))
-
-            # Распределение доходов
-            ax3.hist(self.filtered_df['income'], bins=20, alpha=0.7, edgecolor='black')
-            ax3.set_title('Распределение доходов клиентов')
-            ax3.set_xlabel('Доход (руб)')
-            ax3.set_ylabel('Количество клиентов')
-
-            # Распределение балансов
-            ax4.hist(self.filtered_df['balance'], bins=20, alpha=0.7, edgecolor='black', color='orange')
-            ax4.set_title('Распределение балансов клиентов')
-            ax4.set_xlabel('Баланс (руб)')
-            ax4.set_ylabel('Количество клиентов')
-
-            plt.tight_layout()
-            canvas2 = FigureCanvasTkAgg(fig2, frame2)
-            canvas2.draw()
-            canvas2.get_tk_widget().pack(fill=BOTH, expand=True)
-
-            # График 3: Демографический анализ
-            frame3 = tb.Frame(notebook)
-            notebook.add(frame3, text="Демографический анализ")
-
-            fig3, (ax5, ax6) = plt.subplots(1, 2, figsize=(12, 5))
-
-            # Распределение по возрастам
-            age_bins = [18, 25, 35, 45, 55, 65, 75]
-            age_labels = ['18-25', '26-35', '36-45', '46-55', '56-65', '66-75']
-            age_groups = pd.cut(self.filtered_df['age'], bins=age_bins, labels=age_labels)
-            age_counts = age_groups.value_counts().sort_index()
-
-            ax5.bar(age_counts.index, age_counts.values, color='green', alpha=0.7)
-            ax5.set_title('Распределение клиентов по возрастам')
-            ax5.set_xlabel('Возрастные группы')
-            ax5.set_ylabel('Количество клиентов')
-            ax5.tick_params(axis='x', rotation=45)
-
-            # Уровни риска
-            risk_counts = self.filtered_df['risk_level'].value_counts()
-            ax6.pie(risk_counts.values, labels=risk_counts.index, autopct='%1.1f%%',
-                    colors=['lightgreen', 'yellow', 'red'])
-            ax6.set_title('Распределение по уровням риска')
-
-            plt.tight_layout()
-            canvas3 = FigureCanvasTkAgg(fig3, frame3)
-            canvas3.draw()
-            canvas3.get_tk_widget().pack(fill=BOTH, expand=True)
+        tabs = {}
+        for tab, title in chart_tabs:
+            frame = tb.Frame(notebook)
+            notebook.add(frame, text=title)
+            tabs[str(frame)] = (tab, frame)
+
+        def render_selected_tab(event=None):
+            name = notebook.select()
+            if name not in tabs:
+                return
+            tab, frame = tabs.pop(name)
+            try:
+                with self.profiler.span('chart_figure', 'matplotlib', tab=tab):
+                    fig = self.chart_cache.figure(key, tab, snapshot, win)
+                with self.profiler.span('chart_draw', 'matplotlib', tab=tab):
+                    canvas = figure_canvas(fig, frame)
+                    canvas.draw()
+                canvas.get_tk_widget().pack(fill=BOTH, expand=True)
+            except Exception as e:
+                tb.messagebox.showerror("Ошибка", f"Ошибка при построении графиков: {e}")
 
-        except Exception as e:
-            tb.messagebox.showerror("Ошибка", f"Ошибка при построении графиков: {e}")
-            win.destroy()
-            return
+        notebook.bind("<<NotebookTabChanged>>", render_selected_tab)
+        render_selected_tab()
 
         tb.Button(win, text="Закрыть", bootstyle="danger", command=win.destroy).pack(pady=10)
 
     def show_data_table(self):
-        if len(self.filtered_df) == 0:
+        if self.view_count == 0:
             tb.messagebox.showwarning("Предупреждение", "Нет данных для отображения!")
             return
 
@@ -383,156 +802,133 @@ class VTBIntelligenceHub:
         tree_frame = tb.Frame(win)
         tree_frame.pack(fill=BOTH, expand=True, padx=10, pady=10)
 
-        columns = list(self.filtered_df.columns)
-        tree = tb.Treeview(tree_frame, columns=columns, show='headings')
-
-        for col in columns:
-            tree.heading(col, text=col)
-            tree.column(col, width=100, anchor=CENTER)
-
-        for _, row in self.filtered_df.iterrows():
-            tree.insert('', END, values=list(row))
+        # Виртуальная таблица: в Treeview только видимые строки, сортировка по клику на заголовок
+        if self.store is not None:
+            view = self.store.table_view(self.view_key)
+            win.bind("<Destroy>", lambda event: view.close() if event.widget is win else None)
+        else:
+            view = TableView(self.df, self.view_rows, self.sort_index)
+        VirtualTable(tree_frame, view)
+
+        formats = available_formats()
+        format_var = tb.StringVar(value=formats[0])
+        tb.Button(win, text="Экспорт", bootstyle="success",
+                  command=lambda: self.export_to_csv(format_var.get())).pack(side=LEFT, padx=(10, 5), pady=10)
+        tb.Combobox(win, textvariable=format_var, values=formats, width=10, state="readonly").pack(side=LEFT, pady=10)
+        tb.Button(win, text="Отменить экспорт", bootstyle="warning",
+                  command=self.cancel_export).pack(side=LEFT, padx=10, pady=10)
+        tb.Button(win, text="Закрыть", bootstyle="danger", command=win.destroy).pack(side=RIGHT, padx=10, pady=10)
 
-        tree.pack(side=LEFT, fill=BOTH, expand=True)
+    def export_to_csv(self, fmt='csv'):
+        """Запускает фоновый экспорт отфильтрованных данных"""
+        if self.export_job is not None and not self.export_job.done:
+            tb.messagebox.showwarning("Экспорт", "Экспорт уже выполняется")
+            return
+        filename = f"exported_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}{EXPORT_FORMATS[fmt]}"
+        if self.store is not None:
+            self.export_job = self.store.export_job(self.view_key, filename, fmt).start()
+        else:
+            self.export_job = ExportJob(self.df, self.view_rows, filename, fmt).start()
+        self._poll_export()
 
-        vsb = tb.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
-        tree.configure(yscrollcommand=vsb.set)
-        vsb.pack(side=RIGHT, fill=Y)
+    def cancel_export(self):
+        if self.export_job is not None and not self.export_job.done:
+            self.export_job.cancel()
 
-        tb.Button(win, text="Экспорт в CSV", bootstyle="success",
-                  command=lambda: self.export_to_csv()).pack(side=LEFT, padx=10, pady=10)
-        tb.Button(win, text="Закрыть", bootstyle="danger", command=win.destroy).pack(side=RIGHT, padx=10, pady=10)
+    def _poll_export(self):
+        job = self.export_job
+        if job is None:
+            return
+        if not job.done:
+            self.status_var.set(f"Экспорт в {job.path}: {job.rows_written:,} из {job.total:,} строк "
+                                f"({job.progress:.0%}, {job.throughput:,.0f} строк/с)")
+            self.root.after(EXPORT_POLL_MS, self._poll_export)
+            return
 
-    def export_to_csv(self):
-        """Экспортирует отфильтрованные данные в CSV"""
-        filename = f"exported_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        self.filtered_df.to_csv(filename, index=False, encoding='utf-8')
-        self.status_var.set(f"Данные экспортированы в {filename}")
-        tb.messagebox.showinfo("Экспорт", f"Данные успешно экспортированы в {filename}")
+        if job.error is not None:
+            self.status_var.set("Ошибка экспорта")
+            tb.messagebox.showerror("Экспорт", f"Ошибка при экспорте: {job.error}")
+        elif job.cancelled:
+            self.status_var.set("Экспорт отменён")
+        else:
+            self.status_var.set(f"Данные экспортированы в {job.path} за {job.elapsed:.1f} с "
+                                f"({job.throughput:,.0f} строк/с)")
+            tb.messagebox.showinfo("Экспорт", f"Данные успешно экспортированы в {job.path}")
+
+    def setup_dashboard(self):
+        """Создаёт панели дашборда один раз; при обновлении меняется только их текст"""
+        self.empty_label = tb.Label(self.dashboard_frame, text="Нет данных для отображения", font=('Arial', 14))
+        self.panels = [
+            (self.create_financial_overview(), analytics.financial_overview_lines),
+            (self.create_demographic_analysis(), analytics.demographic_lines),
+            (self.create_product_analysis(), analytics.product_lines),
+            (self.create_recommendations_panel(), analytics.recommendations),
+        ]
+        for panel, _ in self.panels:
+            panel.set_lines(["Загрузка данных..."])
 
     def update_dashboard(self):
-        for widget in self.dashboard_frame.winfo_children():
-            widget.destroy()
+        """Планирует перерисовку на idle-цикл Tk; несколько вызовов подряд дают одну перерисовку"""
+        if self._dashboard_job is None:
+            self._dashboard_job = self.root.after_idle(self._render_dashboard)
 
-        if len(self.filtered_df) == 0:
-            tb.Label(self.dashboard_frame, text="Нет данных для отображения", font=('Arial', 14)).pack(expand=True)
+    def _render_dashboard(self):
+        self._dashboard_job = None
+        if not self.data_ready:
+            return
+        if self._panel_job is not None:
+            # Заполнение по устаревшему снимку прерываем
+            self.root.after_cancel(self._panel_job)
+            self._panel_job = None
+        snapshot = self.current_snapshot()
+        if snapshot.count == 0:
+            for panel, _ in self.panels:
+                panel.hide()
+            self.empty_label.grid(row=0, column=0, columnspan=2, pady=20)
             return
 
-        self.create_financial_overview()
-        self.create_demographic_analysis()
-        self.create_product_analysis()
-        self.create_recommendations_panel()
+        self.empty_label.grid_remove()
+        self._render_panels(snapshot, 0)
 
-    def create_financial_overview(self):
-        frame = tb.Labelframe(self.dashboard_frame, text="Финансовый обзор", padding=10)
-        frame.grid(row=0, column=0, padx=5, pady=5, sticky=NSEW)
-
-        total_balance = self.filtered_df['balance'].sum()
-        avg_income = self.filtered_df['income'].mean()
-        avg_balance = self.filtered_df['balance'].mean()
-        high_value_clients = len(self.filtered_df[self.filtered_df['balance'] > 1000000])
-        total_assets = self.filtered_df['assets'].sum()
-        total_transactions = self.filtered_df['transactions'].sum()
-
-        metrics = [
-            f"Общий баланс: {total_balance:,.0f} ₽",
-            f"Средний доход: {avg_income:,.0f} ₽",
-            f"Средний баланс: {avg_balance:,.0f} ₽",
-            f"Премиум-клиенты: {high_value_clients}",
-            f"Активы под управлением: {total_assets:,.0f} ₽",
-            f"Всего транзакций: {total_transactions}",
-            f"Всего клиентов: {len(self.filtered_df)}"
-        ]
+    def _render_panels(self, snapshot, index):
+        """Заполняет панели по одной, отдавая управление Tk между ними"""
+        self._panel_job = None
+        panel, lines = self.panels[index]
+        # Панели после первой заполняются из after(), вне интервала _render_dashboard - замеряем каждую
+        with self.profiler.span(f"panel_{lines.__name__}", index=index):
+            panel.show()
+            panel.set_lines(lines(snapshot))
+        if index + 1 < len(self.panels):
+            self._panel_job = self.root.after(PANEL_STEP_MS, self._render_panels, snapshot, index + 1)
 
-        for m in metrics:
-            tb.Label(frame, text=m, font=('Arial', 10)).pack(anchor=W, pady=2)
+    def create_financial_overview(self):
+        return DashboardPanel(self.dashboard_frame, "Финансовый обзор", row=0, column=0, font=('Arial', 10), pady=2)
 
     def create_demographic_analysis(self):
-        frame = tb.Labelframe(self.dashboard_frame, text="Демографический анализ", padding=10)
-        frame.grid(row=0, column=1, padx=5, pady=5, sticky=NSEW)
-
-        age_stats = self.filtered_df['age'].describe()
-        age_groups = pd.cut(self.filtered_df['age'], [18, 30, 45, 60, 75])
-        age_distribution = age_groups.value_counts().sort_index()
-        region_stats = self.filtered_df['region'].value_counts().head(3)
-
-        metrics = [
-            f"Средний возраст: {age_stats['mean']:.1f} лет",
-            f"Медианный возраст: {age_stats['50%']:.1f} лет",
-            f"Самый молодой: {age_stats['min']} лет",
-            f"Самый старший: {age_stats['max']} лет",
-            "\nРаспределение по возрастам:"
-        ]
-
-        for grp, count in age_distribution.items():
-            metrics.append(f"   {grp}: {count} клиентов")
-
-        metrics.append("\nТоп регионы:")
-        for region, count in region_stats.items():
-            metrics.append(f"   {region}: {count} клиентов")
-
-        for m in metrics:
-            tb.Label(frame, text=m, font=('Arial', 9)).pack(anchor=W, pady=1)
+        return DashboardPanel(self.dashboard_frame, "Демографический анализ", row=0, column=1)
 
     def create_product_analysis(self):
-        frame = tb.Labelframe(self.dashboard_frame, text="Анализ продуктов", padding=10)
-        frame.grid(row=1, column=0, padx=5, pady=5, sticky=NSEW)
-
-        product_stats = self.filtered_df['product'].value_counts()
-        risk_stats = self.filtered_df['risk_level'].value_counts()
-
-        metrics = ["Распределение по продуктам:"]
-        for p, count in product_stats.items():
-            metrics.append(f"   {p}: {count} ({count / len(self.filtered_df) * 100:.1f}%)")
-
-        metrics.append("\nУровни риска:")
-        for r, count in risk_stats.items():
-            metrics.append(f"   {r}: {count} ({count / len(self.filtered_df) * 100:.1f}%)")
-
-        avg_loyalty = self.filtered_df['loyalty_years'].mean()
-        max_loyalty = self.filtered_df['loyalty_years'].max()
-        metrics.append(f"\nСредняя лояльность: {avg_loyalty:.1f} лет")
-        metrics.append(f"Максимальная лояльность: {max_loyalty} лет")
-
-        for m in metrics:
-            tb.Label(frame, text=m, font=('Arial', 9)).pack(anchor=W, pady=1)
+        return DashboardPanel(self.dashboard_frame, "Анализ продуктов", row=1, column=0)
 
     def create_recommendations_panel(self):
-        frame = tb.Labelframe(self.dashboard_frame, text="AI Рекомендации", padding=10)
-        frame.grid(row=1, column=1, padx=5, pady=5, sticky='nsew')
-
-        recs = self.generate_recommendations()
-        text_area = ScrolledText(frame, width=40, height=12, autohide=True)
-        text_area.pack(fill='both', expand=True)
-
-        for r in recs:
-            text_area.insert('end', f"• {r}\n")
+        return RecommendationsPanel(self.dashboard_frame, "AI Рекомендации", row=1, column=1)
 
     def generate_recommendations(self):
-        recs = []
-        if len(self.filtered_df) == 0:
-            recs.append("Нет данных для анализа")
-            return recs
-
-        high_balance_clients = self.filtered_df[self.filtered_df['balance'] > 1000000]
-        if len(high_balance_clients) > 0:
-            recs.append(f"Рассмотреть персонализированные предложения для {len(high_balance_clients)} премиум клиентов")
-
-        low_activity_clients = self.filtered_df[self.filtered_df['transactions'] < 5]
-        if len(low_activity_clients) > 0:
-            recs.append(f"Активировать маркетинговую кампанию для {len(low_activity_clients)} малоактивных клиентов")
-
-        popular_product = self.filtered_df['product'].mode()[0]
-        recs.append(f"Продвигать продукт '{popular_product}' в регионах с высокой концентрацией клиентов")
-
-        high_risk_clients = self.filtered_df[self.filtered_df['risk_level'] == 'Высокий']
-        if len(high_risk_clients) > 0:
-            recs.append(f"Мониторинг рисков для {len(high_risk_clients)} клиентов с высоким риском")
-
-        return recs
+        return analytics.recommendations(self.current_snapshot())
 
 
 if __name__ == "__main__":
-    root = tb.Window(themename="flatly")
-    app = VTBIntelligenceHub(root)
-    root.mainloop()
\ No newline at end of file
+    if "--report" in sys.argv[1:]:
+        # Пакетный режим без окна: python main.py --report [--data ...] [--out ...] [--workers N]
+        import report
+
+        report.main([arg for arg in sys.argv[1:] if arg != "--report"])
+    elif "--serve" in sys.argv[1:]:
+        # HTTP/JSON сервер без окна: python main.py --serve [--data ...] [--host ...] [--port N]
+        import api_server
+
+        api_server.main([arg for arg in sys.argv[1:] if arg != "--serve"])
+    else:
+        root = tb.Window(themename="flatly")
+        app = VTBIntelligenceHub(root)
+        root.mainloop()
\ No newline at end of file
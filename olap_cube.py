@@ -0,0 +1,208 @@
+"""Предрасчитанный куб агрегатов по измерениям фильтров дашборда.
+
+Все метрики панелей (финансы, демография, продукты, рекомендации) - это
+количества, суммы, минимумы и максимумы в разрезе возраста, региона,
+продукта и уровня риска. Куб один раз при загрузке сворачивает таблицу в
+ячейки возраст x регион x продукт x риск со сливаемыми агрегатами, и
+снимок для любой комбинации фильтров - сумма подходящих ячеек: время не
+зависит от числа клиентов.
+
+Возраст хранится с шагом в год (несколько десятков значений), а не
+группами фильтра: группы фильтра пересекаются на границе 60 лет, а
+медиана и возрастные интервалы панели демографии нужны точными.
+
+Гистограммы дохода и баланса по ячейкам не восстановить - в снимках куба
+они пустые; окно графиков берёт снимок из analytics.Aggregator.
+Поиск по имени тоже не измерение куба: снимки с поисковым запросом
+считаются по строкам.
+"""
+import numpy as np
+import pandas as pd
+
+from analytics import (AGE_BINS, CHART_AGE_BINS, CHART_AGE_LABELS, HIGH_INCOME, HIGH_RISK,
+                       LOW_ACTIVITY_TRANSACTIONS, PREMIUM_BALANCE, AggregateSnapshot, age_bin_labels,
+                       empty_snapshot, right_closed_counts)
+from filter_index import AGE_RANGES, ALL
+
+DIMENSIONS = ('age', 'region', 'product', 'risk_level')
+MEASURES = ('balance', 'income', 'assets', 'transactions', 'loyalty_years')
+# Число клиентов ячейки выше порогов панелей (премиум, высокий доход, низкая активность)
+THRESHOLD_COUNTS = ('premium', 'high_income', 'low_activity')
+CELL_COLUMNS = (('count',) + THRESHOLD_COUNTS
+                + tuple(f"{m}_{stat}" for m in MEASURES for stat in ('sum', 'min', 'max')))
+
+
+def merge_cells(frames):
+    """Слияние ячеек нескольких кубов: у ячеек с одинаковыми измерениями суммы складываются,
+    минимумы и максимумы берутся по всем"""
+    how = {col: col.rsplit('_', 1)[-1] if col.endswith(('_min', '_max')) else 'sum' for col in CELL_COLUMNS}
+    cells = pd.concat(frames, ignore_index=True)
+    return cells.groupby(list(DIMENSIONS), sort=False, observed=True, dropna=False).agg(how).reset_index()
+
+
+def _dimension_codes(series):
+    """Коды значений колонки и словарь; пропуски получают код len(словаря)"""
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype('category')
+    labels = list(series.cat.categories)
+    codes = series.cat.codes.to_numpy().astype(np.int64)
+    return np.where(codes < 0, len(labels), codes), labels + [None]
+
+
+def cube_cells(df):
+    """Ячейки куба для строк df: значения измерений и CELL_COLUMNS, по строке на непустую ячейку"""
+    if len(df) == 0:
+        return pd.DataFrame(columns=list(DIMENSIONS) + list(CELL_COLUMNS))
+    # Номер ячейки - смешанная система счисления по измерениям; ячеек мало, поэтому
+    # сортировка номеров (поразрядная для 16-битных) дешевле groupby по четырём колонкам
+    ages = df['age'].to_numpy().astype(np.int64)
+    age_low = ages.min()
+    cell, radices, labels = ages - age_low, [], []
+    for dim in DIMENSIONS[1:]:
+        codes, dim_labels = _dimension_codes(df[dim])
+        cell = cell * len(dim_labels) + codes
+        radices.append(len(dim_labels))
+        labels.append(dim_labels)
+    if cell.max() < np.iinfo(np.int16).max:
+        order = np.argsort(cell.astype(np.int16), kind='stable')
+    else:
+        order = np.argsort(cell, kind='stable')
+    sorted_cells = cell[order]
+    starts = np.flatnonzero(np.r_[True, sorted_cells[1:] != sorted_cells[:-1]])
+
+    data = {}
+    ids = sorted_cells[starts]
+    for dim, radix, dim_labels in zip(reversed(DIMENSIONS[1:]), reversed(radices), reversed(labels)):
+        data[dim] = np.asarray(dim_labels, dtype=object)[ids % radix]
+        ids = ids // radix
+    data['age'] = ids + age_low
+    data['count'] = np.diff(np.r_[starts, len(df)])
+    thresholds = {
+        'premium': df['balance'].to_numpy() > PREMIUM_BALANCE,
+        'high_income': df['income'].to_numpy() > HIGH_INCOME,
+        'low_activity': df['transactions'].to_numpy() < LOW_ACTIVITY_TRANSACTIONS,
+    }
+    for name, mask in thresholds.items():
+        data[name] = np.add.reduceat(mask[order].astype(np.int64), starts)
+    for m in MEASURES:
+        values = df[m].to_numpy()[order]
+        # Суммы целых колонок - в int64, чтобы не переполнить int8/int32 компактной схемы
+        data[f"{m}_sum"] = np.add.reduceat(values.astype(np.float64 if m == 'assets' else np.int64), starts)
+        data[f"{m}_min"] = np.minimum.reduceat(values, starts)
+        data[f"{m}_max"] = np.maximum.reduceat(values, starts)
+    return pd.DataFrame({col: data[col] for col in DIMENSIONS + CELL_COLUMNS})
+
+
+class OlapCube:
+    """Ячейки возраст x регион x продукт x риск и снимки агрегатов по комбинациям фильтров"""
+
+    def __init__(self, cells):
+        self.cells = cells.reset_index(drop=True)
+        self._ages = self.cells['age'].to_numpy(dtype=np.int64)
+        self._labels = {}
+        self._codes = {}
+        for dim in DIMENSIONS[1:]:
+            # Коды по отсортированным значениям - как категории pandas у Aggregator
+            values = self.cells[dim].astype(object).where(self.cells[dim].notna(), None)
+            labels = sorted(v for v in set(values) if v is not None)
+            self._labels[dim] = labels
+            self._codes[dim] = pd.Categorical(values, categories=labels).codes.astype(np.int64)
+        self._measures = {col: self.cells[col].to_numpy() for col in CELL_COLUMNS}
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(cube_cells(df))
+
+    def __len__(self):
+        return len(self.cells)
+
+    def merge(self, other):
+        """Куб по строкам обоих кубов"""
+        return OlapCube(merge_cells([self.cells, other.cells]))
+
+    def appended(self, df_new):
+        """Куб таблицы, дополненной строками df_new"""
+        return self.merge(OlapCube.from_frame(df_new))
+
+    def select(self, age=ALL, region=ALL, product=ALL):
+        """Булева маска ячеек для состояния фильтров"""
+        mask = np.ones(len(self.cells), dtype=bool)
+        if age != ALL:
+            low, high = AGE_RANGES.get(age, (1, 0))
+            mask &= (self._ages >= low) & (self._ages <= high)
+        for dim, value in (('region', region), ('product', product)):
+            if value != ALL:
+                labels = self._labels[dim]
+                code = labels.index(value) if value in labels else -2
+                mask &= self._codes[dim] == code
+        return mask
+
+    def _counts(self, dim, mask, counts):
+        labels = self._labels[dim]
+        codes = self._codes[dim][mask]
+        known = codes >= 0
+        bins = np.bincount(codes[known], weights=counts[known], minlength=len(labels)).astype(np.int64)
+        order = np.argsort(-bins, kind='stable')
+        return tuple((str(labels[i]), int(bins[i])) for i in order if bins[i] > 0)
+
+    def snapshot(self, age=ALL, region=ALL, product=ALL):
+        """AggregateSnapshot для состояния фильтров (без гистограмм) по ячейкам куба"""
+        return self.snapshot_cells(self.select(age, region, product))
+
+    def snapshot_cells(self, mask=None):
+        """AggregateSnapshot (без гистограмм) по ячейкам mask; None - все ячейки"""
+        if mask is None:
+            mask = np.ones(len(self.cells), dtype=bool)
+        m = {col: values[mask] for col, values in self._measures.items()}
+        counts = m['count'].astype(np.int64)
+        n = int(counts.sum())
+        if n == 0:
+            return empty_snapshot()
+
+        age_values, index = np.unique(self._ages[mask], return_inverse=True)
+        age_counts = np.bincount(index, weights=counts, minlength=len(age_values)).astype(np.int64)
+        present = age_counts > 0
+        age_values, age_counts = age_values[present], age_counts[present]
+        cumulative = np.cumsum(age_counts)
+        # Медиана как np.median: среднее элементов (n - 1) // 2 и n // 2 отсортированного ряда
+        age_median = (float(age_values[np.searchsorted(cumulative, (n - 1) // 2, side='right')])
+                      + float(age_values[np.searchsorted(cumulative, n // 2, side='right')])) / 2
+
+        risk_counts = self._counts('risk_level', mask, counts)
+        total_balance = float(m['balance_sum'].sum())
+        total_transactions = int(m['transactions_sum'].sum())
+        return AggregateSnapshot(
+            count=n,
+            total_balance=total_balance,
+            avg_balance=total_balance / n,
+            avg_income=float(m['income_sum'].sum()) / n,
+            total_assets=float(m['assets_sum'].sum()),
+            total_transactions=total_transactions,
+            avg_transactions=total_transactions / n,
+            premium_clients=int(m['premium'].sum()),
+            high_income_clients=int(m['high_income'].sum()),
+            low_activity_clients=int(m['low_activity'].sum()),
+            high_risk_clients=dict(risk_counts).get(HIGH_RISK, 0),
+            age_mean=float((age_values * age_counts).sum()) / n,
+            age_median=age_median,
+            age_min=int(age_values.min()),
+            age_max=int(age_values.max()),
+            age_groups=tuple(zip(age_bin_labels(), (int(c) for c in right_closed_counts(
+                age_values, AGE_BINS, weights=age_counts)))),
+            avg_loyalty=float(m['loyalty_years_sum'].sum()) / n,
+            max_loyalty=int(m['loyalty_years_max'].max()),
+            region_counts=self._counts('region', mask, counts),
+            product_counts=self._counts('product', mask, counts),
+            risk_counts=risk_counts,
+            chart_age_groups=tuple(zip(CHART_AGE_LABELS, (int(c) for c in right_closed_counts(
+                age_values, CHART_AGE_BINS, weights=age_counts)))),
+            income_histogram=((), ()),
+            balance_histogram=((), ()),
+        )
+
+    def value_range(self, measure, mask=None):
+        """(min, max) колонки measure по ячейкам mask"""
+        low, high = self._measures[f"{measure}_min"], self._measures[f"{measure}_max"]
+        if mask is not None:
+            low, high = low[mask], high[mask]
+        return low.min().item(), high.max().item()
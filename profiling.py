@@ -0,0 +1,191 @@
+"""Встроенное профилирование обработчиков интерфейса.
+
+Включается переменной LOG_LEVEL=DEBUG (см. .env.example). Обработчики
+оборачиваются в интервалы (span): время каждого вызова попадает в
+скользящую гистограмму задержек (её показывает строка состояния), в лог
+LOG_FILE и в файл трассировки Chrome (`<LOG_FILE>.trace.json`, открывается
+в chrome://tracing или Perfetto). Интервалы фоновых потоков пишутся со
+своим tid, поэтому в трассировке видно, где время уходит на pandas в
+фоне, а где - на виджеты Tk и matplotlib в главном потоке.
+
+При выключенном профилировании обработчики не оборачиваются, а span()
+возвращает пустой контекст.
+"""
+import atexit
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+logger = logging.getLogger("hub.profiling")
+
+# Верхние границы интервалов гистограммы задержек (мс); последний интервал - всё, что дольше
+LATENCY_BUCKETS_MS = (1, 4, 16, 50, 100, 250, 1000)
+# Столбики гистограммы в строке состояния
+_BARS = " ▁▂▃▄▅▆▇█"
+# Сколько последних задержек хранится для гистограммы и перцентилей
+DEFAULT_WINDOW = 512
+# Максимум событий трассировки в памяти; старые вытесняются
+MAX_TRACE_EVENTS = 200_000
+# Вызовы дольше этого пишутся в лог на уровне INFO
+SLOW_SPAN_MS = 100
+
+
+def configure_logging():
+    """Настраивает logging по LOG_LEVEL и LOG_FILE; возвращает уровень"""
+    level = getattr(logging, os.environ.get("LOG_LEVEL", "INFO").upper(), logging.INFO)
+    log_file = os.environ.get("LOG_FILE")
+    logging.basicConfig(level=level, filename=log_file or None, encoding='utf-8' if log_file else None,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    return level
+
+
+def trace_path_for(log_file):
+    return f"{os.path.splitext(log_file)[0]}.trace.json" if log_file else "trace.json"
+
+
+class Profiler:
+    """Интервалы времени, скользящая гистограмма задержек и трассировка Chrome"""
+
+    def __init__(self, enabled=True, trace_path=None, window=DEFAULT_WINDOW):
+        self.enabled = enabled
+        self.trace_path = trace_path
+        self._origin = time.perf_counter_ns()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._last = {}
+        self._events = deque(maxlen=MAX_TRACE_EVENTS)
+        self._threads = {}
+
+    @classmethod
+    def from_env(cls):
+        """Профилировщик по настройкам LOG_LEVEL/LOG_FILE; при DEBUG трассировка пишется при выходе"""
+        enabled = configure_logging() <= logging.DEBUG
+        profiler = cls(enabled=enabled, trace_path=trace_path_for(os.environ.get("LOG_FILE")))
+        if enabled:
+            atexit.register(profiler.dump)
+        return profiler
+
+    def span(self, name, category="ui", **args):
+        if not self.enabled:
+            return nullcontext()
+        return _Span(self, name, category, args)
+
+    def wrap(self, fn, name=None, category="ui"):
+        """fn, каждый вызов которой записывается интервалом"""
+        name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.span(name, category):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def instrument(self, obj, names, category="ui"):
+        """Подменяет методы names у экземпляра obj обёртками; до привязки к виджетам"""
+        if not self.enabled:
+            return
+        for name in names:
+            setattr(obj, name, self.wrap(getattr(obj, name), name, category))
+
+    def _record(self, name, category, start_ns, end_ns, args):
+        duration_ms = (end_ns - start_ns) / 1e6
+        thread = threading.current_thread()
+        event = {
+            'name': name, 'cat': category, 'ph': 'X', 'pid': os.getpid(), 'tid': thread.ident,
+            'ts': (start_ns - self._origin) / 1000, 'dur': (end_ns - start_ns) / 1000,
+        }
+        if args:
+            event['args'] = {key: str(value) for key, value in args.items()}
+        with self._lock:
+            self._latencies.append(duration_ms)
+            self._last[name] = duration_ms
+            self._events.append(event)
+            self._threads.setdefault(thread.ident, thread.name)
+        if duration_ms >= SLOW_SPAN_MS:
+            logger.info("Медленный вызов %s [%s]: %.1f мс", name, thread.name, duration_ms)
+        else:
+            logger.debug("%s [%s]: %.1f мс", name, thread.name, duration_ms)
+
+    def latencies(self):
+        with self._lock:
+            return list(self._latencies)
+
+    def histogram(self):
+        """Число вызовов из окна по интервалам LATENCY_BUCKETS_MS (+ интервал «дольше»)"""
+        counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        for value in self.latencies():
+            counts[next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if value < bound),
+                        len(LATENCY_BUCKETS_MS))] += 1
+        return counts
+
+    def summary(self):
+        """Перцентили задержек окна: {'count', 'p50', 'p95', 'max'} в мс"""
+        values = sorted(self.latencies())
+        if not values:
+            return {'count': 0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+        return {
+            'count': len(values),
+            'p50': values[(len(values) - 1) // 2],
+            'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+            'max': values[-1],
+        }
+
+    def status_text(self):
+        """Строка для строки состояния: гистограмма столбиками и перцентили"""
+        summary = self.summary()
+        if not summary['count']:
+            return ""
+        counts = self.histogram()
+        top = max(counts)
+        bars = "".join(_BARS[round(c / top * (len(_BARS) - 1))] for c in counts)
+        return (f"{bars} p50 {summary['p50']:.0f} мс, p95 {summary['p95']:.0f} мс, "
+                f"макс {summary['max']:.0f} мс (n={summary['count']})")
+
+    def trace(self):
+        """События в формате Chrome Trace Event"""
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+                    for tid, name in threads.items()]
+        return {
+            'traceEvents': metadata + events,
+            'displayTimeUnit': 'ms',
+            'otherData': {
+                'latency_ms': self.summary(),
+                'histogram_buckets_ms': list(LATENCY_BUCKETS_MS),
+                'histogram': self.histogram(),
+            },
+        }
+
+    def dump(self, path=None):
+        path = path or self.trace_path
+        if not self.enabled or not path:
+            return None
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.trace(), f, ensure_ascii=False)
+        logger.info("Трассировка сохранена в %s", path)
+        return path
+
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'category', 'args', 'start')
+
+    def __init__(self, profiler, name, category, args):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._record(self.name, self.category, self.start, time.perf_counter_ns(), self.args)
+        return False
@@ -0,0 +1,160 @@
+"""Пакетные отчёты без графического интерфейса.
+
+Считает те же метрики, инсайты и рекомендации, что и дашборд, для
+каждого сегмента регион x продукт (включая "Все") и сохраняет их в
+JSON и/или CSV. Сегменты распределяются по пулу процессов; набор данных
+загружается один раз: при fork процессы наследуют его из родителя, а
+колонки из бинарного кэша открыты через mmap и делят page cache ОС.
+С --streaming файл не загружается целиком, а сворачивается по частям
+в сливаемые агрегаты (см. streaming.py).
+
+    python report.py --data data/clients_data.csv --out reports --workers 8
+"""
+import argparse
+import csv
+import dataclasses
+import json
+import math
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import analytics
+from analytics import Aggregator
+from data_cache import read_csv_cached
+from filter_index import ALL, FilterIndex
+from streaming import aggregate_csv, merge_partials
+
+# Набор данных и индексы процесса: заполняются один раз на процесс
+_STATE = {}
+
+
+def _load_state(csv_path):
+    if _STATE.get('csv_path') != csv_path:
+        df = read_csv_cached(csv_path)
+        _STATE.update(csv_path=csv_path, df=df, filter_index=FilterIndex(df), aggregator=Aggregator(df))
+    return _STATE
+
+
+def _clean(value):
+    """NaN -> None, чтобы JSON оставался валидным"""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, (list, tuple)):
+        return [_clean(v) for v in value]
+    return value
+
+
+def segment_report(csv_path, region=ALL, product=ALL):
+    """Метрики, инсайты и рекомендации одного сегмента"""
+    state = _load_state(csv_path)
+    rows = state['filter_index'].select(region=region, product=product)
+    return _report_entry(region, product, state['aggregator'].compute(rows))
+
+
+def snapshot_metrics(snapshot):
+    """Метрики снимка словарём, пригодным для JSON"""
+    return {name: _clean(value) for name, value in dataclasses.asdict(snapshot).items()}
+
+
+def _report_entry(region, product, snapshot):
+    return {
+        'region': region,
+        'product': product,
+        'metrics': snapshot_metrics(snapshot),
+        'insights': analytics.insights(snapshot) if snapshot.count else [],
+        'recommendations': analytics.recommendations(snapshot),
+    }
+
+
+def _segment_task(args):
+    return segment_report(*args)
+
+
+def segments(csv_path):
+    state = _load_state(csv_path)
+    regions = [ALL] + state['filter_index'].values('region')
+    products = [ALL] + state['filter_index'].values('product')
+    return [(region, product) for region in regions for product in products]
+
+
+def run_report(csv_path, workers=None):
+    """Отчёты по всем сегментам регион x продукт, в порядке сегментов"""
+    tasks = [(csv_path, region, product) for region, product in segments(csv_path)]
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        return [_segment_task(task) for task in tasks]
+
+    # fork: дочерние процессы получают уже загруженные данные без повторного чтения
+    context = mp.get_context('fork') if 'fork' in mp.get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        return list(pool.map(_segment_task, tasks))
+
+
+def run_streaming_report(csv_path, workers=None):
+    """То же, что run_report, но CSV читается по частям и в память целиком не загружается"""
+    groups = aggregate_csv(csv_path, group_by=('region', 'product'), workers=workers)
+    regions = [ALL] + sorted({region for region, _ in groups})
+    products = [ALL] + sorted({product for _, product in groups})
+
+    reports = []
+    for region in regions:
+        for product in products:
+            # Частичные агрегаты сегментов сливаются в агрегаты по "Все"
+            partial = merge_partials(p for (r, pr), p in groups.items()
+                                     if region in (ALL, r) and product in (ALL, pr))
+            reports.append(_report_entry(region, product, partial.to_snapshot()))
+    return reports
+
+
+def _scalar_metrics(report):
+    return {name: value for name, value in report['metrics'].items() if not isinstance(value, list)}
+
+
+def write_json(reports, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(reports, f, ensure_ascii=False, indent=2)
+
+
+def write_csv(reports, path):
+    """Одна строка на сегмент: скалярные метрики и рекомендации через ' | '"""
+    fields = ['region', 'product'] + list(_scalar_metrics(reports[0])) + ['recommendations']
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for report in reports:
+            row = {'region': report['region'], 'product': report['product'], **_scalar_metrics(report),
+                   'recommendations': ' | '.join(report['recommendations'])}
+            writer.writerow(row)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетные отчёты ВТБ Data Intelligence Hub по сегментам")
+    parser.add_argument("--data", default=os.environ.get("DATA_CSV_PATH", "data/clients_data.csv"))
+    parser.add_argument("--out", default="reports", help="папка для отчётов")
+    parser.add_argument("--format", choices=["json", "csv", "both"], default="both")
+    parser.add_argument("--workers", type=int, default=None, help="по умолчанию - число ядер")
+    parser.add_argument("--streaming", action="store_true",
+                        help="читать CSV по частям, не загружая его в память целиком")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.data):
+        parser.error(f"Файл данных не найден: {args.data}")
+
+    started = time.perf_counter()
+    if args.streaming:
+        reports = run_streaming_report(args.data, args.workers)
+    else:
+        reports = run_report(args.data, args.workers)
+    os.makedirs(args.out, exist_ok=True)
+    stamp = time.strftime('%Y%m%d_%H%M%S')
+    if args.format in ("json", "both"):
+        write_json(reports, os.path.join(args.out, f"segments_{stamp}.json"))
+    if args.format in ("csv", "both"):
+        write_csv(reports, os.path.join(args.out, f"segments_{stamp}.csv"))
+    print(f"Отчёты по {len(reports)} сегментам сохранены в {args.out} за {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Компактная схема таблицы клиентов в памяти.
+
+apply_schema приводит DataFrame к компактным типам при загрузке:
+- регион, продукт и уровень риска - категории (1 байт кода на строку);
+- целые колонки - наименьший подходящий знаковый тип (возраст - int8);
+- last_activity - datetime64 вместо строк;
+- колонка name не хранится, если она всегда равна `Клиент_{id}`: имена
+  восстанавливаются из id только для тех строк, которые нужны (таблица,
+  экспорт, прогнозы), а поиск по имени идёт по числам id.
+"""
+import numpy as np
+import pandas as pd
+
+NAME_COLUMN = 'name'
+NAME_PREFIX = 'Клиент_'
+CATEGORICAL_COLUMNS = ('region', 'product', 'risk_level')
+INTEGER_COLUMNS = ('id', 'age', 'income', 'balance', 'transactions', 'loyalty_years')
+DATE_COLUMNS = ('last_activity',)
+DATE_FORMAT = '%Y-%m-%d'
+
+# Типы для pd.read_csv: категории разбираются сразу, без промежуточных строк
+CSV_DTYPES = {col: 'category' for col in CATEGORICAL_COLUMNS}
+
+
+def client_names(ids):
+    """Имена `Клиент_{id}` для массива id"""
+    return NAME_PREFIX + pd.Series(np.asarray(ids)).astype(str).to_numpy(dtype=object)
+
+
+def has_derived_names(df):
+    """Колонка name не хранится и выводится из id"""
+    return NAME_COLUMN not in df.columns and 'id' in df.columns
+
+
+def _names_derivable(df):
+    if NAME_COLUMN not in df.columns or 'id' not in df.columns:
+        return False
+    if not pd.api.types.is_integer_dtype(df['id'].dtype):
+        return False
+    return bool((df[NAME_COLUMN].astype(str).to_numpy(dtype=object) == client_names(df['id'])).all())
+
+
+def apply_schema(df):
+    """Новый DataFrame с компактными типами колонок; исходный не меняется"""
+    data = {}
+    for col in df.columns:
+        series = df[col]
+        if col in CATEGORICAL_COLUMNS and not isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype('category')
+        elif col in INTEGER_COLUMNS and pd.api.types.is_integer_dtype(series.dtype):
+            series = pd.to_numeric(series, downcast='integer')
+        elif col in DATE_COLUMNS and not pd.api.types.is_datetime64_dtype(series.dtype):
+            series = pd.to_datetime(series, format=DATE_FORMAT, errors='coerce')
+        data[col] = series
+    if _names_derivable(df):
+        del data[NAME_COLUMN]
+    return pd.DataFrame(data, index=df.index)
+
+
+def columns(df):
+    """Колонки таблицы с учётом выводимой колонки name"""
+    names = list(df.columns)
+    if has_derived_names(df):
+        names.insert(names.index('id') + 1, NAME_COLUMN)
+    return names
+
+
+def column(df, name):
+    """Колонка как Series, включая выводимую name"""
+    if name == NAME_COLUMN and has_derived_names(df):
+        return pd.Series(client_names(df['id']), index=df.index, name=NAME_COLUMN)
+    return df[name]
+
+
+def with_names(df):
+    """Строки df с восстановленной колонкой name (для экспорта и вывода)"""
+    if not has_derived_names(df):
+        return df
+    df = df.copy(deep=False)
+    df.insert(df.columns.get_loc('id') + 1, NAME_COLUMN, client_names(df['id']))
+    return df
+
+
+def display_frame(df):
+    """Строки df в исходном виде: с колонкой name и датами строками"""
+    df = with_names(df)
+    dates = [col for col in DATE_COLUMNS if col in df.columns and pd.api.types.is_datetime64_dtype(df[col].dtype)]
+    if dates:
+        df = df.copy(deep=False)
+        for col in dates:
+            df[col] = df[col].dt.strftime(DATE_FORMAT)
+    return df
+
+
+def memory_usage(df):
+    """Байт, занятых колонками df (строки объектов учитываются целиком)"""
+    return int(df.memory_usage(index=False, deep=True).sum())
+
+
+def format_memory(nbytes):
+    for unit in ('Б', 'КБ', 'МБ'):
+        if nbytes < 1024:
+            return f"{nbytes:.0f} {unit}" if unit == 'Б' else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+    return f"{nbytes:.2f} ГБ"
@@ -0,0 +1,289 @@
+"""Индекс для умного поиска по клиентской базе.
+
+Строится один раз при загрузке данных:
+- колонки с небольшим числом значений (регион, продукт, риск) кодируются
+  словарём, и подстрока проверяется только по словарю, а не по строкам;
+- колонки с уникальными значениями (имя) заранее приводятся к нижнему
+  регистру, а для имён с общим префиксом (`Клиент_`) есть отсортированный
+  префиксный индекс с бинарным поиском и алфавит колонки;
+- имена, выводимые из id (`Клиент_{id}`, см. schema.py), проверяются
+  арифметикой по числам id без построения строк.
+
+Результаты последних запросов хранятся упакованными битовыми масками.
+Если новый запрос содержит один из прошлых (пользователь дописал
+символы), поиск идёт только среди уже найденных строк.
+
+Строки, дописанные в конец таблицы, добавляются в колонки индекса без
+пересчёта старых (appended).
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from growable import GrowableArray
+from schema import NAME_COLUMN, NAME_PREFIX, has_derived_names
+
+SEARCH_COLUMNS = ('name', 'region', 'product', 'risk_level')
+
+# Колонка кодируется словарём, если различных значений не больше этой доли от числа строк
+DICTIONARY_MAX_RATIO = 0.1
+
+
+class _DictionaryColumn:
+    """Колонка как коды + словарь значений в нижнем регистре"""
+
+    def __init__(self, codes, categories):
+        self._codes = GrowableArray(codes)
+        self.codes = self._codes.values
+        self.labels = list(categories)
+        self.categories = [str(c).lower() for c in categories]
+
+    def appended(self, series, n_rows):
+        """Колонка series, первые n_rows строк которой уже есть в этой колонке"""
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Коды категорий - view на колонку таблицы, пересчитывать нечего
+            return _DictionaryColumn(series.cat.codes.to_numpy(), series.cat.categories)
+        codes, uniques = pd.factorize(series.iloc[n_rows:])
+        index = {label: code for code, label in enumerate(self.labels)}
+        labels = self.labels + [label for label in uniques if label not in index]
+        index.update((label, code) for code, label in enumerate(labels))
+        # Код -1 (пропуск) остаётся -1
+        lookup = np.array([index[label] for label in uniques] + [-1], dtype=np.int64)
+        result = _DictionaryColumn.__new__(_DictionaryColumn)
+        result._codes = self._codes.appended(lookup[codes])
+        result.codes = result._codes.values
+        result.labels = labels
+        result.categories = self.categories + [str(c).lower() for c in labels[len(self.labels):]]
+        return result
+
+    def match(self, query, rows=None):
+        hits = np.fromiter((query in c for c in self.categories), dtype=bool, count=len(self.categories))
+        # Код -1 (пропуск) попадает на последний элемент - он всегда False
+        hits = np.append(hits, False)
+        codes = self.codes if rows is None else self.codes[rows]
+        return hits[codes]
+
+
+class _TextColumn:
+    """Колонка уникальных строк в нижнем регистре с ленивым префиксным индексом"""
+
+    def __init__(self, values):
+        self._set_values(GrowableArray(self._lower(values)))
+
+    def _set_values(self, values):
+        self._values = values
+        self.values = values.values
+        # Префиксный индекс строится при первом поиске, которому он нужен
+        self._alphabet = None
+        self._prefix = None
+        self._prefix_exact = False
+        self._order = None
+        self._sorted = None
+
+    @staticmethod
+    def _lower(values):
+        return pd.Series(values).fillna('').astype(str).str.lower().to_numpy(dtype=object)
+
+    def appended(self, series, n_rows):
+        """Колонка series, первые n_rows строк которой уже есть в этой колонке"""
+        result = _TextColumn.__new__(_TextColumn)
+        result._set_values(self._values.appended(self._lower(series.iloc[n_rows:])))
+        return result
+
+    def _build_prefix_index(self):
+        if self._order is not None or len(self.values) == 0:
+            return
+        # Набор всех символов колонки: запрос с чужим символом заведомо ничего не найдёт
+        self._alphabet = frozenset(''.join(self.values))
+        # Общий префикс всех строк совпадает с общим префиксом минимальной и максимальной
+        lo, hi = min(self.values), max(self.values)
+        n = 0
+        while n < min(len(lo), len(hi)) and lo[n] == hi[n]:
+            n += 1
+        self._prefix = lo[:n]
+        # Префиксный поиск точен, только если общий префикс не встречается внутри строк
+        self._prefix_exact = bool(self._prefix) and not (
+            pd.Series(self.values).str.find(self._prefix, 1) >= 0).any()
+        self._order = np.argsort(self.values, kind='stable')
+        self._sorted = self.values[self._order]
+
+    def prefix_rows(self, query):
+        """Номера строк, найденные по префиксному индексу, или None, если индекс неприменим"""
+        self._build_prefix_index()
+        if self._alphabet is not None and not self._alphabet.issuperset(query):
+            return self._order[:0]
+        if not self._prefix:
+            return None
+        if self._prefix.startswith(query):
+            return self._order
+        if self._prefix_exact and query.startswith(self._prefix):
+            lo = np.searchsorted(self._sorted, query, side='left')
+            hi = np.searchsorted(self._sorted, query + '\U0010ffff', side='left')
+            return self._order[lo:hi]
+        return None
+
+    def match(self, query, rows=None):
+        values = self.values if rows is None else self.values[rows]
+        return pd.Series(values, dtype=object).str.contains(query, regex=False, na=False).to_numpy(dtype=bool)
+
+
+def _is_number(text):
+    return text.isascii() and text.isdigit()
+
+
+class _ClientNameColumn:
+    """Выводимая колонка `Клиент_{id}`: подстрока имени ищется по цифрам id"""
+
+    def __init__(self, ids, prefix=NAME_PREFIX):
+        self._ids = GrowableArray(np.asarray(ids, dtype=np.int64))
+        self.ids = self._ids.values
+        self.prefix = prefix.lower()
+        self.max_digits = self._digits(self.ids)
+
+    @staticmethod
+    def _digits(ids):
+        return len(str(int(ids.max()))) if len(ids) else 0
+
+    def appended(self, ids, n_rows):
+        """Колонка id, первые n_rows строк которой уже есть в этой колонке"""
+        new_ids = np.asarray(ids.iloc[n_rows:], dtype=np.int64)
+        result = _ClientNameColumn.__new__(_ClientNameColumn)
+        result._ids = self._ids.appended(new_ids)
+        result.ids = result._ids.values
+        result.prefix = self.prefix
+        result.max_digits = max(self.max_digits, self._digits(new_ids))
+        return result
+
+    def _starts_with(self, ids, digits):
+        value, length = int(digits), len(digits)
+        mask = np.zeros(len(ids), dtype=bool)
+        for shift in range(self.max_digits - length + 1):
+            mask |= (ids // 10 ** shift == value) & (ids >= 10 ** (length - 1 + shift))
+        return mask
+
+    def _contains(self, ids, digits):
+        value, length = int(digits), len(digits)
+        mask = np.zeros(len(ids), dtype=bool)
+        for shift in range(self.max_digits - length + 1):
+            # Окно из length цифр, заканчивающееся на разряде shift, целиком внутри числа
+            mask |= ((ids // 10 ** shift) % 10 ** length == value) & (ids >= 10 ** (length - 1 + shift))
+        return mask
+
+    def match(self, query, rows=None):
+        ids = self.ids if rows is None else self.ids[rows]
+        if query in self.prefix:
+            return np.ones(len(ids), dtype=bool)
+        mask = np.zeros(len(ids), dtype=bool)
+        if _is_number(query):
+            mask |= self._contains(ids, query)
+        # Запрос начинается с конца префикса ('нт_12'): id должен начинаться с оставшихся цифр
+        for size in range(1, len(self.prefix) + 1):
+            rest = query[size:]
+            if query.startswith(self.prefix[-size:]) and _is_number(rest):
+                mask |= self._starts_with(ids, rest)
+        return mask
+
+
+class SearchIndex:
+    """Поиск подстроки по нескольким колонкам DataFrame"""
+
+    def __init__(self, df, columns=SEARCH_COLUMNS, cache_size=32):
+        self.n_rows = len(df)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._columns = []
+        # Колонки таблицы, из которых построены колонки индекса (для appended)
+        self._sources = []
+
+        for col in columns:
+            if col == NAME_COLUMN and has_derived_names(df):
+                self._columns.append(_ClientNameColumn(df['id']))
+                self._sources.append('id')
+                continue
+            series = df[col]
+            self._sources.append(col)
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                self._columns.append(_DictionaryColumn(series.cat.codes.to_numpy(), series.cat.categories))
+                continue
+            codes, uniques = pd.factorize(series)
+            if len(uniques) <= max(256, self.n_rows * DICTIONARY_MAX_RATIO):
+                self._columns.append(_DictionaryColumn(codes, uniques))
+            else:
+                self._columns.append(_TextColumn(series.to_numpy()))
+
+    def appended(self, df):
+        """Индекс таблицы df, первые строки которой - строки этого индекса; старые строки не пересчитываются
+
+        Кэш запросов не переносится: маски в нём короче новой таблицы.
+        """
+        result = SearchIndex.__new__(SearchIndex)
+        result.n_rows = len(df)
+        result.cache_size = self.cache_size
+        result._cache = OrderedDict()
+        result._lock = threading.Lock()
+        result._sources = self._sources
+        result._columns = [column.appended(df[source], self.n_rows)
+                           for column, source in zip(self._columns, self._sources)]
+        return result
+
+    def search(self, query):
+        """Булева маска строк, где хотя бы одна колонка содержит query; None для пустого запроса"""
+        query = query.lower()
+        if not query:
+            return None
+        # Поиск может вызываться из фоновых потоков: кэш и ленивые индексы защищены блокировкой
+        with self._lock:
+            return self._search(query)
+
+    def _search(self, query):
+        cached = self._cache.get(query)
+        if cached is not None:
+            self._cache.move_to_end(query)
+            return self._unpack(cached)
+
+        rows = self._narrowing_rows(query)
+        mask = np.zeros(self.n_rows, dtype=bool)
+        pending = []
+        for column in self._columns:
+            found = column.prefix_rows(query) if isinstance(column, _TextColumn) else None
+            if found is not None:
+                mask[found] = True
+            else:
+                pending.append(column)
+
+        if pending:
+            if rows is None:
+                for column in pending:
+                    mask |= column.match(query)
+            else:
+                # Проверяем только строки, найденные по более короткому запросу
+                rows = rows[~mask[rows]]
+                sub_mask = np.zeros(len(rows), dtype=bool)
+                for column in pending:
+                    sub_mask |= column.match(query, rows)
+                mask[rows[sub_mask]] = True
+
+        self._remember(query, mask)
+        return mask
+
+    def _narrowing_rows(self, query):
+        """Строки результата самого длинного закэшированного запроса, входящего в query"""
+        best = None
+        for previous in self._cache:
+            if previous in query and (best is None or len(previous) > len(best)):
+                best = previous
+        if best is None:
+            return None
+        return np.flatnonzero(self._unpack(self._cache[best]))
+
+    def _remember(self, query, mask):
+        self._cache[query] = np.packbits(mask)
+        self._cache.move_to_end(query)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _unpack(self, packed):
+        return np.unpackbits(packed, count=self.n_rows).astype(bool)
@@ -0,0 +1,616 @@
+"""Хранилище клиентской таблицы в локальной базе SQLite.
+
+Альтернатива таблице pandas в памяти для клиентских баз больше RAM.
+CSV один раз загружается в файл `<csv>.sqlite` с индексами по региону,
+продукту, возрасту и уровню риска; при следующих запусках база только
+открывается (перестраивается, если CSV изменился). Все операции хаба
+принимают ключ состояния фильтров (возраст, регион, продукт, запрос)
+и выполняются запросами SQL:
+- фильтры - условия WHERE по индексированным колонкам;
+- поиск - LIKE по имени в нижнем регистре; для региона, продукта и риска
+  подходящие значения находятся по словарю значений, а в SQL идёт IN (...);
+- панели - ячейки куба olap_cube.OlapCube: без поиска они берутся из
+  таблицы cube, построенной при загрузке, с поиском - одним GROUP BY по
+  возрасту x региону x продукту x риску; гистограммы - GROUP BY по
+  интервалам;
+- таблица - постраничная выборка по ключу (keyset) с опорными точками;
+- прогноз - сумма по сегментам роста и ORDER BY прироста с LIMIT.
+
+Пока старой базой пользуются открытые выборки таблицы или экспорт,
+перестроенная база пишется в соседний файл `<csv>.2.sqlite` (и т.д.), а
+старая закрывается и удаляется, когда её отпустят (SqliteStore.retire).
+"""
+import dataclasses
+import io
+import json
+import os
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from analytics import HIGH_INCOME, HISTOGRAM_BINS, LOW_ACTIVITY_TRANSACTIONS, PREMIUM_BALANCE
+from data_cache import PrefixReader, csv_signature, remove_stale_tmp
+from export_jobs import DEFAULT_CHUNK_SIZE, ExportJob
+from filter_index import AGE_RANGES, ALL
+from forecasting import (HORIZON_MONTHS, INCOME_BINS, LOYALTY_BINS, RISK_GROWTH, TOP_N, Forecast,
+                         segment_growth)
+from olap_cube import CELL_COLUMNS, MEASURES, OlapCube, cube_cells, merge_cells
+from schema import display_frame
+
+STORE_VERSION = 2
+COLUMNS = ('id', 'name', 'age', 'region', 'income', 'balance', 'assets', 'transactions', 'product',
+           'loyalty_years', 'risk_level', 'last_activity')
+DICTIONARY_COLUMNS = ('region', 'product', 'risk_level')
+IMPORT_CHUNK_SIZE = 200_000
+# Сколько файлов базы может быть одновременно: текущая и заменённые, которые ещё держат выборки
+MAX_GENERATIONS = 8
+
+_SCHEMA = """
+CREATE TABLE clients (
+    id INTEGER,
+    name TEXT,
+    age INTEGER,
+    region TEXT,
+    income INTEGER,
+    balance INTEGER,
+    assets REAL,
+    transactions INTEGER,
+    product TEXT,
+    loyalty_years INTEGER,
+    risk_level TEXT,
+    last_activity TEXT,
+    name_lower TEXT
+);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE cube (
+    age INTEGER, region TEXT, product TEXT, risk_level TEXT,
+""" + ",\n".join(f"    {col} {'REAL' if col.startswith('assets') else 'INTEGER'}" for col in CELL_COLUMNS) + """
+);
+"""
+# Индекс по возрасту покрывающий: в нём все колонки агрегатов панелей, поэтому GROUP BY
+# снимка идёт по индексу в нужном порядке без чтения строк таблицы и без сортировки
+_INDEXES = """
+CREATE INDEX clients_region ON clients (region);
+CREATE INDEX clients_product ON clients (product);
+CREATE INDEX clients_age ON clients (age, region, product, risk_level,
+                                     income, balance, assets, transactions, loyalty_years);
+CREATE INDEX clients_risk_level ON clients (risk_level);
+"""
+_INSERT = f"INSERT INTO clients ({', '.join(COLUMNS)}, name_lower) VALUES ({', '.join('?' * (len(COLUMNS) + 1))})"
+
+
+def db_path_for(csv_path):
+    return f"{csv_path}.sqlite"
+
+
+def generation_paths(db_path):
+    """Файлы, в которые по очереди строится база: db_path, <имя>.2<расширение> и т.д."""
+    root, ext = os.path.splitext(db_path)
+    return [db_path] + [f"{root}.{i}{ext}" for i in range(2, MAX_GENERATIONS + 1)]
+
+
+# Открытые базы процесса: from_csv не строит новую базу поверх файла, который ещё читают
+_open_stores = weakref.WeakSet()
+_open_stores_lock = threading.Lock()
+
+
+def _in_use(db_path, exclude=None):
+    path = os.path.abspath(db_path)
+    with _open_stores_lock:
+        stores = list(_open_stores)
+    return any(store is not exclude and not store.closed and os.path.abspath(store.db_path) == path
+               for store in stores)
+
+
+def _rows(chunk):
+    """Строки DataFrame (как в CSV или в компактной схеме) кортежами обычных типов Python"""
+    chunk = display_frame(chunk)[list(COLUMNS)]
+    values = [chunk[col].tolist() for col in COLUMNS]
+    values.append(chunk['name'].fillna('').astype(str).str.lower().tolist())
+    return zip(*values)
+
+
+def _write_cube(conn, cube):
+    conn.execute("DELETE FROM cube")
+    cells = cube.cells
+    conn.executemany(f"INSERT INTO cube VALUES ({', '.join('?' * len(cells.columns))})",
+                     zip(*(cells[col].tolist() for col in cells.columns)))
+
+
+def build_store(csv_path, db_path=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """Загружает CSV в новую базу; файл базы заменяется атомарно
+
+    Файл не должен быть открыт: соединения держат старые -wal/-shm, SQLite
+    применяет их к новому файлу и база портится (см. SqliteStore.from_csv).
+    """
+    db_path = db_path or db_path_for(csv_path)
+    tmp = f"{db_path}.tmp-{os.getpid()}"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.executescript("PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;" + _SCHEMA)
+        # Как data_cache.read_csv_cached: читаем ровно ту часть файла, которую описывает подпись
+        with open(csv_path, 'rb') as f:
+            source = csv_signature(csv_path)
+            reader = io.BufferedReader(PrefixReader(f, source['size']), buffer_size=1 << 20)
+            # Куб сливается из ячеек блоков - второго прохода по таблице не нужно
+            cells = []
+            for chunk in pd.read_csv(reader, chunksize=chunk_size, encoding='utf-8'):
+                conn.executemany(_INSERT, _rows(chunk))
+                cells.append(cube_cells(chunk))
+        if cells:
+            _write_cube(conn, OlapCube(merge_cells(cells)))
+        # Индексы строятся после загрузки - так быстрее, чем поддерживать их при вставке
+        conn.executescript(_INDEXES + "ANALYZE;")
+        conn.executemany("INSERT INTO meta VALUES (?, ?)",
+                         [('version', str(STORE_VERSION)), ('source', json.dumps(source))])
+        conn.commit()
+        conn.execute("PRAGMA journal_mode = WAL")
+    finally:
+        conn.close()
+    os.replace(tmp, db_path)
+    return db_path
+
+
+def is_store_valid(csv_path, db_path=None):
+    """База существует, той же версии и построена из текущего CSV"""
+    db_path = db_path or db_path_for(csv_path)
+    if not os.path.exists(db_path):
+        return False
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+        finally:
+            conn.close()
+        return (meta.get('version') == str(STORE_VERSION)
+                and json.loads(meta.get('source', 'null')) == csv_signature(csv_path))
+    except (sqlite3.Error, OSError, ValueError):
+        return False
+
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _band_sql(column, bins):
+    """Номер интервала [bins[i], bins[i + 1]) колонки, как np.searchsorted(bins, x, side='right')"""
+    return "(" + " + ".join(f"({column} >= {bound})" for bound in bins) + ")"
+
+
+def _factor_sql(horizon_months):
+    """Выражение SQL с множителем баланса за горизонт (см. forecasting.Forecaster)
+
+    Темп роста зависит только от сегмента (риск x группа дохода x группа
+    лояльности), поэтому множители считаются в Python по segment_growth для
+    каждого сегмента, а в SQL остаётся выбор по номеру сегмента.
+    """
+    risks = list(RISK_GROWTH)
+    risk_code = ("(CASE risk_level " + " ".join(f"WHEN '{risk}' THEN {i}" for i, risk in enumerate(risks))
+                 + f" ELSE {len(risks)} END)")
+    incomes, loyalties = (0,) + INCOME_BINS, (0,) + LOYALTY_BINS
+    segment = (f"{risk_code} * {len(incomes) * len(loyalties)} + {_band_sql('income', INCOME_BINS)} * "
+               f"{len(loyalties)} + {_band_sql('loyalty_years', LOYALTY_BINS)}")
+    branches = []
+    for r, risk in enumerate(risks + [None]):
+        for i, income in enumerate(incomes):
+            rates = segment_growth([risk] * len(loyalties), [income] * len(loyalties), loyalties)
+            for l, rate in enumerate(rates):
+                code = (r * len(incomes) + i) * len(loyalties) + l
+                branches.append(f"WHEN {code} THEN {float((1 + rate) ** (horizon_months / 12))!r}")
+    return f"(CASE {segment} " + " ".join(branches) + " END)"
+
+
+def _sql_value(value):
+    """Значение из DataFrame в тип, который принимает sqlite3 (numpy.int64 и т.п. - нет)"""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class SqliteStore:
+    """Клиентская таблица в SQLite: фильтры, поиск, агрегаты и страницы таблицы запросами SQL"""
+
+    def __init__(self, db_path, cache_size=64):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self._local = threading.local()
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        # Соединения всех потоков - их закрывает close()
+        self._connections = []
+        self._closed = False
+        # Выборки таблицы и экспорт, читающие базу: заменённая база закрывается после последнего
+        self._users = 0
+        self._retired = False
+        with _open_stores_lock:
+            _open_stores.add(self)
+        # Номер версии данных: результат, посчитанный до append, не попадает в кэш после него
+        self._generation = 0
+        self._values = {}
+        self._len = None
+        self._cube = None
+
+    @classmethod
+    def from_csv(cls, csv_path, db_path=None):
+        """Открывает базу для CSV, перестраивая её, если CSV изменился
+
+        Новая база строится в первый из generation_paths, который не открыт в
+        этом процессе: прежняя база остаётся рабочей для своих выборок, пока
+        её не заменят и не отпустят (retire).
+        """
+        paths = generation_paths(db_path or db_path_for(csv_path))
+        for path in paths:
+            remove_stale_tmp(path)
+        for path in paths:
+            if is_store_valid(csv_path, path):
+                return cls(path)
+        path = next((path for path in paths if not _in_use(path)), None)
+        if path is None:
+            raise RuntimeError(f"Все {MAX_GENERATIONS} файлов базы заняты открытыми выборками")
+        build_store(csv_path, path)
+        return cls(path)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def acquire(self):
+        """Отмечает пользователя базы (выборку таблицы, экспорт): retire не закроет её до release"""
+        with self._lock:
+            self._users += 1
+        return self
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            retire = self._retired and self._users == 0
+        if retire:
+            self._remove()
+
+    def retire(self):
+        """База заменена новой: закрывается и удаляется сразу или после release последнего пользователя"""
+        with self._lock:
+            self._retired = True
+            retire = self._users == 0
+        if retire:
+            self._remove()
+
+    def _remove(self):
+        self.close()
+        # Тот же файл мог открыть и другой SqliteStore (CSV не изменился) - тогда файл нужен ему
+        if _in_use(self.db_path, exclude=self):
+            return
+        for path in (self.db_path, f"{self.db_path}-wal", f"{self.db_path}-shm"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _conn(self):
+        # Соединение на поток: задачи хаба выполняются в пуле потоков.
+        # check_same_thread=False нужен только close(): запросы идут из потока-владельца
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            with self._lock:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("База закрыта")
+                conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                self._connections.append(conn)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Закрывает соединения всех потоков; после этого запросы к базе завершаются ошибкой"""
+        with self._lock:
+            self._closed = True
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+
+    def _query(self, sql, params=()):
+        return self._conn().execute(sql, params).fetchall()
+
+    def _frame(self, sql, params=(), columns=None):
+        cursor = self._conn().execute(sql, params)
+        columns = columns or [d[0] for d in cursor.description]
+        return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+    @property
+    def columns(self):
+        return list(COLUMNS)
+
+    @property
+    def file_size(self):
+        return os.path.getsize(self.db_path)
+
+    @property
+    def source(self):
+        """Размер и mtime CSV, из которого построена база"""
+        return json.loads(self._query("SELECT value FROM meta WHERE key = 'source'")[0][0])
+
+    def __len__(self):
+        if self._len is None:
+            self._len = self._query("SELECT COUNT(*) FROM clients")[0][0]
+        return self._len
+
+    def values(self, column):
+        """Различные значения колонки по индексу (для фильтров и поиска по словарю)"""
+        if column not in self._values:
+            self._values[column] = [v for (v,) in self._query(
+                f"SELECT DISTINCT {column} FROM clients WHERE {column} IS NOT NULL ORDER BY {column}")]
+        return self._values[column]
+
+    def where(self, key):
+        """Условие WHERE и параметры для ключа (возраст, регион, продукт, запрос)"""
+        age, region, product, query = key
+        query = query.lower()
+        clauses, params = [], []
+        if age != ALL:
+            low, high = AGE_RANGES.get(age, (1, 0))
+            # Возрастная группа - до трети таблицы: с поиском по имени дешевле пройти таблицу подряд,
+            # чем читать её строки вразброс по индексу возраста (унарный + отключает индекс)
+            clauses.append(f"{'+' if query else ''}age BETWEEN ? AND ?")
+            params += [low, high]
+        for column, value in (('region', region), ('product', product)):
+            if value != ALL:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if query:
+            alternatives = ["name_lower LIKE ? ESCAPE '\\'"]
+            params.append(f"%{_escape_like(query)}%")
+            for column in DICTIONARY_COLUMNS:
+                matched = [v for v in self.values(column) if query in str(v).lower()]
+                if matched:
+                    alternatives.append(f"{column} IN ({', '.join('?' * len(matched))})")
+                    params += matched
+            clauses.append("(" + " OR ".join(alternatives) + ")")
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def count(self, key):
+        where, params = self.where(key)
+        return self._query(f"SELECT COUNT(*) FROM clients{where}", params)[0][0]
+
+    def _cached(self, name, key, compute):
+        cache_key = (name, key)
+        with self._lock:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                self._cache.move_to_end(cache_key)
+                return cached
+            generation = self._generation
+        result = compute(key)
+        with self._lock:
+            if generation != self._generation:
+                return result
+            self._cache[cache_key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+            self._values = {}
+            self._len = None
+
+    def snapshot(self, key):
+        """AggregateSnapshot выборки, как analytics.Aggregator, с LRU кэшем по ключу"""
+        return self._cached('snapshot', key, self._compute_snapshot)
+
+    @property
+    def cube(self):
+        """Куб агрегатов всей таблицы (таблица cube базы)"""
+        with self._lock:
+            cube = self._cube
+        if cube is None:
+            cube = OlapCube(self._frame("SELECT * FROM cube"))
+            with self._lock:
+                self._cube = cube
+        return cube
+
+    def groups(self, key):
+        """Ячейки куба (olap_cube.CELL_COLUMNS) выборки одним GROUP BY по строкам таблицы"""
+        where, params = self.where(key)
+        group = "age, region, product, risk_level"
+        if key[3]:
+            # Поиску нужна колонка имени, которой нет в покрывающем индексе: обход индекса по порядку
+            # групп читал бы строки таблицы вразброс, поэтому унарный + отключает его для GROUP BY
+            group = ", ".join(f"+{col}" for col in group.split(", "))
+        measures = ", ".join(f"SUM({m}) AS {m}_sum, MIN({m}) AS {m}_min, MAX({m}) AS {m}_max" for m in MEASURES)
+        return self._frame(
+            "SELECT age, region, product, risk_level, COUNT(*) AS count, SUM(balance > ?) AS premium, "
+            f"SUM(income > ?) AS high_income, SUM(transactions < ?) AS low_activity, {measures} "
+            f"FROM clients{where} GROUP BY {group}",
+            [PREMIUM_BALANCE, HIGH_INCOME, LOW_ACTIVITY_TRANSACTIONS] + params)
+
+    def _histograms(self, key, income_range, balance_range):
+        """Гистограммы дохода и баланса на HISTOGRAM_BINS интервалов, как np.histogram"""
+        where, params = self.where(key)
+        # Номер интервала считается как в np.histogram: (x - min) * (bins / (max - min))
+        bucket = "MIN(CAST(({col} - ?) * ? AS INTEGER), {last})"
+        spans = []
+        for low, high in (income_range, balance_range):
+            spans += [low, HISTOGRAM_BINS / (high - low) if high > low else 0.0]
+        rows = self._query(
+            f"SELECT {bucket.format(col='income', last=HISTOGRAM_BINS - 1)} AS ib, "
+            f"{bucket.format(col='balance', last=HISTOGRAM_BINS - 1)} AS bb, COUNT(*) "
+            f"FROM clients{where} GROUP BY ib, bb", spans + params)
+        result = []
+        for axis, (low, high) in enumerate((income_range, balance_range)):
+            counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+            for row in rows:
+                counts[row[axis]] += row[2]
+            if low == high:
+                # Все значения одинаковые: np.histogram берёт интервал (x - 0.5, x + 0.5]
+                counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+                counts[HISTOGRAM_BINS // 2] = sum(row[2] for row in rows)
+                low, high = low - 0.5, high + 0.5
+            edges = np.linspace(low, high, HISTOGRAM_BINS + 1)
+            result.append((tuple(int(c) for c in counts), tuple(float(e) for e in edges)))
+        return result
+
+    def _compute_snapshot(self, key):
+        if key[3]:
+            cube, mask = OlapCube(self.groups(key)), None
+        else:
+            # Без поиска ячейки выборки уже есть в кубе - по строкам считаются только гистограммы
+            cube = self.cube
+            mask = cube.select(*key[:3])
+        snapshot = cube.snapshot_cells(mask)
+        if snapshot.count == 0:
+            return snapshot
+        income_histogram, balance_histogram = self._histograms(
+            key, cube.value_range('income', mask), cube.value_range('balance', mask))
+        return dataclasses.replace(snapshot, income_histogram=income_histogram, balance_histogram=balance_histogram)
+
+    def forecast(self, key, horizon_months=HORIZON_MONTHS, top_n=TOP_N):
+        """Прогноз балансов выборки (forecasting.Forecast); top_rows - номера строк базы (rowid)"""
+        return self._cached(('forecast', horizon_months, top_n), key,
+                            lambda k: self._compute_forecast(k, horizon_months, top_n))
+
+    def _compute_forecast(self, key, horizon_months, top_n):
+        where, params = self.where(key)
+        factor = _factor_sql(horizon_months)
+        count, total_balance, total_projected = self._query(
+            f"SELECT COUNT(*), TOTAL(balance), TOTAL(balance * {factor}) FROM clients{where}", params)[0]
+        top = self._query(f"SELECT rowid, balance, balance * {factor} AS projected FROM clients{where} "
+                          f"ORDER BY projected - balance DESC, rowid LIMIT ?", params + [top_n])
+        return Forecast(
+            count=count,
+            total_balance=float(total_balance),
+            total_projected=float(total_projected),
+            horizon_months=horizon_months,
+            top_rows=tuple(row[0] for row in top),
+            top_balance=tuple(float(row[1]) for row in top),
+            top_projected=tuple(float(row[2]) for row in top),
+        )
+
+    def clients(self, rows):
+        """Строки клиентов по номерам строк базы (rowid) в порядке rows"""
+        rows = list(rows)
+        frame = self._frame(f"SELECT rowid, {', '.join(COLUMNS)} FROM clients "
+                            f"WHERE rowid IN ({', '.join('?' * len(rows))})", rows, columns=['rowid'] + list(COLUMNS))
+        return frame.set_index('rowid').loc[rows].reset_index(drop=True)
+
+    def table_view(self, key):
+        return SqlTableView(self, key)
+
+    def export_job(self, key, path, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+        return SqlExportJob(self, key, path, fmt, chunk_size)
+
+    def append(self, rows, source=None):
+        """Дописывает строки DataFrame; source - подпись CSV, которой теперь соответствует база"""
+        cube = self.cube.appended(rows)
+        conn = self._conn()
+        with conn:
+            conn.executemany(_INSERT, _rows(rows))
+            _write_cube(conn, cube)
+            if source is not None:
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('source', ?)", (json.dumps(source),))
+        n_rows = self._len
+        self.clear()
+        with self._lock:
+            self._cube = cube
+        if n_rows is not None:
+            self._len = n_rows + len(rows)
+
+    def iter_chunks(self, key, chunk_size):
+        """Выборка блоками по chunk_size строк в порядке строк файла (по rowid, без OFFSET)"""
+        where, params = self.where(key)
+        where = f"{where} AND rowid > ?" if where else " WHERE rowid > ?"
+        last_row = 0
+        while True:
+            chunk = self._frame(f"SELECT rowid, {', '.join(COLUMNS)} FROM clients{where} ORDER BY rowid LIMIT ?",
+                                params + [last_row, chunk_size], columns=['rowid'] + list(COLUMNS))
+            if chunk.empty:
+                return
+            last_row = int(chunk['rowid'].iloc[-1])
+            yield chunk.drop(columns='rowid')
+
+
+class SqlTableView:
+    """Упорядоченная выборка из SQLite для VirtualTable (интерфейс table_view.TableView)
+
+    Страницы читаются по ключу (значение колонки сортировки, rowid): запрос
+    продолжает с последней прочитанной строки, а не пропускает OFFSET строк.
+    Для прыжков полосой прокрутки запоминаются опорные ключи прочитанных
+    страниц; OFFSET отсчитывается только от ближайшей опоры.
+    """
+
+    def __init__(self, store, key):
+        # Пока выборка не закрыта, заменённая база не закрывается под ней
+        self.store = store.acquire()
+        self.key = key
+        self._where, self._params = store.where(key)
+        self._len = store.count(key)
+        self.sort_column = None
+        self.descending = False
+        self._anchors = {0: None}
+        self._released = False
+
+    def close(self):
+        """Отпускает базу; вызывается, когда окно таблицы закрыто"""
+        if not self._released:
+            self._released = True
+            self.store.release()
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def columns(self):
+        return self.store.columns
+
+    def sort(self, column, descending=False):
+        self.sort_column = column
+        self.descending = descending
+        self._anchors = {0: None}
+
+    def page(self, start, count):
+        """Строки [start, start + count) в текущем порядке"""
+        start = max(0, min(start, self._len))
+        anchor = max(position for position in self._anchors if position <= start)
+        # Без сортировки - порядок строк файла, как в TableView
+        keys = ('rowid',) if self.sort_column is None else (self.sort_column, 'rowid')
+        direction = " DESC" if self.descending else ""
+        where, params = self._where, list(self._params)
+        after = self._anchors[anchor]
+        if after is not None:
+            condition = f"({', '.join(keys)}) {'<' if self.descending else '>'} ({', '.join('?' * len(keys))})"
+            where = f"{where} AND {condition}" if where else f" WHERE {condition}"
+            params += list(after)
+        frame = self.store._frame(
+            f"SELECT rowid, {', '.join(COLUMNS)} FROM clients{where} "
+            f"ORDER BY {', '.join(key + direction for key in keys)} LIMIT ? OFFSET ?",
+            params + [count, start - anchor], columns=['rowid'] + list(COLUMNS))
+        if len(frame):
+            last = frame.iloc[-1]
+            self._anchors[start + len(frame)] = tuple(_sql_value(last[key]) for key in keys)
+        return frame.drop(columns='rowid')
+
+
+class SqlExportJob(ExportJob):
+    """ExportJob, читающий выборку из SQLite блоками по ключу"""
+
+    def __init__(self, store, key, path, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+        # База отпускается, когда экспорт завершится (run)
+        self.store = store.acquire()
+        self.key = key
+        super().__init__(None, None, path, fmt, chunk_size)
+
+    def run(self):
+        try:
+            super().run()
+        finally:
+            self.store.release()
+
+    def _count(self):
+        return self.store.count(self.key)
+
+    def chunks(self):
+        yield from self.store.iter_chunks(self.key, self.chunk_size)
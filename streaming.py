@@ -0,0 +1,309 @@
+"""Потоковая агрегация CSV, который не помещается в память.
+
+Файл делится на диапазоны байт по границам строк; каждый диапазон
+читается и сворачивается в PartialAggregate независимо (в том числе в
+разных процессах). Частичные агрегаты сливаются: суммы и счётчики
+складываются, min/max сравниваются, частоты значений объединяются.
+Медиана возраста и гистограммы дохода/баланса берутся из ValueSketch -
+частот значений, округлённых до заданного шага (для целых возрастов
+медиана точная). Пиковая память ограничена размером диапазона, а не
+размером файла.
+
+FilterAggregates - тот же проход для окна приложения, когда CSV больше
+порога STREAMING_THRESHOLD_MB: агрегаты группируются по отрезкам
+возраста, региону и продукту, и снимок панелей для любого состояния
+фильтров - слияние подходящих групп. Строк в памяти нет, поэтому поиск,
+таблица, экспорт и прогноз в этом режиме недоступны.
+"""
+import io
+import os
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from analytics import (AGE_BINS, CHART_AGE_BINS, CHART_AGE_LABELS, HIGH_INCOME, HIGH_RISK,
+                       LOW_ACTIVITY_TRANSACTIONS, PREMIUM_BALANCE, AggregateSnapshot, age_bin_labels,
+                       empty_snapshot, histogram, right_closed_counts)
+from filter_index import AGE_RANGES, ALL
+
+# Размер диапазона файла, который один процесс читает за раз
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+
+# Шаг округления значений в скетчах гистограмм (руб)
+MONEY_RESOLUTION = 100
+
+# Группы фильтра по возрасту пересекаются (60 лет входит в "46-60" и "60+"), поэтому агрегаты
+# копятся по непересекающимся отрезкам [AGE_EDGES[i], AGE_EDGES[i + 1]), а группа - их объединение
+AGE_EDGES = tuple(sorted({low for low, _ in AGE_RANGES.values()} | {high + 1 for _, high in AGE_RANGES.values()}))
+# Производная колонка группировки: номер отрезка возраста (-1 - младше AGE_EDGES[0])
+AGE_SEGMENT = 'age_segment'
+
+
+class ValueSketch:
+    """Сливаемые частоты значений, округлённых до resolution"""
+
+    def __init__(self, resolution=1):
+        self.resolution = resolution
+        self.counts = Counter()
+
+    def add(self, values):
+        buckets = np.round(np.asarray(values, dtype=np.float64) / self.resolution).astype(np.int64)
+        keys, counts = np.unique(buckets, return_counts=True)
+        self.counts.update(dict(zip(keys.tolist(), counts.tolist())))
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        return self
+
+    def _arrays(self):
+        keys = np.array(sorted(self.counts), dtype=np.int64)
+        counts = np.array([self.counts[k] for k in keys.tolist()], dtype=np.int64)
+        return keys * self.resolution, counts
+
+    def median(self):
+        """Медиана как у np.median: среднее двух центральных значений при чётном числе"""
+        values, counts = self._arrays()
+        total = int(counts.sum())
+        if total == 0:
+            return float('nan')
+        cumulative = np.cumsum(counts)
+        low = values[np.searchsorted(cumulative, (total - 1) // 2, side='right')]
+        high = values[np.searchsorted(cumulative, total // 2, side='right')]
+        return (float(low) + float(high)) / 2
+
+    def bin_counts(self, bins):
+        values, counts = self._arrays()
+        return right_closed_counts(values, bins, weights=counts)
+
+    def histogram(self, value_range):
+        values, counts = self._arrays()
+        return histogram(values, weights=counts, value_range=value_range)
+
+
+class PartialAggregate:
+    """Сливаемые агрегаты части выборки; to_snapshot() даёт AggregateSnapshot"""
+
+    def __init__(self):
+        self.count = 0
+        self.sums = Counter()
+        self.premium_clients = 0
+        self.high_income_clients = 0
+        self.low_activity_clients = 0
+        self.minimums = {}
+        self.maximums = {}
+        self.frequencies = {'region': Counter(), 'product': Counter(), 'risk_level': Counter()}
+        self.age = ValueSketch()
+        self.income = ValueSketch(MONEY_RESOLUTION)
+        self.balance = ValueSketch(MONEY_RESOLUTION)
+
+    def add(self, chunk):
+        """Сворачивает DataFrame с колонками клиентской таблицы"""
+        if len(chunk) == 0:
+            return self
+        self.count += len(chunk)
+        for col in ('balance', 'income', 'assets', 'transactions', 'loyalty_years', 'age'):
+            self.sums[col] += chunk[col].sum().item()
+        for col in ('age', 'loyalty_years', 'income', 'balance'):
+            self._update_bounds(col, chunk[col].min().item(), chunk[col].max().item())
+        self.premium_clients += int((chunk['balance'] > PREMIUM_BALANCE).sum())
+        self.high_income_clients += int((chunk['income'] > HIGH_INCOME).sum())
+        self.low_activity_clients += int((chunk['transactions'] < LOW_ACTIVITY_TRANSACTIONS).sum())
+        for col, counter in self.frequencies.items():
+            counter.update({str(k): int(v) for k, v in chunk[col].value_counts().items() if v})
+        self.age.add(chunk['age'])
+        self.income.add(chunk['income'])
+        self.balance.add(chunk['balance'])
+        return self
+
+    def _update_bounds(self, col, low, high):
+        self.minimums[col] = min(self.minimums.get(col, low), low)
+        self.maximums[col] = max(self.maximums.get(col, high), high)
+
+    def merge(self, other):
+        self.count += other.count
+        self.sums.update(other.sums)
+        self.premium_clients += other.premium_clients
+        self.high_income_clients += other.high_income_clients
+        self.low_activity_clients += other.low_activity_clients
+        for col in other.minimums:
+            self._update_bounds(col, other.minimums[col], other.maximums[col])
+        for col, counter in other.frequencies.items():
+            self.frequencies[col].update(counter)
+        self.age.merge(other.age)
+        self.income.merge(other.income)
+        self.balance.merge(other.balance)
+        return self
+
+    def _sorted_counts(self, col):
+        items = sorted(self.frequencies[col].items(), key=lambda item: (-item[1], item[0]))
+        return tuple((value, int(count)) for value, count in items if count)
+
+    def to_snapshot(self):
+        n = self.count
+        if n == 0:
+            return empty_snapshot()
+        risk_counts = self._sorted_counts('risk_level')
+        return AggregateSnapshot(
+            count=n,
+            total_balance=float(self.sums['balance']),
+            avg_balance=self.sums['balance'] / n,
+            avg_income=self.sums['income'] / n,
+            total_assets=float(self.sums['assets']),
+            total_transactions=int(self.sums['transactions']),
+            avg_transactions=self.sums['transactions'] / n,
+            premium_clients=self.premium_clients,
+            high_income_clients=self.high_income_clients,
+            low_activity_clients=self.low_activity_clients,
+            high_risk_clients=dict(risk_counts).get(HIGH_RISK, 0),
+            age_mean=self.sums['age'] / n,
+            age_median=self.age.median(),
+            age_min=int(self.minimums['age']),
+            age_max=int(self.maximums['age']),
+            age_groups=tuple(zip(age_bin_labels(), (int(c) for c in self.age.bin_counts(AGE_BINS)))),
+            avg_loyalty=self.sums['loyalty_years'] / n,
+            max_loyalty=int(self.maximums['loyalty_years']),
+            region_counts=self._sorted_counts('region'),
+            product_counts=self._sorted_counts('product'),
+            risk_counts=risk_counts,
+            chart_age_groups=tuple(zip(CHART_AGE_LABELS, (int(c) for c in self.age.bin_counts(CHART_AGE_BINS)))),
+            income_histogram=self.income.histogram((self.minimums['income'], self.maximums['income'])),
+            balance_histogram=self.balance.histogram((self.minimums['balance'], self.maximums['balance'])),
+        )
+
+
+def byte_ranges(path, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Делит файл на диапазоны [start, end) примерно по chunk_bytes"""
+    size = os.path.getsize(path)
+    return [(start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)]
+
+
+def read_range(path, start, end, columns=None):
+    """Строки CSV, начинающиеся в байтах [start, end), как DataFrame"""
+    with open(path, 'rb') as f:
+        header = f.readline()
+        if columns is None:
+            columns = header.decode('utf-8').strip().split(',')
+        if start == 0:
+            start = f.tell()
+        else:
+            # Строка принадлежит диапазону, в котором лежит её первый байт
+            f.seek(start - 1)
+            if f.read(1) != b'\n':
+                f.readline()
+        position = f.tell()
+        if position >= end:
+            return pd.DataFrame(columns=columns)
+        data = f.read(end - position)
+        if not data.endswith(b'\n'):
+            # Последняя строка начинается в диапазоне, но заканчивается за ним. Если же
+            # диапазон кончается ровно на переводе строки, следующая строка - уже не наша
+            data += f.readline()
+    return pd.read_csv(io.BytesIO(data), header=None, names=columns, encoding='utf-8')
+
+
+def age_segments(ages):
+    """Номера отрезков AGE_EDGES для значений возраста"""
+    return np.searchsorted(AGE_EDGES, np.asarray(ages), side='right') - 1
+
+
+def _aggregate_range(args):
+    path, start, end, group_by, dropna = args
+    chunk = read_range(path, start, end)
+    if not group_by:
+        return {(): PartialAggregate().add(chunk)}
+    if AGE_SEGMENT in group_by:
+        chunk[AGE_SEGMENT] = age_segments(chunk['age'])
+    return {key if isinstance(key, tuple) else (key,): PartialAggregate().add(group)
+            for key, group in chunk.groupby(list(group_by), sort=False, dropna=dropna)}
+
+
+def aggregate_csv(path, group_by=(), chunk_bytes=DEFAULT_CHUNK_BYTES, workers=1, dropna=True, mp_context=None):
+    """Частичные агрегаты CSV по группам group_by: {(значения group_by): PartialAggregate}
+
+    Без group_by результат - {(): PartialAggregate} по всему файлу. В group_by
+    можно указать AGE_SEGMENT; dropna=False оставляет строки с пропусками в
+    колонках группировки (ключ с NaN).
+    """
+    tasks = [(path, start, end, tuple(group_by), dropna) for start, end in byte_ranges(path, chunk_bytes)]
+    results = {}
+
+    def fold(partials):
+        for key, partial in partials.items():
+            if key in results:
+                results[key].merge(partial)
+            else:
+                results[key] = partial
+
+    if workers is not None and workers <= 1:
+        for task in tasks:
+            fold(_aggregate_range(task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+            for partials in pool.map(_aggregate_range, tasks):
+                fold(partials)
+    if not group_by and not results:
+        results[()] = PartialAggregate()
+    return results
+
+
+def merge_partials(partials):
+    """Сливает несколько PartialAggregate в новый"""
+    result = PartialAggregate()
+    for partial in partials:
+        result.merge(partial)
+    return result
+
+
+class FilterAggregates:
+    """Частичные агрегаты по отрезкам возраста x регион x продукт и снимки по состояниям фильтров"""
+
+    def __init__(self, groups, cache_size=64):
+        self.groups = groups
+        self.count = sum(partial.count for partial in groups.values())
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_csv(cls, path, chunk_bytes=DEFAULT_CHUNK_BYTES, workers=1, mp_context=None):
+        groups = aggregate_csv(path, group_by=(AGE_SEGMENT, 'region', 'product'), chunk_bytes=chunk_bytes,
+                               workers=workers, dropna=False, mp_context=mp_context)
+        return cls(groups)
+
+    def __len__(self):
+        return self.count
+
+    def values(self, column):
+        """Значения региона или продукта (для списков фильтров)"""
+        position = ('region', 'product').index(column) + 1
+        return sorted({str(key[position]) for key in self.groups if not pd.isna(key[position])})
+
+    def _segments(self, age):
+        if age == ALL:
+            return None
+        low, high = AGE_RANGES.get(age, (1, 0))
+        return {i for i in range(len(AGE_EDGES) - 1) if AGE_EDGES[i] >= low and AGE_EDGES[i + 1] - 1 <= high}
+
+    def snapshot(self, age=ALL, region=ALL, product=ALL):
+        """AggregateSnapshot для состояния фильтров слиянием подходящих групп (с LRU кэшем)"""
+        key = (age, region, product)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        segments = self._segments(age)
+        result = merge_partials(
+            partial for (segment, r, p), partial in self.groups.items()
+            if (segments is None or segment in segments) and region in (ALL, r) and product in (ALL, p)
+        ).to_snapshot()
+
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
@@ -0,0 +1,114 @@
+"""Модель постраничного просмотра таблицы клиентов с сортировкой.
+
+Перестановки argsort считаются один раз на колонку по всей таблице и
+кэшируются. Порядок отфильтрованной выборки получается из полной
+перестановки отбором по маске - это O(n) без повторной сортировки.
+После дописывания строк перестановка старых строк сливается с
+отсортированными новыми при первом обращении к колонке (appended).
+"""
+import numpy as np
+import pandas as pd
+
+import schema
+
+
+class SortIndex:
+    """Кэш перестановок argsort по колонкам всей таблицы"""
+
+    def __init__(self, df):
+        self.df = df
+        self._permutations = {}
+        # (кэш перестановок, число строк) таблицы до дописывания, см. appended
+        self._previous = None
+
+    def appended(self, df):
+        """SortIndex таблицы df, первые строки которой - таблица этого индекса
+
+        Ничего не пересчитывается сразу: при первой сортировке по колонке уже
+        посчитанная перестановка старых строк сливается с отсортированными
+        новыми строками за O(n) вместо полной сортировки.
+        """
+        result = SortIndex(df)
+        result._previous = (self._permutations, len(self.df))
+        return result
+
+    def permutation(self, column):
+        perm = self._permutations.get(column)
+        if perm is None:
+            series = schema.column(self.df, column)
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                values = self._label_ranks(series)
+            else:
+                values = series.to_numpy()
+            previous = self._previous[0].get(column) if self._previous is not None else None
+            try:
+                if previous is not None and len(previous) == self._previous[1]:
+                    perm = self._merged(values, previous)
+                else:
+                    perm = np.argsort(values, kind='stable')
+            except TypeError:
+                # Смешанные типы (например, строки с пропусками) сортируем как строки
+                perm = np.argsort(series.astype(str).to_numpy(), kind='stable')
+            self._permutations[column] = perm
+        return perm
+
+    @staticmethod
+    def _label_ranks(series):
+        """Места значений категорий по алфавиту подписей (пропуск - -1)
+
+        Коды категорий не годятся: строки, дописанные при живом обновлении,
+        добавляют новые значения в конец словаря, а не по алфавиту.
+        """
+        labels = [str(c) for c in series.cat.categories]
+        ranks = np.empty(len(labels) + 1, dtype=np.int64)
+        ranks[sorted(range(len(labels)), key=labels.__getitem__)] = np.arange(len(labels))
+        # Код -1 (пропуск) попадает на последний элемент
+        ranks[-1] = -1
+        return ranks[series.cat.codes.to_numpy()]
+
+    @staticmethod
+    def _merged(values, previous):
+        """Перестановка values из перестановки previous первых строк и сортировки остальных"""
+        n_old = len(previous)
+        new_rows = n_old + np.argsort(values[n_old:], kind='stable')
+        # Новые строки встают после равных им старых - как при устойчивой сортировке всей таблицы
+        positions = np.searchsorted(values[previous], values[new_rows], side='right')
+        return np.insert(previous, positions, new_rows)
+
+    def order(self, column, rows=None, descending=False):
+        """Номера строк выборки rows (None - вся таблица) в порядке сортировки по column"""
+        perm = self.permutation(column)
+        if rows is not None:
+            member = np.zeros(len(self.df), dtype=bool)
+            member[rows] = True
+            perm = perm[member[perm]]
+        return perm[::-1] if descending else perm
+
+
+class TableView:
+    """Упорядоченная выборка строк DataFrame, из которой читаются страницы"""
+
+    def __init__(self, df, rows=None, sort_index=None):
+        self.df = df
+        self.rows = rows
+        self.sort_index = sort_index if sort_index is not None else SortIndex(df)
+        self.order = np.arange(len(df)) if rows is None else np.asarray(rows)
+        self.sort_column = None
+        self.descending = False
+
+    def __len__(self):
+        return len(self.order)
+
+    @property
+    def columns(self):
+        return schema.columns(self.df)
+
+    def sort(self, column, descending=False):
+        self.order = self.sort_index.order(column, self.rows, descending)
+        self.sort_column = column
+        self.descending = descending
+
+    def page(self, start, count):
+        """Строки [start, start + count) в текущем порядке, в виде для отображения"""
+        start = max(0, start)
+        return schema.display_frame(self.df.iloc[self.order[start:start + count]])
@@ -0,0 +1,31 @@
+"""Общие данные тестов: CSV клиентов и строки, дописываемые в его конец"""
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_generator import write_clients_csv  # noqa: E402
+
+BASE_ROWS = 3000
+APPENDED_ROWS = 700
+# Регион, которого нет в исходных строках: дописанные строки добавляют новое значение в словари
+NEW_REGION = 'Калининград'
+
+
+@pytest.fixture
+def clients_csv(tmp_path):
+    """base - CSV из первых BASE_ROWS строк, full - тот же CSV с дописанными строками tail (байты)"""
+    generated = tmp_path / 'generated.csv'
+    write_clients_csv(str(generated), BASE_ROWS + APPENDED_ROWS, seed=7, workers=1)
+    lines = generated.read_bytes().splitlines(keepends=True)
+    head = b''.join(lines[:BASE_ROWS + 1])
+    tail = b''.join(lines[BASE_ROWS + 1:]).replace(',Москва,'.encode(), f',{NEW_REGION},'.encode())
+
+    base, full = tmp_path / 'base.csv', tmp_path / 'full.csv'
+    base.write_bytes(head)
+    full.write_bytes(head + tail)
+    return SimpleNamespace(base=str(base), full=str(full), tail=tail)
+
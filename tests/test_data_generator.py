@@ -0,0 +1,28 @@
+"""Генератор воспроизводим: результат зависит от (n, seed, chunk_size), а не от числа процессов"""
+import pandas as pd
+
+from data_generator import COLUMNS, generate_clients, write_clients_csv
+
+ROWS = 2500
+CHUNK_SIZE = 600
+
+
+def test_same_clients_for_any_number_of_workers():
+    single = generate_clients(ROWS, seed=11, chunk_size=CHUNK_SIZE, workers=1)
+    parallel = generate_clients(ROWS, seed=11, chunk_size=CHUNK_SIZE, workers=3)
+    assert list(single.columns) == COLUMNS
+    assert single['id'].tolist() == list(range(1, ROWS + 1))
+    pd.testing.assert_frame_equal(single, parallel)
+
+
+def test_same_csv_for_any_number_of_workers(tmp_path):
+    single, parallel = tmp_path / 'single.csv', tmp_path / 'parallel.csv'
+    assert write_clients_csv(str(single), ROWS, seed=11, chunk_size=CHUNK_SIZE, workers=1) == ROWS
+    assert write_clients_csv(str(parallel), ROWS, seed=11, chunk_size=CHUNK_SIZE, workers=3) == ROWS
+    assert single.read_bytes() == parallel.read_bytes()
+
+
+def test_seed_changes_clients():
+    first = generate_clients(ROWS, seed=11, chunk_size=CHUNK_SIZE)
+    second = generate_clients(ROWS, seed=12, chunk_size=CHUNK_SIZE)
+    assert not first['balance'].equals(second['balance'])
@@ -0,0 +1,39 @@
+"""GrowableArray: версии не видят чужих дописываний"""
+import numpy as np
+
+from growable import GrowableArray
+
+
+def test_appended_versions_keep_their_values():
+    base = GrowableArray(np.arange(5))
+    first = base.appended([5, 6])
+    second = first.appended([7])
+    assert base.values.tolist() == [0, 1, 2, 3, 4]
+    assert first.values.tolist() == [0, 1, 2, 3, 4, 5, 6]
+    assert second.values.tolist() == list(range(8))
+    # Продолжение последней версии пишет в запас того же буфера
+    assert np.shares_memory(first.values, second.values)
+
+
+def test_appending_to_an_older_version_copies():
+    base = GrowableArray(np.arange(3))
+    first = base.appended([10])
+    other = base.appended([20, 21])
+    assert first.values.tolist() == [0, 1, 2, 10]
+    assert other.values.tolist() == [0, 1, 2, 20, 21]
+    assert not np.shares_memory(first.values, other.values)
+
+
+def test_keep_overwrites_the_tail_and_promotes_dtype():
+    base = GrowableArray(np.array([1, 2, 3], dtype=np.int8))
+    replaced = base.appended(np.array([9, 300], dtype=np.int16), keep=2)
+    assert replaced.values.tolist() == [1, 2, 9, 300]
+    assert replaced.values.dtype == np.int16
+    assert base.values.tolist() == [1, 2, 3]
+
+
+def test_source_array_is_not_written():
+    source = np.arange(4)
+    GrowableArray(source).appended([4, 5])
+    assert source.tolist() == [0, 1, 2, 3]
+    assert len(GrowableArray(np.arange(10), size=4).padded(8)) == 8
@@ -0,0 +1,257 @@
+"""Дописанные в CSV строки дают те же результаты, что и полная перестройка.
+
+Живое обновление не пересчитывает старые строки: продлевает битовые маски
+(FilterIndex.appended), прогноз, сливает куб, дописывает бинарный кэш и
+базу SQLite. Здесь каждый путь сверяется с набором, построенным заново
+из итогового CSV, а запросы SQLite - с тем же расчётом в pandas.
+"""
+import dataclasses
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics import Aggregator
+from conftest import APPENDED_ROWS, BASE_ROWS, NEW_REGION
+from data_cache import append_cache, cached_source, csv_signature, is_cache_valid, load_cache, read_csv_cached
+from data_generator import generate_clients
+from filter_index import ALL, FilterIndex
+from forecasting import Forecaster
+from live_refresh import APPENDED, CsvTail, append_rows
+from olap_cube import OlapCube
+from search_index import SearchIndex
+from sqlite_store import SqliteStore, is_store_valid
+from table_view import SortIndex, TableView
+
+# Состояния фильтров (возраст, регион, продукт, запрос): без фильтров, фильтры, новое значение, поиск
+KEYS = [
+    (ALL, ALL, ALL, ''),
+    ('31-45', ALL, ALL, ''),
+    (ALL, 'Казань', 'Кредит', ''),
+    ('60+', NEW_REGION, ALL, ''),
+    (ALL, ALL, ALL, 'казань'),
+    (ALL, ALL, 'Вклад', 'клиент_31'),
+    ('18-30', NEW_REGION, ALL, 'ипотека'),
+]
+SORTS = [(None, False), ('balance', True), ('age', False), ('region', False), ('product', True)]
+PAGE_SIZE = 37
+
+
+class PandasHub:
+    """Таблица и индексы так, как их держит хаб с хранилищем pandas"""
+
+    def __init__(self, df, indexes=None):
+        self.df = df
+        (self.search_index, self.filter_index, self.aggregator, self.forecaster, self.sort_index,
+         self.cube) = indexes or (SearchIndex(df), FilterIndex(df), Aggregator(df), Forecaster(df), SortIndex(df),
+                                  OlapCube.from_frame(df))
+
+    def appended(self, df, new_rows):
+        """Как VTBIntelligenceHub._compute_refresh: индексы продлеваются на new_rows"""
+        return PandasHub(df, (self.search_index.appended(df), self.filter_index.appended(new_rows),
+                              self.aggregator.appended(df), self.forecaster.appended(new_rows),
+                              self.sort_index.appended(df), self.cube.appended(new_rows)))
+
+    def rows(self, key):
+        mask = self.search_index.search(key[3])
+        search = self.filter_index.pack(mask) if mask is not None else None
+        return self.filter_index.select(*key[:3], search)
+
+    def count(self, key):
+        rows = self.rows(key)
+        return len(self.df) if rows is None else len(rows)
+
+    def snapshot(self, key):
+        return self.aggregator.compute(self.rows(key))
+
+    def forecast(self, key):
+        return self.forecaster.compute(self.rows(key))
+
+    def ids(self, key, sort, descending):
+        view = TableView(self.df, self.rows(key), self.sort_index)
+        if sort is not None:
+            view.sort(sort, descending)
+        return read_ids(view)
+
+
+def read_ids(view):
+    """id строк выборки: страницы подряд, затем прыжок назад к середине (опорные точки SqlTableView)"""
+    ids = []
+    for start in range(0, len(view), PAGE_SIZE):
+        ids.extend(view.page(start, PAGE_SIZE)['id'].tolist())
+    middle = len(view) // 2
+    assert view.page(middle, PAGE_SIZE)['id'].tolist() == ids[middle:middle + PAGE_SIZE]
+    return ids
+
+
+def assert_same(actual, expected, rel=1e-9):
+    """Равенство снимков и прогнозов; суммы float сравниваются с допуском - порядок сложения разный"""
+    if dataclasses.is_dataclass(actual):
+        actual, expected = dataclasses.asdict(actual), dataclasses.asdict(expected)
+    if isinstance(actual, dict):
+        assert actual.keys() == expected.keys()
+        for name in actual:
+            assert_same(actual[name], expected[name], rel)
+    elif isinstance(actual, (tuple, list)):
+        assert len(actual) == len(expected)
+        for a, e in zip(actual, expected):
+            assert_same(a, e, rel)
+    elif isinstance(actual, np.ndarray) or isinstance(expected, np.ndarray):
+        np.testing.assert_allclose(actual, expected, rtol=rel)
+    elif isinstance(actual, (float, np.floating)) or isinstance(expected, (float, np.floating)):
+        assert actual == pytest.approx(expected, rel=rel, nan_ok=True)
+    else:
+        assert actual == expected
+
+
+def append_tail(clients_csv):
+    with open(clients_csv.base, 'ab') as f:
+        f.write(clients_csv.tail)
+
+
+def poll_appended(tail):
+    status, new_rows = tail.poll()
+    assert status == APPENDED
+    assert len(new_rows) == APPENDED_ROWS
+    return new_rows
+
+
+@pytest.fixture
+def pandas_rebuilt(clients_csv):
+    return PandasHub(read_csv_cached(clients_csv.full))
+
+
+@pytest.fixture
+def sqlite_rebuilt(clients_csv, tmp_path):
+    store = SqliteStore.from_csv(clients_csv.full, str(tmp_path / 'full.sqlite'))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def sqlite_appended(clients_csv, tmp_path):
+    """База исходного CSV, в которую дописаны новые строки, как при живом обновлении"""
+    store = SqliteStore.from_csv(clients_csv.base, str(tmp_path / 'base.sqlite'))
+    assert len(store) == BASE_ROWS
+    store.cube
+    tail = CsvTail(clients_csv.base, offset=store.source['size'])
+    append_tail(clients_csv)
+    store.append(poll_appended(tail), csv_signature(clients_csv.base))
+    yield store
+    store.close()
+
+
+def tail_parts(clients_csv, parts=3):
+    """Дописываемые строки несколькими порциями по границам строк"""
+    lines = clients_csv.tail.splitlines(keepends=True)
+    step = -(-len(lines) // parts)
+    return [b''.join(lines[i:i + step]) for i in range(0, len(lines), step)]
+
+
+def warm(hub):
+    """Заполняет кэши и ленивые индексы: дописывание должно продлевать уже посчитанное"""
+    for key in KEYS:
+        hub.snapshot(key)
+        for sort, descending in SORTS:
+            hub.ids(key, sort, descending)
+
+
+@pytest.mark.parametrize('via_cache', [True, False], ids=['append_cache', 'append_rows'])
+def test_pandas_append_matches_rebuild(clients_csv, pandas_rebuilt, via_cache):
+    hub = PandasHub(read_csv_cached(clients_csv.base))
+    tail = CsvTail(clients_csv.base, offset=cached_source(clients_csv.base)['size'])
+    # Несколько порций подряд: вторая и следующие дописываются в запас буферов первой
+    for part in tail_parts(clients_csv):
+        warm(hub)
+        base_size = tail.offset
+        with open(clients_csv.base, 'ab') as f:
+            f.write(part)
+        status, new_rows = tail.poll()
+        assert status == APPENDED
+        if via_cache:
+            assert append_cache(clients_csv.base, new_rows, base_size, csv_signature(clients_csv.base))
+            # Дописанный кэш описывает весь CSV: следующий запуск открывает его без разбора CSV
+            assert is_cache_valid(clients_csv.base)
+            df = load_cache(clients_csv.base)
+        else:
+            df = append_rows(hub.df, new_rows)
+        hub = hub.appended(df, new_rows)
+
+    assert len(hub.df) == len(pandas_rebuilt.df) == BASE_ROWS + APPENDED_ROWS
+    # Новый регион встаёт в словарях по алфавиту, как при полной перестройке
+    assert hub.filter_index.values('region') == pandas_rebuilt.filter_index.values('region')
+    assert NEW_REGION in hub.filter_index.values('region')
+    for key in KEYS:
+        rows, expected_rows = hub.rows(key), pandas_rebuilt.rows(key)
+        assert (rows is None) == (expected_rows is None)
+        if rows is not None:
+            np.testing.assert_array_equal(rows, expected_rows)
+        assert_same(hub.snapshot(key), pandas_rebuilt.snapshot(key))
+        assert_same(hub.cube.snapshot(*key[:3]), pandas_rebuilt.cube.snapshot(*key[:3]))
+        assert_same(hub.forecast(key), pandas_rebuilt.forecast(key))
+        for sort, descending in SORTS:
+            assert hub.ids(key, sort, descending) == pandas_rebuilt.ids(key, sort, descending)
+
+
+def test_sqlite_append_matches_rebuild(clients_csv, sqlite_appended, sqlite_rebuilt):
+    # Подпись сохранена при дописывании: при следующем запуске база не перестраивается
+    assert is_store_valid(clients_csv.base, sqlite_appended.db_path)
+    assert len(sqlite_appended) == len(sqlite_rebuilt) == BASE_ROWS + APPENDED_ROWS
+    assert NEW_REGION in sqlite_appended.values('region')
+    for key in KEYS:
+        assert sqlite_appended.count(key) == sqlite_rebuilt.count(key)
+        assert_same(sqlite_appended.snapshot(key), sqlite_rebuilt.snapshot(key))
+        assert_same(sqlite_appended.cube.snapshot(*key[:3]), sqlite_rebuilt.cube.snapshot(*key[:3]))
+        assert_same(sqlite_appended.forecast(key), sqlite_rebuilt.forecast(key))
+        for sort, descending in SORTS:
+            view, expected = sqlite_appended.table_view(key), sqlite_rebuilt.table_view(key)
+            if sort is not None:
+                view.sort(sort, descending)
+                expected.sort(sort, descending)
+            assert read_ids(view) == read_ids(expected)
+
+
+def test_sqlite_matches_pandas(sqlite_appended, pandas_rebuilt):
+    for key in KEYS:
+        assert sqlite_appended.count(key) == pandas_rebuilt.count(key)
+        assert_same(sqlite_appended.snapshot(key), pandas_rebuilt.snapshot(key))
+        assert_same(sqlite_appended.cube.snapshot(*key[:3]), pandas_rebuilt.cube.snapshot(*key[:3]))
+        forecast, expected = sqlite_appended.forecast(key), pandas_rebuilt.forecast(key)
+        # Номера строк прогноза: rowid базы с 1, позиции таблицы pandas с 0
+        assert_same(dataclasses.replace(forecast, top_rows=tuple(row - 1 for row in forecast.top_rows)), expected)
+        for sort, descending in SORTS:
+            view = sqlite_appended.table_view(key)
+            if sort is not None:
+                view.sort(sort, descending)
+            assert read_ids(view) == pandas_rebuilt.ids(key, sort, descending)
+
+
+def test_appended_indexes_of_plain_columns():
+    # Колонки без компактной схемы: имена - текстовая колонка поиска, регион и продукт - словари из factorize
+    full = generate_clients(4000, seed=5)
+    full['name'] = [f"{name} {i % 97}" for i, name in enumerate(full['name'])]
+    full.loc[3500:, 'region'] = NEW_REGION
+    base = full.iloc[:3000].reset_index(drop=True)
+    search, aggregator = SearchIndex(base), Aggregator(base)
+    for end in (3400, 4000):
+        search.search('клиент_1')
+        df = full.iloc[:end].reset_index(drop=True)
+        search, aggregator = search.appended(df), aggregator.appended(df)
+        expected_search, expected_aggregator = SearchIndex(df), Aggregator(df)
+        for query in ('клиент_1', 'ент_39 4', ' 96', 'калин', 'вклад', 'низ'):
+            np.testing.assert_array_equal(search.search(query), expected_search.search(query))
+        rows = np.arange(0, end, 3)
+        assert_same(aggregator.compute(rows), expected_aggregator.compute(rows))
+
+
+def test_category_order_follows_labels_not_codes():
+    # Словарь после дописывания: новое значение в конце, не по алфавиту
+    df = pd.DataFrame({'region': pd.Categorical(['Москва', NEW_REGION, 'Казань', 'Москва'],
+                                                categories=['Казань', 'Москва', NEW_REGION])})
+    for col in ('product', 'risk_level'):
+        df[col] = pd.Categorical(['Вклад'] * len(df))
+    for col in ('age', 'income', 'balance', 'assets', 'transactions', 'loyalty_years'):
+        df[col] = 1
+    snapshot = Aggregator(df).compute()
+    assert snapshot.region_counts == (('Москва', 2), ('Казань', 1), (NEW_REGION, 1))
+    assert SortIndex(df).order('region').tolist() == [2, 1, 0, 3]
@@ -0,0 +1,89 @@
+"""Перестройка базы SQLite после перезаписи CSV не ломает открытые выборки и экспорт"""
+import os
+import shutil
+
+import pandas as pd
+
+from conftest import APPENDED_ROWS, BASE_ROWS
+from filter_index import ALL
+from sqlite_store import SqliteStore
+
+KEY = (ALL, ALL, ALL, '')
+PAGE_SIZE = 250
+
+
+def read_ids(view):
+    return [i for start in range(0, len(view), PAGE_SIZE) for i in view.page(start, PAGE_SIZE)['id'].tolist()]
+
+
+def rewrite(clients_csv, path):
+    """CSV перезаписан целиком (другой размер и mtime): базу нужно перестроить"""
+    shutil.copyfile(clients_csv.full, path)
+
+
+def test_view_pages_across_rebuild(clients_csv, tmp_path):
+    csv = str(tmp_path / 'clients.csv')
+    shutil.copyfile(clients_csv.base, csv)
+    old = SqliteStore.from_csv(csv)
+    view = old.table_view(KEY)
+    view.sort('balance', descending=True)
+    first = view.page(0, PAGE_SIZE)['id'].tolist()
+
+    rewrite(clients_csv, csv)
+    new = SqliteStore.from_csv(csv)
+    old.retire()
+    assert new.db_path != old.db_path
+    assert len(new) == BASE_ROWS + APPENDED_ROWS
+
+    # Окно таблицы, открытое до перестройки, листает прежнюю выборку дальше
+    ids = read_ids(view)
+    assert len(ids) == BASE_ROWS
+    assert ids[:PAGE_SIZE] == first
+    assert not old.closed and os.path.exists(old.db_path)
+
+    view.close()
+    assert old.closed
+    assert not os.path.exists(old.db_path)
+    new_view = new.table_view(KEY)
+    assert read_ids(new_view) == pd.read_csv(csv)['id'].tolist()
+    new_view.close()
+
+    # Следующая перестройка снова пишет в освободившийся файл
+    shutil.copyfile(clients_csv.base, csv)
+    newest = SqliteStore.from_csv(csv)
+    new.retire()
+    assert newest.db_path == old.db_path
+    assert len(newest) == BASE_ROWS
+    assert new.closed and not os.path.exists(new.db_path)
+    newest.close()
+
+
+def test_export_finishes_across_rebuild(clients_csv, tmp_path):
+    csv = str(tmp_path / 'clients.csv')
+    shutil.copyfile(clients_csv.base, csv)
+    old = SqliteStore.from_csv(csv)
+    job = old.export_job(KEY, str(tmp_path / 'export.csv'), chunk_size=100)
+
+    rewrite(clients_csv, csv)
+    new = SqliteStore.from_csv(csv)
+    old.retire()
+    assert not old.closed
+
+    job.start().join()
+    assert job.error is None
+    assert len(pd.read_csv(job.path)) == BASE_ROWS
+    assert old.closed
+    assert len(new) == BASE_ROWS + APPENDED_ROWS
+    new.close()
+
+
+def test_unused_store_is_removed_on_retire(clients_csv, tmp_path):
+    csv = str(tmp_path / 'clients.csv')
+    shutil.copyfile(clients_csv.base, csv)
+    old = SqliteStore.from_csv(csv)
+    # Тот же файл, открытый второй раз (CSV не изменился), не удаляется вместе с первым
+    same = SqliteStore.from_csv(csv)
+    old.retire()
+    assert old.closed and os.path.exists(same.db_path)
+    assert len(same) == BASE_ROWS
+    same.close()
@@ -0,0 +1,76 @@
+"""Потоковая агрегация по диапазонам байт совпадает с чтением CSV целиком"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_generator import write_clients_csv
+from filter_index import ALL
+from streaming import FilterAggregates, PartialAggregate, aggregate_csv, byte_ranges, read_range
+
+ROWS = 60
+SUMMED = ('balance', 'income', 'assets', 'transactions', 'loyalty_years', 'age')
+
+
+@pytest.fixture
+def small_csv(tmp_path):
+    path = tmp_path / 'clients.csv'
+    write_clients_csv(str(path), ROWS, seed=3, workers=1)
+    return str(path)
+
+
+def line_boundary(path, line):
+    """Смещение начала строки line (0 - заголовок)"""
+    with open(path, 'rb') as f:
+        return sum(len(f.readline()) for _ in range(line))
+
+
+def chunk_sizes(path):
+    # Мельче строки, около строки, ровно до начала строки (диапазон кончается на '\n') и крупнее файла
+    boundary = line_boundary(path, 3)
+    return [5, 6, 7, 10, 97, boundary, boundary + 1, boundary - 1, 4096, 1 << 20]
+
+
+def test_ranges_cover_each_line_once(small_csv):
+    expected = pd.read_csv(small_csv)
+    for chunk_bytes in chunk_sizes(small_csv):
+        ids = [read_range(small_csv, start, end)['id'] for start, end in byte_ranges(small_csv, chunk_bytes)]
+        assert pd.concat(ids).tolist() == expected['id'].tolist(), chunk_bytes
+
+
+def test_ranges_of_tiny_file(tmp_path):
+    # Заголовок и строки по 5 байт: при шаге 5 и 10 каждый диапазон кончается ровно на переводе строки
+    path = tmp_path / 'tiny.csv'
+    path.write_bytes(b'id,x\n' + b''.join(b'%d,%d\n' % (i, 20 + i) for i in range(10)))
+    expected = pd.read_csv(path)['id'].tolist()
+    for chunk_bytes in (1, 2, 3, 4, 5, 6, 7, 10, 100):
+        ranges = byte_ranges(str(path), chunk_bytes)
+        ids = [read_range(str(path), start, end)['id'] for start, end in ranges]
+        assert pd.concat(ids).tolist() == expected, chunk_bytes
+
+
+def test_aggregate_csv_matches_read_csv(small_csv):
+    df = pd.read_csv(small_csv)
+    # Те же скетчи по всей таблице сразу: эталон для медианы и гистограмм
+    expected = PartialAggregate().add(df).to_snapshot()
+    for chunk_bytes in chunk_sizes(small_csv):
+        partial = aggregate_csv(small_csv, chunk_bytes=chunk_bytes)[()]
+        assert partial.count == len(df), chunk_bytes
+        for col in SUMMED:
+            assert partial.sums[col] == pytest.approx(df[col].sum(), rel=1e-12), (chunk_bytes, col)
+        assert dict(partial.frequencies['region']) == df['region'].value_counts().to_dict()
+        snapshot = partial.to_snapshot()
+        assert snapshot.age_groups == expected.age_groups
+        assert snapshot.age_median == np.median(df['age'])
+        for name in ('income_histogram', 'balance_histogram'):
+            counts, edges = getattr(snapshot, name)
+            expected_counts, expected_edges = getattr(expected, name)
+            np.testing.assert_array_equal(counts, expected_counts)
+            np.testing.assert_allclose(edges, expected_edges)
+
+
+def test_filter_aggregates_count_rows_once(small_csv):
+    df = pd.read_csv(small_csv)
+    aggregates = FilterAggregates.from_csv(small_csv, chunk_bytes=line_boundary(small_csv, 3))
+    assert len(aggregates) == len(df)
+    region = df['region'].iloc[0]
+    assert aggregates.snapshot(ALL, region, ALL).count == int((df['region'] == region).sum())